@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Dependency-graph build of the replication artifacts.
+
+Every artifact (loaded panel, single specification, rendered table, figure set) is a node
+whose key is a content hash of its parameters, input files, code and the keys of the nodes it
+depends on. A node is recomputed only if its key changed or its output files are missing;
+independent nodes run concurrently in a process pool. Results are pickled to the cache
+directory, so a later build (or load()) picks them up. Run from the repository root with
+
+    python -m auxiliary.build                 # everything
+    python -m auxiliary.build table_4         # one table and what it depends on
+
+The code part of a key is the hash of the whole module that defines the node's function, so an
+edit anywhere in auxiliary/functions_v6.py rebuilds every node. This is intended: the node
+functions call many helpers of that module, and hashing only their own source would keep stale
+results after a helper changes.
+"""
+
+# Import modules.
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+import time
+import pandas as pd
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from auxiliary import functions_v6
+from auxiliary.functions_v6 import (get_variable_lists, grid_table_4, notebook_figures, pooled_compliance, prepare_panel,
+                                    regress_prepared, render_figures, result_hash, write_table)
+
+
+class Node:
+    '''
+    One artifact of the build.
+    name: unique name of the node.
+    func: module-level function, called as func(*values of deps, **params).
+    deps: list of node names whose results are passed to func.
+    params: JSON-serializable keyword arguments of func.
+    files: input files whose content enters the key.
+    outputs: files written by func, the node is rebuilt if one of them is missing.
+    '''
+
+    def __init__(self, name, func, deps=(), params=None, files=(), outputs=()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.params = dict(params or {})
+        self.files = list(files)
+        self.outputs = list(outputs)
+
+    def __repr__(self):
+        return f'Node({self.name!r}, deps={self.deps})'
+
+# Hash of a file's content.
+def _file_hash(path, chunk=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Hash of the source of the module defining func. Helpers called by func live in the same
+# module, so hashing the whole file keeps keys correct when one of them changes (at the price of
+# rebuilding every node after any edit of the module).
+_code_hashes = {}
+def _code_hash(func):
+    path = os.path.abspath(sys.modules[func.__module__].__file__)
+    if path not in _code_hashes:
+        _code_hashes[path] = _file_hash(path)
+    return _code_hashes[path]
+
+# Key of every node in topological order.
+def node_keys(nodes):
+    '''
+    nodes: dict name -> Node (see replication_nodes()).
+    Returns a dict name -> hex key. Raises ValueError for unknown dependencies or cycles.
+    '''
+    keys = {}
+    visiting = set()
+
+    def visit(name):
+        if name in keys:
+            return keys[name]
+        if name not in nodes:
+            raise ValueError(f'unknown node {name}')
+        if name in visiting:
+            raise ValueError(f'dependency cycle at node {name}')
+        visiting.add(name)
+        node = nodes[name]
+        # The module name is left out so that keys agree between `python -m auxiliary.build` and imports.
+        content = {'name': name, 'func': node.func.__qualname__,
+                   'code': _code_hash(node.func), 'params': node.params,
+                   'files': {path: _file_hash(path) for path in node.files},
+                   'deps': [visit(dep) for dep in node.deps]}
+        visiting.discard(name)
+        keys[name] = hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+        return keys[name]
+
+    for name in nodes:
+        visit(name)
+    return keys
+
+# Cache file of a node.
+def _cache_file(cache_dir, name):
+    return os.path.join(cache_dir, name.replace('/', '_') + '.pkl')
+
+# Run one node in a worker: load the results of its dependencies, call func and store the result.
+# Returns the run time and the result hash.
+def _run_node(func, dep_files, params, cache_file, key):
+    values = []
+    for file in dep_files:
+        with open(file, 'rb') as f:
+            values.append(pickle.load(f)['value'])
+    start = time.time()
+    value = func(*values, **params)
+    seconds = time.time() - start
+    tmp = cache_file + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump({'key': key, 'value': value}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, cache_file)
+    return seconds, result_hash(value)
+
+# Keys and result hashes of the cached nodes.
+def _read_index(cache_dir):
+    path = os.path.join(cache_dir, 'index.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _write_index(cache_dir, index):
+    path = os.path.join(cache_dir, 'index.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+# Build the targets and everything they depend on.
+def build(nodes, targets=None, cache_dir='build/cache', workers=None, force=False, hashes=None):
+    '''
+    nodes: list of Node.
+    targets: list of node names, None for all nodes.
+    cache_dir: directory for pickled node results.
+    workers: number of processes.
+    force: bool, rebuild all required nodes.
+    hashes: JSON file to which the result hash (see result_hash()) of every required node is written.
+    Returns a data frame with name, key, status ('built' or 'cached'), seconds and result hash per
+    required node. Results do not depend on workers, so the hashes of a serial build (workers=1)
+    can be compared with those of a parallel one.
+    '''
+    nodes = {node.name: node for node in nodes}
+    keys = node_keys(nodes)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Nodes required for the targets.
+    required = []
+    stack = list(targets if targets is not None else nodes)
+    while stack:
+        name = stack.pop()
+        if name not in required:
+            required.append(name)
+            stack.extend(nodes[name].deps)
+
+    # A node is stale if its key changed, an output is missing or a dependency is stale.
+    index = _read_index(cache_dir)
+    stale = set()
+    for name in sorted(required, key=lambda n: _depth(nodes, n)):
+        node = nodes[name]
+        if (force or index.get(name, {}).get('key') != keys[name] or not os.path.exists(_cache_file(cache_dir, name))
+                or not all(os.path.exists(path) for path in node.outputs)
+                or any(dep in stale for dep in node.deps)):
+            stale.add(name)
+
+    status = {name: ('cached', 0.0) for name in required if name not in stale}
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            waiting = set(stale)
+            while waiting or running:
+                # Submit every node whose dependencies are done.
+                for name in sorted(waiting):
+                    node = nodes[name]
+                    if all(dep in status for dep in node.deps):
+                        waiting.discard(name)
+                        future = executor.submit(_run_node, node.func, [_cache_file(cache_dir, dep) for dep in node.deps],
+                                                 node.params, _cache_file(cache_dir, name), keys[name])
+                        running[future] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    seconds, digest = future.result()
+                    status[name] = ('built', seconds)
+                    index[name] = {'key': keys[name], 'hash': digest}
+                    _write_index(cache_dir, index)
+
+    report = pd.DataFrame([{'name': name, 'key': keys[name], 'status': status[name][0], 'seconds': status[name][1],
+                            'hash': index[name]['hash']} for name in sorted(required, key=lambda n: (_depth(nodes, n), n))])
+    if hashes is not None:
+        stored = {}
+        if os.path.exists(hashes):
+            with open(hashes) as f:
+                stored = json.load(f)
+        stored.update(zip(report.name, report.hash))
+        with open(hashes, 'w') as f:
+            json.dump(stored, f, indent=1, sort_keys=True)
+    return report
+
+# Length of the longest dependency chain below a node.
+def _depth(nodes, name):
+    deps = nodes[name].deps
+    return 0 if not deps else 1 + max(_depth(nodes, dep) for dep in deps)
+
+# Load the cached result of a node.
+def load(name, cache_dir='build/cache'):
+    with open(_cache_file(cache_dir, name), 'rb') as f:
+        return pickle.load(f)['value']
+
+# Node: prepared panel.
+def _load_panel(path):
+    return prepare_panel(pd.read_stata(path))
+
+# Node: mean conscription of draft eligible (p1) and exempt (p2) men of the cohorts 1958-1962.
+def _compliance(df):
+    p1, p2 = pooled_compliance(df)
+    return {'p1': p1, 'p2': p2}
+
+# Node: one column of table 4.
+def _table_4_column(df, compliance, method, cohort_range, controls):
+    cohorts = get_variable_lists()[7]
+    cohort_dummies = [c for c in cohorts if cohort_range[0] < int(c[-4:]) <= cohort_range[1]]
+    rslts = regress_prepared(df, method, cohort_range, cohort_dummies, controls)
+    mean_crime = df.crimerate[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1]) & (df.highnumber == 0)].mean()
+    if method == 'OLS':
+        wald = rslts.params['highnumber']/(compliance['p1'] - compliance['p2'])
+        return {'variable': 'highnumber', 'params': rslts.params['highnumber'], 'std_errors': rslts.HC0_se['highnumber'],
+                'pvalues': rslts.pvalues['highnumber'], 'nobs': rslts.nobs, 'percent_change': 100*wald/mean_crime}
+    return {'variable': 'sm', 'params': rslts.params['sm'], 'std_errors': rslts.std_errors['sm'],
+            'pvalues': rslts.pvalues['sm'], 'nobs': rslts.nobs, 'percent_change': 100*rslts.params['sm']/mean_crime}
+
+# Node: table 4 from its columns.
+def _table_4(*columns, path, formats):
+    lists = {'sm': ([], [], []), 'highnumber': ([], [], [])}
+    for column in columns:
+        for variable, (est, std, pval) in lists.items():
+            found = column['variable'] == variable
+            est.append(column['params'] if found else '-')
+            std.append(column['std_errors'] if found else '-')
+            pval.append(column['pvalues'] if found else '-')
+    (est_sm, std_sm, pval_sm), (est_hn, std_hn, pval_hn) = lists['sm'], lists['highnumber']
+    grid = grid_table_4(est_sm, est_hn, std_sm, std_hn, pval_sm, pval_hn,
+                        [c['percent_change'] for c in columns], [c['nobs'] for c in columns])
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    write_table(grid, path, formats)
+    return grid
+
+# Node: one of the other tables. They load the panel at data themselves. The result is the printed
+# table and the unrounded CSV export, if any.
+def _table(table, data, path, formats):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        getattr(functions_v6, table)(path=path, formats=formats, data=data)
+    export = ''
+    if 'csv' in formats:
+        with open(path + '.csv', encoding='utf-8') as f:
+            export = f.read()
+    return {'text': printed.getvalue(), 'csv': export}
+
+# Node: per-cohort figures.
+def _figures(df, out_dir):
+    figures = render_figures(df, notebook_figures(), out_dir, workers=1)
+    return pd.DataFrame({'file': figures.file.map(os.path.basename), 'hash': figures.hash})
+
+# Columns of table 4: method, cohort window and controls.
+TABLE_4_COLUMNS = [('OLS', [1958, 1962], 'n'), ('OLS', [1958, 1962], 'y'), ('IV', [1958, 1962], 'n'), ('IV', [1958, 1962], 'y'),
+                   ('OLS', [1929, 1965], 'n'), ('OLS', [1929, 1955], 'n'), ('OLS', [1958, 1965], 'n')]
+
+# Tables that are built as a whole.
+TABLES = ['table_2', 'table_3', 'table_5', 'table_6', 'table_7_IV', 'extension_table_4', 'extension_table_4_controls']
+
+# Graph of the replication artifacts.
+def replication_nodes(data='data/Crime.dta', out_dir='build', formats=functions_v6.DEFAULT_TABLE_FORMATS):
+    '''
+    Returns the list of nodes: 'panel', 'compliance', 'table_4/col_1' ... 'table_4/col_7', 'table_4',
+    the tables of TABLES and 'figures'.
+    data: path of the crime panel.
+    out_dir: directory for tables and figures.
+    formats: output formats of the tables (see write_table()).
+    '''
+    table_dir = os.path.join(out_dir, 'tables')
+    nodes = [Node('panel', _load_panel, params={'path': data}, files=[data]),
+             Node('compliance', _compliance, deps=['panel'])]
+    for i, (method, cohort_range, controls) in enumerate(TABLE_4_COLUMNS, 1):
+        nodes.append(Node(f'table_4/col_{i}', _table_4_column, deps=['panel', 'compliance'],
+                          params={'method': method, 'cohort_range': cohort_range, 'controls': controls}))
+    extensions = [functions_v6.TABLE_FORMATS[fmt] for fmt in formats]
+    path = os.path.join(table_dir, 'table_4')
+    nodes.append(Node('table_4', _table_4, deps=[f'table_4/col_{i}' for i in range(1, len(TABLE_4_COLUMNS) + 1)],
+                      params={'path': path, 'formats': formats}, outputs=[path + '.' + e for e in extensions]))
+    for table in TABLES:
+        path = os.path.join(table_dir, table)
+        nodes.append(Node(table, _table, params={'table': table, 'data': data, 'path': path, 'formats': formats}, files=[data],
+                          outputs=[path + '.' + e for e in extensions]))
+    figure_dir = os.path.join(out_dir, 'figures')
+    figures = [os.path.join(figure_dir, f'{figure["name"]}_{i}.png') for figure in notebook_figures() for i in figure['years']]
+    nodes.append(Node('figures', _figures, deps=['panel'], params={'out_dir': figure_dir},
+                      outputs=figures + [os.path.join(figure_dir, 'figures.json')]))
+    return nodes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the replication tables and figures.',
+                                     epilog='Node keys include the hash of the whole auxiliary/functions_v6.py, so any edit of '
+                                            'that module rebuilds every node; this is intended, see the module docstring.')
+    parser.add_argument('targets', nargs='*', help='node names, all nodes if none are given')
+    parser.add_argument('--data', default='data/Crime.dta', help='crime panel used by all tables and figures')
+    parser.add_argument('--out', default='build')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true')
+    parser.add_argument('--hashes', help='write the result hashes to this JSON file')
+    parser.add_argument('--check', help='compare the result hashes with this JSON file, exit with 1 on a mismatch')
+    options = parser.parse_args()
+
+    nodes = replication_nodes(data=options.data, out_dir=options.out)
+    report = build(nodes, targets=options.targets or None, cache_dir=os.path.join(options.out, 'cache'),
+                   workers=options.workers, force=options.force, hashes=options.hashes)
+    print(report.to_string(index=False))
+    if options.check:
+        with open(options.check) as f:
+            expected = json.load(f)
+        mismatch = [name for name, digest in zip(report.name, report.hash) if expected.get(name) != digest]
+        if mismatch:
+            print('Result hashes differ for: ' + ', '.join(mismatch))
+            sys.exit(1)
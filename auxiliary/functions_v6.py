@@ -9,13 +9,31 @@ Created on Fri Jul 17 02:02:36 2020
 ##Functions for replication study
 
 # Import modules.
+import csv
+import hashlib
+import html
+import io
+import itertools
+import json
+import os
+import tempfile
+import time
+import weakref
 import pandas as pd
 import statsmodels.api as sm
 import numpy as np
 
-from scipy import stats
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from scipy import special, stats
 from linearmodels import IV2SLS
 
+# File extensions of the table output formats.
+TABLE_FORMATS = {'text': 'txt', 'latex': 'tex', 'markdown': 'md', 'html': 'html', 'csv': 'csv'}
+
+# Formats written by the table functions by default.
+DEFAULT_TABLE_FORMATS = tuple(TABLE_FORMATS)
+
 # Get significance asterix.
 def significance(pval):
     if type(pval) == str:
@@ -55,16 +73,11 @@ def get_cohort_dummy(df, col, c):
     df[newcol] = df[col].apply(dummy_mapping)
     return df
 
-# Set up data frame and variables for regressions.
-def get_variables():
+# Get lists of variable names for regressions.
+def get_variable_lists():
     '''
+    Returns the lists of column names used in the regression functions. They do not depend on the data.
     '''
-    # Load data.
-    path = ('data/Crime.dta')
-    df = pd.read_stata(path)
-    # For the regressions below, add a constant to the data frame.
-    df['constant'] = 1
-    
     # Get a variable representing the strings to add them to regression functions.
     constant = ['constant']
     highnumber = ['highnumber']
@@ -76,10 +89,6 @@ def get_variables():
     # Get list of origin dummy names. Omit 'argentine' i.o.t. avoid multicollinearity.
     origin = ['naturalized', 'indigenous']
     
-    # Get cohort dummies from 1929 to 1965.
-    for year in list(range(1929, 1966, 1)):
-        get_cohort_dummy(df=df, col='cohort', c=year)
-    
     # Get list of cohort dummy names.
     cohort_years = list(range(1930, 1966, 1))  # Omit cohort_1929 (multicollinearity).
     cohorts = []
@@ -92,11 +101,37 @@ def get_variables():
     for i in district_numbers:
         districts.append('dist' + f'{i}')
         
+    hn_malvinas = ['hn_malvinas']
+    
+    return constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas
+
+# Add constant, cohort dummies and interaction terms to the raw crime data.
+def prepare_panel(df):
+    '''
+    df: data frame with the columns of data/Crime.dta.
+    '''
+    # For the regressions below, add a constant to the data frame.
+    df['constant'] = 1
+    
+    # Get cohort dummies from 1929 to 1965.
+    for year in list(range(1929, 1966, 1)):
+        get_cohort_dummy(df=df, col='cohort', c=year)
+        
     # Generate variable hn_malvinas: interaction term between highnumber and malvinas.
     df['hn_malvinas'] = df.highnumber*df.malvinas
-    hn_malvinas = ['hn_malvinas']
     
-    return constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df
+    return df
+
+# Set up data frame and variables for regressions.
+def get_variables(path='data/Crime.dta'):
+    '''
+    path: path of the crime panel (Stata file with the columns of data/Crime.dta).
+    '''
+    # Load data.
+    df = pd.read_stata(path)
+    df = prepare_panel(df)
+    
+    return get_variable_lists() + (df,)
 
 # Get plot as in figure A.1.
 def binned_plot(df, bin_num, ylim, years):
@@ -117,62 +152,220 @@ def binned_plot(df, bin_num, ylim, years):
         df_bin.plot.line(x='Draftnumber', y='Failure rate', title=f'Failure Rates for Cohort {i}', ylim=ylim)
         
 # Regressions (initially for table 4).
-def regress(df, method, cohort_range, cohort_dummies, controls):
+def regress(df, method, cohort_range, cohort_dummies, controls, weak_iv=False):
     '''
     df: data frame to use.
     method: string, either 'IV' for IV2SLSL by linearmodels or 'OLS' for OLS by statsmodels.
     cohort_range: list/2-tuple, indicating first and last cohort.
     cohorts: cohort dummies to include, for 1958-'62: cohorts=cohorts[29: 33].
     controls: string, either 'y' or 'n'.
+    weak_iv: bool, for method 'IV' also return the weak-instrument diagnostics of
+    weak_iv_diagnostics() as second element.
     '''
     constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
+    return regress_prepared(df, method, cohort_range, cohort_dummies, controls, weak_iv)
+
+# Regressions on an already prepared data frame.
+def regress_prepared(df, method, cohort_range, cohort_dummies, controls, weak_iv=False):
+    '''
+    Same as regress(), but uses df as returned by get_variables() instead of reloading the data.
+    '''
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas = get_variable_lists()
+    control_vars = origin + districts if controls == 'y' else []
     
+    # Design matrices come from the cache; columns are ordered so that X, y etc. are column views.
     if method == 'OLS':
-        if controls == 'y':
-            vars_controls = highnumber + cohort_dummies + origin + districts + constant
-            df = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])][vars_controls + crimerate].dropna().copy()
-            X = df[vars_controls].copy()
-            y = df.loc[:, 'crimerate']
-                
-            rslts = sm.OLS(y, X).fit()
-            return rslts
-        
-        if controls == 'n':
-            vars_no_controls = highnumber + cohort_dummies + constant
-            df = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])][vars_no_controls + crimerate].dropna().copy()
-            X = df[vars_no_controls].copy()
-            y = df.loc[:, 'crimerate']
+        regressors = highnumber + cohort_dummies + control_vars + constant
+        design, mask = cached_design(df, cohort_range, regressors + crimerate)
+        k = len(regressors)
+        X = pd.DataFrame(design[:, :k], columns=regressors, copy=False)
+        y = pd.Series(design[:, k], name='crimerate', copy=False)
                 
-            rslts = sm.OLS(y, X).fit()
-            return rslts
+        rslts = sm.OLS(y, X).fit()
+        return rslts
         
     if method == 'IV':
-        
-        if controls == 'y':
-            cohorts=cohorts[29: 33]
-            vars_controls = highnumber + conscription + cohort_dummies + origin + districts + constant
-            df = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])][vars_controls + crimerate].copy().dropna(axis=0)
-            y = df.loc[:, 'crimerate']
-            
-            rslts = IV2SLS(y, df[constant + cohorts + origin + districts], df['sm'], df['highnumber']).fit()
-            return rslts
-        
-        if controls == 'n':
-            cohorts=cohorts[29: 33]
-            vars_no_controls = highnumber + conscription + cohort_dummies + constant
-            df = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])][vars_no_controls + crimerate].copy().dropna(axis=0)
-            y = df.loc[:, 'crimerate']
+        cohorts=cohorts[29: 33]
+        exog = constant + cohorts + control_vars
+        # Rows are dropped on missing values in all variables of the specification.
+        extra = [c for c in cohort_dummies if c not in exog]
+        design, mask = cached_design(df, cohort_range, exog + conscription + highnumber + crimerate + extra)
+        k = len(exog)
+        y = pd.Series(design[:, k + 2], name='crimerate', copy=False)
             
-            rslts = IV2SLS(y, df[constant + cohorts], df['sm'], df['highnumber']).fit()
-            return rslts
+        rslts = IV2SLS(y, pd.DataFrame(design[:, :k], columns=exog, copy=False), pd.Series(design[:, k], name='sm', copy=False),
+                       pd.Series(design[:, k + 1], name='highnumber', copy=False)).fit()
+        if weak_iv:
+            return rslts, weak_iv_diagnostics(df, cohort_range, cohort_dummies, controls)
+        return rslts
         
+# Cache of design matrices by data frame, cohort window, columns and dropna policy.
+DESIGN_CACHE_MAX_BYTES = 256*1024**2
+_design_cache = OrderedDict()
+
+# Invalidation token of a data frame for cached designs and masks.
+def _frame_token(df):
+    '''
+    Returns the column list and the shape. Entries are keyed by id(df), so the token picks up added,
+    dropped or renamed columns and rows; values changed in place need invalidate_caches(df).
+    '''
+    return tuple(df.columns), df.shape
+
+# Drop the cached designs, missingness masks and first stages of a data frame.
+def invalidate_caches(df):
+    '''
+    Call after changing values of df in place (e.g. df.loc[rows, col] = value), so that
+    cached_design(), estimation_sample() and first_stage_by_cohort() do not serve the old values.
+    '''
+    for cache in [_design_cache, _missing_cache, _first_stage_cache]:
+        for key in [k for k in cache if (k[0] if isinstance(k, tuple) else k) == id(df)]:
+            del cache[key]
+
+# Get a cached design matrix for a cohort window.
+def cached_design(df, cohort_range, columns, dropna=True, dtype=np.float64):
+    '''
+    Returns a Fortran-ordered array with the requested columns for the rows of cohort_range
+    (without rows with missing values if dropna) and the boolean row mask into df. Arrays are kept
+    in a least-recently-used cache bounded by DESIGN_CACHE_MAX_BYTES, so repeated specifications
+    on the same data frame skip the pandas selection, copy and dropna.
+    df: data frame as returned by get_variables(). Entries are tied to this object and its column
+    list and shape; after changing values in place call invalidate_caches(df).
+    cohort_range: list/2-tuple, indicating first and last cohort.
+    columns: list of column names.
+    dropna: bool, drop rows with missing values in any of the columns.
+    dtype: np.float64 or np.float32 (half the memory and bandwidth, see regress_mixed()). The
+    largest relative rounding error of a float32 design is available from design_rounding().
+    '''
+    key = (id(df), tuple(cohort_range), tuple(columns), dropna, np.dtype(dtype).str)
+    token = _frame_token(df)
+    entry = _design_cache.get(key)
+    if entry is not None and entry[0]() is df and entry[1] == token:
+        _design_cache.move_to_end(key)
+        return entry[2], entry[3]
+    
+    # Rows come from the missingness index; columns are taken one by one into the Fortran array.
+    rows = estimation_sample(df, columns if dropna else [], cohort_range)
+    design = np.empty((len(rows), len(columns)), dtype=dtype, order='F')
+    rounding = 0.0
+    for j, col in enumerate(columns):
+        values = df[col].to_numpy(dtype=np.float64)[rows]
+        design[:, j] = values
+        if design.dtype != np.float64 and len(values):
+            scale = np.nanmax(np.abs(values))
+            if scale > 0:
+                rounding = max(rounding, np.nanmax(np.abs(design[:, j] - values))/scale)
+    mask = np.zeros(len(df), dtype=bool)
+    mask[rows] = True
+    design.flags.writeable = False
+    
+    _design_cache[key] = (weakref.ref(df), token, design, mask, rounding)
+    # Drop entries of data frames that no longer exist, then the least recently used ones.
+    for old_key in [k for k, e in _design_cache.items() if e[0]() is None]:
+        del _design_cache[old_key]
+    while sum(e[2].nbytes + e[3].nbytes for e in _design_cache.values()) > DESIGN_CACHE_MAX_BYTES and len(_design_cache) > 1:
+        _design_cache.popitem(last=False)
+    return design, mask
+
+# Rounding error of a cached design matrix.
+def design_rounding(df, cohort_range, columns, dropna=True, dtype=np.float32):
+    '''
+    Returns the largest absolute difference between the stored and the float64 values of any
+    column of cached_design(df, cohort_range, columns, dropna, dtype), relative to the largest
+    absolute value of that column. Zero for float64 designs and for data that float32 represents
+    exactly (e.g. dummies and float32 columns of the .dta files).
+    '''
+    cached_design(df, cohort_range, columns, dropna, dtype)
+    return _design_cache[(id(df), tuple(cohort_range), tuple(columns), dropna, np.dtype(dtype).str)][4]
+
+# Packed bitmasks of non-missing values by data frame and column.
+_missing_cache = {}
+
+# Missingness index of a data frame.
+def missing_index(df, columns=None):
+    '''
+    Returns a dict column -> np.packbits() bitmask of the rows with a non-missing value. Masks are
+    computed on first use of a column and kept per data frame object like cached_design(); all
+    masks are recomputed when the column list or shape changed or after invalidate_caches(df).
+    df: data frame to use.
+    columns: list of columns, None for all columns.
+    '''
+    entry = _missing_cache.get(id(df))
+    token = _frame_token(df)
+    if entry is None or entry[0]() is not df or entry[1] != token:
+        for old_key in [k for k, e in _missing_cache.items() if e[0]() is None]:
+            del _missing_cache[old_key]
+        entry = (weakref.ref(df), token, {})
+        _missing_cache[id(df)] = entry
+    masks = entry[2]
+    for col in (df.columns if columns is None else columns):
+        if col not in masks:
+            masks[col] = np.packbits(df[col].notna().to_numpy())
+    return {col: masks[col] for col in (df.columns if columns is None else columns)}
+
+# Packed bitmask of the rows of a cohort window.
+def _window_bits(df, cohort_range):
+    cohort = df['cohort'].to_numpy()
+    if cohort_range is None:
+        return np.packbits(np.ones(len(df), dtype=bool))
+    return np.packbits((cohort >= cohort_range[0]) & (cohort <= cohort_range[1]))
+
+# Estimation sample of a specification as row positions.
+def estimation_sample(df, columns, cohort_range=None):
+    '''
+    Returns the positions (for .iloc / NumPy indexing) of the rows in cohort_range without a
+    missing value in any of columns, from the intersection of the bitmasks of missing_index().
+    df: data frame to use.
+    columns: list of columns of the specification.
+    cohort_range: list/2-tuple, first and last cohort, None for all rows.
+    '''
+    masks = missing_index(df, columns)
+    bits = _window_bits(df, cohort_range)
+    for col in columns:
+        bits = bits & masks[col]
+    return np.flatnonzero(np.unpackbits(bits, count=len(df)))
+
+# Sample sizes and dropped rows of specifications.
+def sample_report(df, specs=None):
+    '''
+    Returns a data frame by specification with the rows of the cohort window, nobs, dropped rows
+    and, for every column with missing values in the window, the number of rows it misses (a row
+    can miss several columns).
+    df: data frame as returned by get_variables().
+    specs: dict name -> (columns, cohort_range). By default the specifications of tables 4 and 5.
+    '''
+    if specs is None:
+        constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas = get_variable_lists()
+        specs = {}
+        for method, w, controls in [('OLS', [1958, 1962], 'n'), ('OLS', [1958, 1962], 'y'), ('IV', [1958, 1962], 'n'),
+                                    ('IV', [1958, 1962], 'y'), ('OLS', [1929, 1965], 'n'), ('OLS', [1929, 1955], 'n'),
+                                    ('OLS', [1958, 1965], 'n')]:
+            exog, endog, instruments, extra = _regress_spec(method, ['cohort_' + f'{i}' for i in range(w[0] + 1, w[1] + 1)], controls)
+            specs[f'table 4 {method} {w[0]}-{w[1]} controls={controls}'] = (exog + endog + instruments + crimerate + extra, w)
+        for extra, w in [(hn_malvinas, [1929, 1965]), (hn_malvinas, [1958, 1965]), (navy, [1929, 1965]), (navy, [1958, 1965])]:
+            specs[f'table 5 {extra[0]} {w[0]}-{w[1]}'] = (highnumber + extra + constant + crimerate, w)
+    
+    rows = []
+    for name, (columns, cohort_range) in specs.items():
+        masks = missing_index(df, columns)
+        window = _window_bits(df, cohort_range)
+        in_window = int(np.unpackbits(window, count=len(df)).sum())
+        nobs = len(estimation_sample(df, columns, cohort_range))
+        missing = {col: int(np.unpackbits(window & ~masks[col], count=len(df)).sum()) for col in columns}
+        rows.append({'spec': name, 'rows': in_window, 'nobs': nobs, 'dropped': in_window - nobs,
+                     'missing': {col: n for col, n in missing.items() if n}})
+    return pd.DataFrame(rows).set_index('spec')
+
 # Regressions for table 4.
-def regressions_table_4(df):
+def regressions_table_4(df, cov_type='HC0'):
     '''
     Function returns regression results as in table 4 in Galiani et al. 2011.
     First, it computes the estimates.
     Arguments:
     df: data frame to use.
+    cov_type: covariance type of the standard errors and p-values (see robust_covariances()). Other
+    types than 'HC0' come from fit_std_errors() on the fit of each column and their p-values from the
+    same standard errors, with the t distribution (n - k degrees of freedom) for OLS and the normal
+    distribution for 2SLS.
     '''
     constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
     # Lists to store estimates, standard errors, no. of obs, percent change, and whether controls were used.
@@ -184,14 +377,18 @@ def regressions_table_4(df):
     pval_hn = []
     percent_change = []
     num_obs = []
+    fits = []
     
-    # For computing percent change:
-    p1 = df['sm'][df.cohort >= 1958][df.cohort <= 1962][df.highnumber == 1].dropna().mean()
-    p2 = df['sm'][df.cohort >= 1958][df.cohort <= 1962][df.highnumber == 0].dropna().mean()
+    # For computing percent change: compliance rates of the cohorts 1958-1962 from the cached first
+    # stage and mean crime rates of the draft exempt from grouped moments.
+    p1, p2 = pooled_compliance(df)
+    def ineligible_crime(cohort_range):
+        return wald_by_group(df, group=None, cohort_range=cohort_range).y_0.iloc[0]
     
     # Get regressions.
     # Col 1.
-    rslts = regress(df=df, method='OLS', cohort_range=[1958, 1962], cohort_dummies=cohorts[29: 33], controls='n')
+    rslts = regress_prepared(df=df, method='OLS', cohort_range=[1958, 1962], cohort_dummies=cohorts[29: 33], controls='n')
+    fits.append(rslts)
             
     est_sm.append('-')
     est_hn.append(rslts.params['highnumber'])
@@ -202,11 +399,12 @@ def regressions_table_4(df):
     num_obs.append(rslts.nobs)
             
     wald = (rslts.params['highnumber']/(p1 - p2))
-    mean_crime = df.crimerate[df.cohort >= 1958][df.cohort <= 1962][df.highnumber == 0].mean()
+    mean_crime = ineligible_crime([1958, 1962])
     percent_change.append(100*wald/mean_crime)
             
     # Col 2.
-    rslts = regress(df=df, method='OLS', cohort_range=[1958, 1962], cohort_dummies=cohorts[29: 33], controls='y')
+    rslts = regress_prepared(df=df, method='OLS', cohort_range=[1958, 1962], cohort_dummies=cohorts[29: 33], controls='y')
+    fits.append(rslts)
             
     est_sm.append('-')
     est_hn.append(rslts.params['highnumber'])
@@ -217,11 +415,12 @@ def regressions_table_4(df):
     num_obs.append(rslts.nobs)
             
     wald = (rslts.params['highnumber']/(p1 - p2))
-    mean_crime = df.crimerate[df.cohort >= 1958][df.cohort <= 1962][df.highnumber == 0].mean()
+    mean_crime = ineligible_crime([1958, 1962])
     percent_change.append(100*wald/mean_crime)
             
     # Col 3.
-    rslts = regress(df=df, method='IV', cohort_range=[1958, 1962], cohort_dummies=cohorts[29: 33], controls='n')
+    rslts = regress_prepared(df=df, method='IV', cohort_range=[1958, 1962], cohort_dummies=cohorts[29: 33], controls='n')
+    fits.append(rslts)
             
     est_sm.append(rslts.params['sm'])
     est_hn.append('-')
@@ -231,11 +430,12 @@ def regressions_table_4(df):
     pval_hn.append('-')
     num_obs.append(rslts.nobs)
             
-    mean_crime = df.crimerate[df.cohort >= 1958][df.cohort <= 1962][df.highnumber == 0].mean()
+    mean_crime = ineligible_crime([1958, 1962])
     percent_change.append(100*rslts.params['sm']/mean_crime)
             
     #Col 4.
-    rslts = regress(df=df, method='IV', cohort_range=[1958, 1962], cohort_dummies=cohorts[29: 33], controls='y')
+    rslts = regress_prepared(df=df, method='IV', cohort_range=[1958, 1962], cohort_dummies=cohorts[29: 33], controls='y')
+    fits.append(rslts)
             
     est_sm.append(rslts.params['sm'])
     est_hn.append('-')
@@ -245,11 +445,12 @@ def regressions_table_4(df):
     pval_hn.append('-')
     num_obs.append(rslts.nobs)
             
-    mean_crime = df.crimerate[df.cohort >= 1958][df.cohort <= 1962][df.highnumber == 0].mean()
+    mean_crime = ineligible_crime([1958, 1962])
     percent_change.append(100*rslts.params['sm']/mean_crime)
     
     # Col 5.
-    rslts = regress(df=df, method='OLS', cohort_range=[1929, 1965], cohort_dummies=cohorts[0: 36], controls='n')
+    rslts = regress_prepared(df=df, method='OLS', cohort_range=[1929, 1965], cohort_dummies=cohorts[0: 36], controls='n')
+    fits.append(rslts)
             
     est_sm.append('-')
     est_hn.append(rslts.params['highnumber'])
@@ -260,11 +461,12 @@ def regressions_table_4(df):
     num_obs.append(rslts.nobs)
             
     wald = (rslts.params['highnumber']/(p1 - p2))
-    mean_crime = df.crimerate[df.cohort >= 1929][df.cohort <= 1965][df.highnumber == 0].mean()
+    mean_crime = ineligible_crime([1929, 1965])
     percent_change.append(100*wald/mean_crime)
             
     # Col 6.
-    rslts = regress(df=df, method='OLS', cohort_range=[1929, 1955], cohort_dummies=cohorts[0: 26], controls='n')
+    rslts = regress_prepared(df=df, method='OLS', cohort_range=[1929, 1955], cohort_dummies=cohorts[0: 26], controls='n')
+    fits.append(rslts)
             
     est_sm.append('-')
     est_hn.append(rslts.params['highnumber'])
@@ -275,11 +477,12 @@ def regressions_table_4(df):
     num_obs.append(rslts.nobs)
             
     wald = (rslts.params['highnumber']/(p1 - p2))
-    mean_crime = df.crimerate[df.cohort >= 1929][df.cohort <= 1955][df.highnumber == 0].mean()
+    mean_crime = ineligible_crime([1929, 1955])
     percent_change.append(100*wald/mean_crime)
             
     # Col 7.
-    rslts = regress(df=df, method='OLS', cohort_range=[1958, 1965], cohort_dummies=cohorts[29: 36], controls='n')
+    rslts = regress_prepared(df=df, method='OLS', cohort_range=[1958, 1965], cohort_dummies=cohorts[29: 36], controls='n')
+    fits.append(rslts)
             
     est_sm.append('-')
     est_hn.append(rslts.params['highnumber'])
@@ -290,187 +493,149 @@ def regressions_table_4(df):
     num_obs.append(rslts.nobs)
             
     wald = (rslts.params['highnumber']/(p1 - p2))
-    mean_crime = df.crimerate[df.cohort >= 1958][df.cohort <= 1965][df.highnumber == 0].mean()
+    mean_crime = ineligible_crime([1958, 1965])
     percent_change.append(100*wald/mean_crime)
+    
+    # Standard errors of another covariance type from the scores of the fit of each column.
+    if cov_type != 'HC0':
+        specs = [('OLS', [1958, 1962], cohorts[29: 33], 'n'), ('OLS', [1958, 1962], cohorts[29: 33], 'y'),
+                 ('IV', [1958, 1962], cohorts[29: 33], 'n'), ('IV', [1958, 1962], cohorts[29: 33], 'y'),
+                 ('OLS', [1929, 1965], cohorts[0: 36], 'n'), ('OLS', [1929, 1955], cohorts[0: 26], 'n'),
+                 ('OLS', [1958, 1965], cohorts[29: 36], 'n')]
+        for i, (rslts, (method, cohort_range, cohort_dummies, controls)) in enumerate(zip(fits, specs)):
+            exog, endog, instruments, extra = _regress_spec(method, cohort_dummies, controls)
+            sample = df.iloc[estimation_sample(df, exog + endog + instruments + crimerate + extra, cohort_range)]
+            std_errors = fit_std_errors(rslts, (cov_type,), {'cohort': sample['cohort'].to_numpy(), 'district': get_district(sample)})
+            if method == 'IV':
+                std_sm[i] = std_errors.iloc[:, 0]['sm']
+                pval_sm[i] = 2*stats.norm.sf(abs(rslts.params['sm']/std_sm[i]))
+            else:
+                std_hn[i] = std_errors.iloc[:, 0]['highnumber']
+                pval_hn[i] = 2*stats.t.sf(abs(rslts.params['highnumber']/std_hn[i]), num_obs[i] - len(rslts.params))
             
     return est_sm, est_hn, std_sm, std_hn, pval_sm, pval_hn, percent_change, num_obs
 
 # Get table 4.
-def table_4(df):
+def table_4(df, path=None, formats=DEFAULT_TABLE_FORMATS, cov_type='HC0'):
     '''
     Function returns table representing table 4 in Galiani et al. 2011.
     Arguments:
     df: data frame to use.
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
+    cov_type: covariance type of the standard errors, see regressions_table_4().
     '''
     #constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
     # Get regression results.
-    est_sm, est_hn, std_sm, std_hn, pval_sm, pval_hn, percent_change, num_obs = regressions_table_4(df)
+    grid = grid_table_4(*regressions_table_4(df, cov_type))
+    if cov_type != 'HC0':
+        grid['notes'] = grid['notes'] + [f'Standard errors: {_cov_label(cov_type)}.']
     
     # Print table.
-    print('\033[1m' 'Table 4 - Estimated Impact of Conscription on Crime Rates ' '\033[0m')
-    print(128*'_')
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Cohort', '1958-1962', '', "1958-1962", '', "1958-1962", '', "1958-1962", '', "1929-1965", '', "1929-1955", '', \
-                "1958-1965", '', ''))
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('', '(1)', '', '(2)', '', '(3)', '', '(4)', '', '(5)', '', '(6)', '', \
-                '(7)', '', ''))
-    print(128*'_')
-
-
-    for i in range(len(est_hn)):
-        if i == 0:
-            print('{:<15s}'.format("Draft Eligible"), end="")
-        if type(est_hn[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:   
-            print('\033[1m' '{:>13.4f}{:<3s}' '\033[0m'.format(est_hn[i], significance(pval_hn[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_hn)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        if type(est_hn[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:
-            print('{:>13.4f}{:<3s}'.format(std_hn[i], ''), end="")
-        
-    print('\n')
-        
-    for i in range(len(est_sm)):
-        if i == 0:
-            print('{:<15s}'.format("Conscription"), end="")
-        if type(est_sm[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:   
-            print('\033[1m' '{:>13.4f}{:<3s}' '\033[0m'.format(est_sm[i], significance(pval_sm[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_sm)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        if type(est_sm[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:
-            print('{:>13.4f}{:<3s}'.format(std_sm[i], ''), end="")
-    
-    print('\n')
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
 
-    for i in range(len(percent_change)):
-        if i == 0:
-            print('{:<15s}'.format('Percent change'), end="")
-        print('\033[1m' '{:>13.2f}{:<3s}' '\033[0m'.format(percent_change[i], ''), end="")
-    
-    print('\n')
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Controls', 'No', '', 'Yes', '', 'No', '', 'Yes', '', 'No', '', 'No', '', 'No', '', ''))
-    
-    print('\n')
-
-    for i in range(len(num_obs)):
-        if i == 0:
-            print('{:<15s}'.format('Observations'), end="")
-        print('\033[1m' '{:>13.0f}{:<3s}' '\033[0m'.format(num_obs[i], ''), end="")
-
-    print('\n')
-    
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Method', 'OLS', '', 'OLS', '', '2SLS', '', '2SLS', '', 'OLS', '', 'OLS', '', 'OLS', '', ''))
-
-    print(128*'_')
-    print('Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-ID number combination. All models')
-    print('include cohort dummies. The models in columns 2 and 4 include controls for origin (naturalized or indigenous) and dis-')
-    print('trict (the country is divided in 24 districts). In 2SLS models, the instrument for Conscription is Draft Eligible. Percent change')
-    print('for 2SLS models is calculated as 100 × Estimate/mean crime rate of draft-ineligible men. For intention-to-treat models, percent  ')
-    print('change is reported as 100 × Wald estimate/mean crime rate of draft-ineligible men, where the Wald estimate is calculated as ITT  ')
-    print('estitimate/(p1 − p2), where p1 is the probability of serving in the military among those that are draft-eligible, and p2 is the  ')
-    print('probability of serving in the military among those that are not draft-eligible (since we do not have information on compliance   ')
-    print('rates outside the cohorts of 1958 to 1962, in all cases we use the compliance rates for this period).                            ')
-    print('*** Significant at 1 percent level.')
-    print(' ** Significant at 5 percent level.')
+# Result grid of table 4.
+def grid_table_4(est_sm, est_hn, std_sm, std_hn, pval_sm, pval_hn, percent_change, num_obs):
+    '''
+    Arguments: the lists returned by regressions_table_4(), '-' marks an empty cell.
+    '''
+    def cells(values):
+        return [None if type(v) == str else v for v in values]
+    return make_grid(
+        title=['Table 4 - Estimated Impact of Conscription on Crime Rates '],
+        header=[['Cohort', '1958-1962', '1958-1962', '1958-1962', '1958-1962', '1929-1965', '1929-1955', '1958-1965'],
+                ['', '(1)', '(2)', '(3)', '(4)', '(5)', '(6)', '(7)']],
+        rows=[grid_row('Draft Eligible', cells(est_hn), pvalues=pval_hn, bold=True),
+              grid_row('', cells(std_hn)),
+              grid_row('Conscription', cells(est_sm), pvalues=pval_sm, bold=True),
+              grid_row('', cells(std_sm)),
+              grid_row('Percent change', percent_change, fmt='.2f', bold=True),
+              grid_row('Controls', ['No', 'Yes', 'No', 'Yes', 'No', 'No', 'No']),
+              grid_row('Observations', num_obs, fmt='.0f', bold=True),
+              grid_row('Method', ['OLS', 'OLS', '2SLS', '2SLS', 'OLS', 'OLS', 'OLS'])],
+        notes=['Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-ID number combination. All models',
+               'include cohort dummies. The models in columns 2 and 4 include controls for origin (naturalized or indigenous) and dis-',
+               'trict (the country is divided in 24 districts). In 2SLS models, the instrument for Conscription is Draft Eligible. Percent change',
+               'for 2SLS models is calculated as 100 × Estimate/mean crime rate of draft-ineligible men. For intention-to-treat models, percent  ',
+               'change is reported as 100 × Wald estimate/mean crime rate of draft-ineligible men, where the Wald estimate is calculated as ITT  ',
+               'estitimate/(p1 − p2), where p1 is the probability of serving in the military among those that are draft-eligible, and p2 is the  ',
+               'probability of serving in the military among those that are not draft-eligible (since we do not have information on compliance   ',
+               'rates outside the cohorts of 1958 to 1962, in all cases we use the compliance rates for this period).                            ',
+               '*** Significant at 1 percent level.',
+               ' ** Significant at 5 percent level.'],
+        width=128)
     
 # Table 6.
-def table_6():
-    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
+def table_6(path=None, formats=DEFAULT_TABLE_FORMATS, data='data/Crime.dta', weak_iv=False):
+    '''
+    Function returns table representing table 6 in Galiani et al. 2011.
+    Arguments:
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
+    data: path of the crime panel (see get_variables()).
+    weak_iv: bool, add the weak-instrument diagnostics of weak_iv_diagnostics() for every crime type.
+    '''
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables(data)
     df_reg = df[(df.cohort > 1957) & (df.cohort < 1963)].copy()
 
     reg_sm = []
     pval_sm = []
     std_sm = []
     change_sm = []
-    for crime in ['arms', 'property', 'sexual', 'murder', 'threat', 'drug', 'whitecollar']:
+    crimes = ['arms', 'property', 'sexual', 'murder', 'threat', 'drug', 'whitecollar']
+    for crime in crimes:
         # Dependent variable: crime
         y = df_reg.loc[:, crime]
         rslts = IV2SLS(y, df_reg[constant + cohorts[29: 33]], df_reg['sm'], df_reg['highnumber']).fit()
         
         # Get percent change.
-        ineligible_mean = df_reg[crime][df_reg.highnumber == 0].mean()  # Mean crime rate of ineligible ID-groups by type of crime.
+        ineligible_mean = wald_by_group(df_reg, crime, group=None).y_0.iloc[0]  # Mean crime rate of ineligible ID-groups by type of crime.
         change = ((rslts.params.sm)/(ineligible_mean))
     
         reg_sm.append(rslts.params.sm)
         pval_sm.append(rslts.pvalues.sm)
         std_sm.append(rslts.std_errors.sm)
         change_sm.append(change)
+    weak_iv_rows, weak_iv_notes = _weak_iv_rows([weak_iv_diagnostics(df, [1958, 1962], cohorts[29: 33], 'n', dependent=crime)
+                                                 for crime in crimes]) if weak_iv else ([], [])
         
-    print('\033[1m' 'Table 6 - Estimated Impact of Conscription on Crime rates, by Type of Crime' '\033[0m')
-    print(128*'_')
-    # Header.
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Dependent Var.', 'Weapons', "", 'Property', "", 'Sexual Attack', "", 'Murder', "", 'Threat', "", 'Drug Traff.', "", \
-                  'White Collar', '', ''))
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Cohort', '1958-1962', '', "1958-1962", '', "1958-1962", '', "1958-1962", '', "1958-1962", '', "1958-1962", '', \
-                  "1958-1962", '', ''))
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('', '(1)', '', '(2)', '', '(3)', '', '(4)', '', '(5)', '', '(6)', '', \
-                  '(7)', '', ''))
-    print(128*'_')
-
-
-    for i in range(len(reg_sm)):
-        if i == 0:
-            print('{:<15s}'.format("Conscription"), end="")
-        print('\033[1m' '{:>13.5f}{:<3s}' '\033[0m'.format(reg_sm[i], significance(pval_sm[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_sm)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        print('{:>13.5f}{:<3s}'.format(std_sm[i], ''), end="")
-    
-    print('\n')
-
-    for i in range(len(change_sm)):
-        if i == 0:
-            print('{:<15s}'.format('Percent change'), end="")
-        print('\033[1m' '{:>13.2f}{:<3s}' '\033[0m'.format(change_sm[i], ''), end="")
-    
-    print('\n')
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Observations', '5000', '', '5000', '', '5000', '', '5000', '', '5000', '', '5000', '', \
-                  '5000', '', ''))
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Method', '2SLS', '', '2SLS', '', '2SLS', '', '2SLS', '', '2SLS', '', '2SLS', '', '2SLS', '', ''))
-    print(128*'_')
-    print('Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-ID number combination. All mo-')
-    print('dels include cohort dummies. The instrument for Conscription is Draft eligible. Percent change is calculated as 100*Estimate/mean')
-    print('dependent variable of draft-ineligible men.')
-    print('*** Significant at 1 percent level.')
-    print(' ** Significant at 5 percent level.')
+    # Build table.
+    grid = make_grid(
+        title=['Table 6 - Estimated Impact of Conscription on Crime rates, by Type of Crime'],
+        header=[['Dependent Var.', 'Weapons', 'Property', 'Sexual Attack', 'Murder', 'Threat', 'Drug Traff.', 'White Collar'],
+                ['Cohort'] + 7*['1958-1962'],
+                ['', '(1)', '(2)', '(3)', '(4)', '(5)', '(6)', '(7)']],
+        rows=[grid_row('Conscription', reg_sm, fmt='.5f', pvalues=pval_sm, bold=True),
+              grid_row('', std_sm, fmt='.5f'),
+              grid_row('Percent change', change_sm, fmt='.2f', bold=True),
+              grid_row('Observations', 7*['5000']),
+              grid_row('Method', 7*['2SLS'])] + weak_iv_rows,
+        notes=['Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-ID number combination. All mo-',
+               'dels include cohort dummies. The instrument for Conscription is Draft eligible. Percent change is calculated as 100*Estimate/mean',
+               'dependent variable of draft-ineligible men.'] + weak_iv_notes +
+              ['*** Significant at 1 percent level.',
+               ' ** Significant at 5 percent level.'],
+        width=128)
+    
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
 
 # Table 5.
-def table_5():
+def table_5(path=None, formats=DEFAULT_TABLE_FORMATS, data='data/Crime.dta'):
+    '''
+    Function returns table representing table 5 in Galiani et al. 2011.
+    Arguments:
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
+    data: path of the crime panel (see get_variables()).
+    '''
     
     # Get data.
-    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables(data)
     
     # Lists for regression results.
     est_hn = []
@@ -486,9 +651,9 @@ def table_5():
     
     # Col 1.
     
-    df_29_65 = df[(df.cohort > 1928) & (df.cohort < 1966)][highnumber + hn_malvinas + constant + cohorts[0:36] + crimerate].copy().dropna(axis=0)
-    X = df_29_65[highnumber + hn_malvinas + constant + cohorts[0:36]].copy()
-    y = df_29_65.loc[:, 'crimerate']
+    rows = estimation_sample(df, highnumber + hn_malvinas + constant + cohorts[0:36] + crimerate, [1929, 1965])
+    X = df[highnumber + hn_malvinas + constant + cohorts[0:36]].iloc[rows]
+    y = df['crimerate'].iloc[rows]
     rslts = sm.OLS(y, X).fit()
     
     est_hn.append(rslts.params.highnumber)
@@ -504,9 +669,9 @@ def table_5():
     
     # Col 2.
     
-    df_58_65 = df[(df.cohort > 1957) & (df.cohort < 1966)][highnumber + hn_malvinas + constant + cohorts[29:36] + crimerate].copy().dropna(axis=0)
-    X = df_58_65[highnumber + hn_malvinas + constant + cohorts[29:36]].copy()
-    y = df_58_65.loc[:, 'crimerate']
+    rows = estimation_sample(df, highnumber + hn_malvinas + constant + cohorts[29:36] + crimerate, [1958, 1965])
+    X = df[highnumber + hn_malvinas + constant + cohorts[29:36]].iloc[rows]
+    y = df['crimerate'].iloc[rows]
     rslts = sm.OLS(y, X).fit()
     
     est_hn.append(rslts.params.highnumber)
@@ -522,9 +687,9 @@ def table_5():
     
     # Col 3.
     
-    df_29_65 = df[(df.cohort > 1928) & (df.cohort < 1966)][highnumber + navy + constant + cohorts[0:36] + crimerate].copy().dropna(axis=0)
-    X = df_29_65[highnumber + navy + constant + cohorts[0:36]].copy()
-    y = df_29_65.loc[:, 'crimerate']
+    rows = estimation_sample(df, highnumber + navy + constant + cohorts[0:36] + crimerate, [1929, 1965])
+    X = df[highnumber + navy + constant + cohorts[0:36]].iloc[rows]
+    y = df['crimerate'].iloc[rows]
     rslts = sm.OLS(y, X).fit()
     
     est_hn.append(rslts.params.highnumber)
@@ -539,9 +704,9 @@ def table_5():
     pval_na.append(rslts.pvalues.navy)
     
     # Col 4.
-    df_58_65 = df[(df.cohort > 1957) & (df.cohort < 1966)][highnumber + navy + constant + cohorts[29:36] + crimerate].copy().dropna(axis=0)
-    X = df_58_65[highnumber + navy + constant + cohorts[29:36]].copy()
-    y = df_58_65.loc[:, 'crimerate']
+    rows = estimation_sample(df, highnumber + navy + constant + cohorts[29:36] + crimerate, [1958, 1965])
+    X = df[highnumber + navy + constant + cohorts[29:36]].iloc[rows]
+    y = df['crimerate'].iloc[rows]
     rslts = sm.OLS(y, X).fit()
     
     est_hn.append(rslts.params.highnumber)
@@ -555,112 +720,48 @@ def table_5():
     pval_mal.append('')
     pval_na.append(rslts.pvalues.navy)
     
-    # Print table.
-    print('\033[1m' 'Table 5 - Estimated Impact of Conscription on Crime Rates for Peacetime' '\033[0m')
-    print('\033[1m' 'versus Wartime Service and 1-Year versus 2-Year Service' '\033[0m')
-    print(80*'_')
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Cohort', '1929-1965', '', "1958-1965", '', "1929-1965", '', "1958-1965", '', ''))
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('', '(1)', '', '(2)', '', '(3)', '', '(4)', '', ''))
-    print(80*'_')
-    
-    # Draft Eligible.
-
-    for i in range(len(est_hn)):
-        if i == 0:
-            print('{:<15s}'.format("Draft Eligible"), end="")
-        if type(est_hn[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:   
-            print('\033[1m' '{:>13.5f}{:<3s}' '\033[0m'.format(est_hn[i], significance(pval_hn[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_hn)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        if type(est_hn[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:
-            print('{:>13.4f}{:<3s}'.format(std_hn[i], ''), end="")
-        
-    print('\n')
-    
-    # Falkland War.
-        
-    for i in range(len(est_mal)):
-        if i == 0:
-            print('{:<15s}'.format("War Eligible"), end="")
-        if type(est_mal[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:   
-            print('\033[1m' '{:>13.4f}{:<3s}' '\033[0m'.format(est_mal[i], significance(pval_mal[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_mal)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        if type(est_mal[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:
-            print('{:>13.4f}{:<3s}'.format(std_mal[i], ''), end="")
-            
-    print('\n')
-    
-    # Navy
+    # Build table.
+    def cells(values):
+        return [None if type(v) == str else v for v in values]
+    grid = make_grid(
+        title=['Table 5 - Estimated Impact of Conscription on Crime Rates for Peacetime',
+               'versus Wartime Service and 1-Year versus 2-Year Service'],
+        header=[['Cohort', '1929-1965', '1958-1965', '1929-1965', '1958-1965'],
+                ['', '(1)', '(2)', '(3)', '(4)']],
+        rows=[grid_row('Draft Eligible', cells(est_hn), fmt='.5f', pvalues=pval_hn, bold=True),
+              grid_row('', cells(std_hn)),
+              grid_row('War Eligible', cells(est_mal), pvalues=pval_mal, bold=True),
+              grid_row('', cells(std_mal)),
+              grid_row('Navy Eligible', cells(est_na), pvalues=pval_na, bold=True),
+              grid_row('', cells(std_na)),
+              grid_row('Observations', n_obs, fmt='.0f', bold=True),
+              grid_row('Method', 4*['OLS'])],
+        notes=['Notes: Robust standard errors are shown below estimates. The level of observation',
+               'is the cohort-ID number combination. War Eligible is a dummy that takes the value',
+               'of one for the draft eligible from cohorts of 1962 and 1963. Navy Eligible is a  ',
+               'dummy variable that takes the value of one for those ID numbers eligible to serve',
+               'in the Navy. All models include cohort dummies.',
+               '** Significant at 5 percent level.',
+               ' * Significant at 10 percent level.'],
+        width=80)
     
-    for i in range(len(est_na)):
-        if i == 0:
-            print('{:<15s}'.format("Navy Eligible"), end="")
-        if type(est_na[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:   
-            print('\033[1m' '{:>13.4f}{:<3s}' '\033[0m'.format(est_na[i], significance(pval_na[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_na)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        if type(est_na[i]) == str:
-            print('{:>13s}{:<3s}'.format('', ''), end="")
-        else:
-            print('{:>13.4f}{:<3s}'.format(std_na[i], ''), end="")
-    
-    
-    print('\n')
-    
-    # Obs.
-
-    for i in range(len(n_obs)):
-        if i == 0:
-            print('{:<15s}'.format('Observations'), end="")
-        print('\033[1m' '{:>13.0f}{:<3s}' '\033[0m'.format(n_obs[i], ''), end="")
-
-    print('\n')
-    
-    # Method.
-    
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Method', 'OLS', '', 'OLS', '', 'OLS', '', 'OLS', '', ''))
-
-    print(80*'_')
-    print('Notes: Robust standard errors are shown below estimates. The level of observation')
-    print('is the cohort-ID number combination. War Eligible is a dummy that takes the value')
-    print('of one for the draft eligible from cohorts of 1962 and 1963. Navy Eligible is a  ')
-    print('dummy variable that takes the value of one for those ID numbers eligible to serve')
-    print('in the Navy. All models include cohort dummies.')
-    print('** Significant at 5 percent level.')
-    print(' * Significant at 10 percent level.')
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
     
 # Extension table 4.
-def extension_table_4():
+def extension_table_4(path=None, formats=DEFAULT_TABLE_FORMATS, data='data/Crime.dta', weak_iv=False):
+    '''
+    Function returns extension table E.4: 2SLS estimates for each core cohort separately.
+    Arguments:
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
+    data: path of the crime panel (see get_variables()).
+    weak_iv: bool, add the weak-instrument diagnostics of weak_iv_by_group().
+    '''
     # Set up df etc.
-    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables(data)
     
     # Lists to fill with estimates.
     reg_sm = []
@@ -670,75 +771,57 @@ def extension_table_4():
     
     # No controls.
     years = list(range(1958, 1963, 1))
+    # All core cohorts are fitted jointly by cohort.
+    rslts = regress_by_group(df=df, method='IV', group='cohort', dependent='crimerate', exog=constant, groups=years)
+    weak_iv_rows, weak_iv_notes = _weak_iv_rows([d for _, d in weak_iv_by_group(df, 'cohort', constant, groups=years).iterrows()]) \
+        if weak_iv else ([], [])
+    # Mean crime rate of ineligible ID-groups by cohort.
+    ineligible_mean = wald_by_group(df, 'crimerate', groups=years).y_0
     for i in years:
-        df_reg = df[df.cohort == i].copy()
-        # Dependent variable: conscription.
-        rslts = IV2SLS(df_reg.loc[:, 'crimerate'], df_reg[constant], df_reg['sm'], df_reg['highnumber']).fit()
-        
         # Get percent change.
-        ineligible_mean = df_reg['crimerate'][df_reg.highnumber == 0].mean()  # Mean crime rate of ineligible ID-groups by type of crime.
-        change = (100*(rslts.params.sm)/(ineligible_mean))
+        change = (100*(rslts.params[(i, 'sm')])/(ineligible_mean[i]))
     
-        reg_sm.append(rslts.params.sm)
-        pval_sm.append(rslts.pvalues.sm)
-        std_sm.append(rslts.std_errors.sm)
+        reg_sm.append(rslts.params[(i, 'sm')])
+        pval_sm.append(rslts.pvalues[(i, 'sm')])
+        std_sm.append(rslts.std_errors[(i, 'sm')])
         change_sm.append(change)
     
-    width = 97    
-    print('\033[1m' 'Table E.4 - Estimated Impact of Conscription on Crime rates, for each Core Cohort Separately' '\033[0m')
-    print('\033[1m' '(Dependent Variable: Crime Rate)' '\033[0m')
-    print(width*'_')
-    
-    
-    for i in years:
-        if i == 1958:
-            print('{:<15s}'.format('Cohort'), end="")
-        print('{:>13.0f}{:<3s}'.format(i, ''), end="")
-    
-    print('\n')
+    # Build table.
+    grid = make_grid(
+        title=['Table E.4 - Estimated Impact of Conscription on Crime rates, for each Core Cohort Separately',
+               '(Dependent Variable: Crime Rate)'],
+        header=[['Cohort'] + [str(i) for i in years],
+                ['', '(1)', '(2)', '(3)', '(4)', '(5)']],
+        rows=[grid_row('Conscription', reg_sm, fmt='.5f', pvalues=pval_sm, bold=True),
+              grid_row('', std_sm, fmt='.5f'),
+              grid_row('Percent change', change_sm, fmt='.2f', bold=True),
+              grid_row('Observations', 5*['1000']),
+              grid_row('Method', 5*['2SLS'])] + weak_iv_rows,
+        notes=['Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-',
+               'ID number combination. The instrument for Conscription is Draft Eligible. Percent change is cal-',
+               'culated as 100 × Estimate/mean crime rate of draft-ineligible men.'] + weak_iv_notes +
+              ['** Significant at 5 percent level.',
+               ' * Significant at 10 percent level.'],
+        width=97)
     
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('', '(1)', '', '(2)', '', '(3)', '', '(4)', '', '(5)', '', ''))
-    print(width*'_')
-
-
-    for i in range(len(reg_sm)):
-        if i == 0:
-            print('{:<15s}'.format("Conscription"), end="")
-        print('\033[1m' '{:>13.5f}{:<3s}' '\033[0m'.format(reg_sm[i], significance(pval_sm[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_sm)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        print('{:>13.5f}{:<3s}'.format(std_sm[i], ''), end="")
-    
-    print('\n')
-
-    for i in range(len(change_sm)):
-        if i == 0:
-            print('{:<15s}'.format('Percent change'), end="")
-        print('\033[1m' '{:>13.2f}{:<3s}' '\033[0m'.format(change_sm[i], ''), end="")
-    
-    print('\n')
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Observations', '1000', '', '1000', '', '1000', '', '1000', '', '1000', '', ''))
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Method', '2SLS', '', '2SLS', '', '2SLS', '', '2SLS', '', '2SLS', '', ''))
-    print(width*'_')
-    print('Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-')
-    print('ID number combination. The instrument for Conscription is Draft Eligible. Percent change is cal-')
-    print('culated as 100 × Estimate/mean crime rate of draft-ineligible men.')
-    print('** Significant at 5 percent level.')
-    print(' * Significant at 10 percent level.')
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
 
 # Extension table 4 with controls.
-def extension_table_4_controls():
+def extension_table_4_controls(path=None, formats=DEFAULT_TABLE_FORMATS, data='data/Crime.dta',
+                               weak_iv=False):
+    '''
+    Function returns extension table E.4: 2SLS estimates by cohort with district and origin controls.
+    Arguments:
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
+    data: path of the crime panel (see get_variables()).
+    weak_iv: bool, add the weak-instrument diagnostics of weak_iv_by_group().
+    '''
     # Set up df etc.
-    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables(data)
     
     # Lists to fill with estimates.
     reg_sm = []
@@ -748,77 +831,57 @@ def extension_table_4_controls():
     
     # No controls.
     years = list(range(1958, 1963, 1))
+    # All core cohorts are fitted jointly by cohort.
+    rslts = regress_by_group(df=df, method='IV', group='cohort', dependent='crimerate', exog=constant + districts + origin, groups=years)
+    weak_iv_rows, weak_iv_notes = _weak_iv_rows([d for _, d in weak_iv_by_group(df, 'cohort', constant + districts + origin, groups=years).iterrows()]) \
+        if weak_iv else ([], [])
+    # Mean crime rate of ineligible ID-groups by cohort.
+    ineligible_mean = wald_by_group(df, 'crimerate', groups=years).y_0
     for i in years:
-        df_reg = df[df.cohort == i].copy()
-        # Dependent variable: conscription.
-        rslts = IV2SLS(df_reg.loc[:, 'crimerate'], df_reg[constant + districts + origin], df_reg['sm'], df_reg['highnumber']).fit()
-        
         # Get percent change.
-        ineligible_mean = df_reg['crimerate'][df_reg.highnumber == 0].mean()  # Mean crime rate of ineligible ID-groups by type of crime.
-        change = (100*(rslts.params.sm)/(ineligible_mean))
+        change = (100*(rslts.params[(i, 'sm')])/(ineligible_mean[i]))
     
-        reg_sm.append(rslts.params.sm)
-        pval_sm.append(rslts.pvalues.sm)
-        std_sm.append(rslts.std_errors.sm)
+        reg_sm.append(rslts.params[(i, 'sm')])
+        pval_sm.append(rslts.pvalues[(i, 'sm')])
+        std_sm.append(rslts.std_errors[(i, 'sm')])
         change_sm.append(change)
     
-    width = 97    
-    print('\033[1m' 'Table E.4 - Estimated Impact of Conscription on Crime rates, by Cohort with Controls' '\033[0m')
-    print('\033[1m' '(Dependent Variable: Crime Rate)' '\033[0m')
-    print(width*'_')
-    
-    
-    for i in years:
-        if i == 1958:
-            print('{:<15s}'.format('Cohort'), end="")
-        print('{:>13.0f}{:<3s}'.format(i, ''), end="")
-    
-    print('\n')
-    
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('', '(1)', '', '(2)', '', '(3)', '', '(4)', '', '(5)', '', ''))
-    print(width*'_')
-
-
-    for i in range(len(reg_sm)):
-        if i == 0:
-            print('{:<15s}'.format("Conscription"), end="")
-        print('\033[1m' '{:>13.5f}{:<3s}' '\033[0m'.format(reg_sm[i], significance(pval_sm[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_sm)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        print('{:>13.5f}{:<3s}'.format(std_sm[i], ''), end="")
-    
-    print('\n')
-
-    for i in range(len(change_sm)):
-        if i == 0:
-            print('{:<15s}'.format('Percent change'), end="")
-        print('\033[1m' '{:>13.2f}{:<3s}' '\033[0m'.format(change_sm[i], ''), end="")
+    # Build table.
+    grid = make_grid(
+        title=['Table E.4 - Estimated Impact of Conscription on Crime rates, by Cohort with Controls',
+               '(Dependent Variable: Crime Rate)'],
+        header=[['Cohort'] + [str(i) for i in years],
+                ['', '(1)', '(2)', '(3)', '(4)', '(5)']],
+        rows=[grid_row('Conscription', reg_sm, fmt='.5f', pvalues=pval_sm, bold=True),
+              grid_row('', std_sm, fmt='.5f'),
+              grid_row('Percent change', change_sm, fmt='.2f', bold=True),
+              grid_row('Observations', 5*['1000']),
+              grid_row('Method', 5*['2SLS'])] + weak_iv_rows,
+        notes=['Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-',
+               'ID number combination. The instrument for Conscription is Draft Eligible. Percent change is cal-',
+               'culated as 100 × Estimate/mean crime rate of draft-ineligible men. Models include district and',
+               'origin dummies.'] + weak_iv_notes +
+              ['** Significant at 5 percent level.',
+               ' * Significant at 10 percent level.'],
+        width=97)
     
-    print('\n')
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Observations', '1000', '', '1000', '', '1000', '', '1000', '', '1000', '', ''))
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
 
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('Method', '2SLS', '', '2SLS', '', '2SLS', '', '2SLS', '', '2SLS', '', ''))
-    print(width*'_')
-    print('Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-')
-    print('ID number combination. The instrument for Conscription is Draft Eligible. Percent change is cal-')
-    print('culated as 100 × Estimate/mean crime rate of draft-ineligible men. Models include district and')
-    print('origin dummies.')
-    print('** Significant at 5 percent level.')
-    print(' * Significant at 10 percent level.')
-    
 # Table 2.
-def table_2():
+def table_2(path=None, formats=DEFAULT_TABLE_FORMATS, data='data/Crime.dta'):
+    '''
+    Function returns table representing table 2 in Galiani et al. 2011.
+    Arguments:
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
+    data: path of the crime panel (see get_variables()).
+    '''
     
     # Get data.
-    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables(data)
 
     equal_var = False
     nan_policy = 'propagate'
@@ -859,76 +922,40 @@ def table_2():
         t_nat.append(ttest.statistic)
         pval_nat.append(ttest.pvalue)
     
-    # Print table.
-    width = 110    
-    print('\033[1m' 'Table 2 - Differences in Pre-Treatment Characteristics by Birth Cohort and Eligibility Group' '\033[0m')
-    print('\033[1m' 'Differences by Cohort (draft exempt - draft eligible)' '\033[0m')
-    print(width*'_')
-    
-    
-    for i in years:
-        if i == 1958:
-            print('{:<30s}'.format('Cohort'), end="")
-        print('{:>13.0f}{:<3s}'.format(i, ''), end="")
-    
-    print('\n')
-    
-    print(width*'_')
-    
-    # Argentine
-    for i in range(len(t_arg)):
-        if i == 0:
-            print('{:<30s}'.format('Argentine-born, not indigenous'), end='')
-        print('\033[1m' '{:>13.5f}{:<3s}' '\033[0m'.format(t_arg[i], significance(pval_arg[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(pval_arg)):
-        if i == 0:
-            print('{:<30s}'.format(''), end="")
-        print('{:>13.5f}{:<3s}'.format(pval_arg[i], ''), end="")
-    
-    print('\n')
-    
-    # Indig.
-    for i in range(len(t_ind)):
-        if i == 0:
-            print('{:<30s}'.format('Argentine-born, indigenous'), end='')
-        print('\033[1m' '{:>13.5f}{:<3s}' '\033[0m'.format(t_ind[i], significance(pval_ind[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(pval_ind)):
-        if i == 0:
-            print('{:<30s}'.format(''), end="")
-        print('{:>13.5f}{:<3s}'.format(pval_ind[i], ''), end="")
-    
-    print('\n')
+    # Build table.
+    grid = make_grid(
+        title=['Table 2 - Differences in Pre-Treatment Characteristics by Birth Cohort and Eligibility Group',
+               'Differences by Cohort (draft exempt - draft eligible)'],
+        header=[['Cohort'] + [str(i) for i in years]],
+        rows=[grid_row('Argentine-born, not indigenous', t_arg, fmt='.5f', pvalues=pval_arg, bold=True),
+              grid_row('', pval_arg, fmt='.5f'),
+              grid_row('Argentine-born, indigenous', t_ind, fmt='.5f', pvalues=pval_ind, bold=True),
+              grid_row('', pval_ind, fmt='.5f'),
+              grid_row('Born abroad, naturalized', t_nat, fmt='.5f', pvalues=pval_nat, bold=True),
+              grid_row('', pval_nat, fmt='.5f')],
+        notes=['Notes: P-values are shown below test statistics. The level of observation is the cohort-ID number combination.'],
+        width=110, label_width=30)
     
-    # Naturalized.
-    
-    for i in range(len(t_nat)):
-        if i == 0:
-            print('{:<30s}'.format('Born abroad, naturalized'), end='')
-        print('\033[1m' '{:>13.5f}{:<3s}' '\033[0m'.format(t_nat[i], significance(pval_nat[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(pval_nat)):
-        if i == 0:
-            print('{:<30s}'.format(''), end="")
-        print('{:>13.5f}{:<3s}'.format(pval_nat[i], ''), end="")
-    
-    print('\n')
-    
-    print(width*'_')
-    print('Notes: P-values are shown below test statistics. The level of observation is the cohort-ID number combination.')
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
     
 # Table 3.
 # Define data set.
-def table_3():
+def table_3(path=None, formats=DEFAULT_TABLE_FORMATS, data='data/Crime.dta', cov_type='HC0'):
+    '''
+    Function returns table representing table 3 in Galiani et al. 2011.
+    Arguments:
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
+    data: path of the crime panel (see get_variables()).
+    cov_type: covariance type of the standard errors and p-values (see robust_covariances(); clusters
+    are 'cohort' and 'district'). Other types than 'HC0' come from fit_std_errors() on the fit of
+    each column and their p-values from the t distribution (n - k degrees of freedom).
+    '''
     # Get variables.
-    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables(data)
     
     df_regression = df[(df.cohort > 1957) & (df.cohort < 1963)].copy()
     years_tab3 = list(range(1957, 1963, 1))  # 1957 included to get 6 instead of 5 columns (1 repeated cross-section + 5 separate cross-sections)
@@ -939,98 +966,80 @@ def table_3():
     pval_hn = []
     pval_const = []
     
-    for i in years_tab3:
+    # Column 1: pooled cross-section of the cohorts 1958-1962.
+    X = df_regression[highnumber + cohorts[29: 33] + constant].copy()
+    y = df_regression.loc[:, 'sm']
+    # Fit OLS model.
+    rslts = sm.OLS(y, X).fit()
+    
+    #df_regression['fitted_conscription'] = rslts.fittedvalues
     
-        if i < 1958:
-        
-            X = df_regression[highnumber + cohorts[29: 33] + constant].copy()
-            y = df_regression.loc[:, 'sm']
-            # Fit OLS model.
-            rslts = sm.OLS(y, X, cov_type='cluster').fit()
-        
-            #df_regression['fitted_conscription'] = rslts.fittedvalues
-        
-            estim_hn.append(rslts.params['highnumber'])
-            std_hn.append(rslts.HC0_se['highnumber'])
-            estim_const.append(rslts.params['constant'])
-            std_const.append(rslts.HC0_se['constant'])
-            pval_hn.append(rslts.pvalues['highnumber'])
-            pval_const.append(rslts.pvalues['constant'])
-        
-        else:
-        
-            df_regression = df[df.cohort == i].copy()
-            X = df_regression[['highnumber', 'constant']].copy()
-            y = df_regression.loc[:, 'sm']
-            rslts = sm.OLS(y, X).fit()
-        
-            estim_hn.append(rslts.params['highnumber'])
-            std_hn.append(rslts.HC0_se['highnumber'])
-            estim_const.append(rslts.params['constant'])
-            std_const.append(rslts.HC0_se['constant'])
-            pval_hn.append(rslts.pvalues['highnumber'])
-            pval_const.append(rslts.pvalues['constant'])
+    estim_hn.append(rslts.params['highnumber'])
+    std_hn.append(rslts.HC0_se['highnumber'])
+    estim_const.append(rslts.params['constant'])
+    std_const.append(rslts.HC0_se['constant'])
+    pval_hn.append(rslts.pvalues['highnumber'])
+    pval_const.append(rslts.pvalues['constant'])
+    fits = [(rslts, df_regression)]
+    
+    # Columns 2-6: separate cross-sections, fitted jointly by cohort.
+    rslts = regress_by_group(df=df, method='OLS', group='cohort', dependent='sm', exog=highnumber + constant,
+                             groups=years_tab3[1:])
+    for i in years_tab3[1:]:
+        estim_hn.append(rslts.params[(i, 'highnumber')])
+        std_hn.append(rslts.std_errors[(i, 'highnumber')])
+        estim_const.append(rslts.params[(i, 'constant')])
+        std_const.append(rslts.std_errors[(i, 'constant')])
+        pval_hn.append(rslts.pvalues[(i, 'highnumber')])
+        pval_const.append(rslts.pvalues[(i, 'constant')])
+    
+    # Standard errors of another covariance type from the scores of the fit of each column. The grouped
+    # fit only gives HC0 errors, so each cohort is fitted once here.
+    if cov_type != 'HC0':
+        for i in years_tab3[1:]:
+            data = df[df.cohort == i].dropna(subset=highnumber + constant + ['sm'])
+            fits.append((sm.OLS(data['sm'], data[highnumber + constant]).fit(), data))
+        for j, (rslts, data) in enumerate(fits):
+            std_errors = fit_std_errors(rslts, (cov_type,), {'cohort': data['cohort'].to_numpy(), 'district': get_district(data)})
+            std_hn[j] = std_errors.iloc[:, 0]['highnumber']
+            std_const[j] = std_errors.iloc[:, 0]['constant']
+            pval_hn[j] = 2*stats.t.sf(abs(rslts.params['highnumber']/std_hn[j]), rslts.df_resid)
+            pval_const[j] = 2*stats.t.sf(abs(rslts.params['constant']/std_const[j]), rslts.df_resid)
             
-    print('\033[1m' 'Table 3 - First Stage by Birth Cohort' '\033[0m')
-    print('Dependent Variable: Conscription')
-    print(112*'_')
-    # Header.
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}'\
-          .format('Cohort', '1958-1962', '', "1958", '', "1959", '', "1960", '', "1961", '', "1962", '', \
-                 '', ''))
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}'\
-          .format('', '(1)', '', '(2)', '', '(3)', '', '(4)', '', '(5)', '', '(6)', '', \
-                 '', ''))
-    print(112*'_')
-
-
-    for i in range(len(estim_hn)):
-        if i == 0:
-            print('{:<15s}'.format('Draft Eligible'), end="")
-        print('\033[1m' '{:>13.4f}{:<3s}' '\033[0m'.format(estim_hn[i], significance(pval_hn[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_hn)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        print('{:>13.4f}{:<3s}'.format(std_hn[i], ''), end="")
-    
-    print('\n')
-
-    for i in range(len(estim_const)):
-        if i == 0:
-            print('{:<15s}'.format("Constant"), end="")
-        print('\033[1m' '{:>13.4f}{:<3s}' '\033[0m'.format(estim_const[i], significance(pval_const[i])), end="")
-    
-    print('\n')
-
-    for i in range(len(std_const)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        print('{:>13.4f}{:<3s}'.format(std_const[i], ''), end="")
-    
-    print('\n')
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}'\
-          .format('Observations', '5,000', '', '1,000', '', '1,000', '', '1,000', '', '1,000', '', '1,000', '', \
-                '', ''))
-
-    print('{:<15s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}'\
-          .format('Method', 'OLS', '', 'OLS', '', 'OLS', '', 'OLS', '', 'OLS', '', 'OLS', '', \
-                 '', ''))
-    print(112*'_')
-    print('Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-ID number combi-')
-    print('nation. Column 1 includes cohort dummies.')
-    print('*** Significant at 1 percent level.')
+    # Build table.
+    grid = make_grid(
+        title=['Table 3 - First Stage by Birth Cohort', 'Dependent Variable: Conscription'],
+        header=[['Cohort', '1958-1962', '1958', '1959', '1960', '1961', '1962'],
+                ['', '(1)', '(2)', '(3)', '(4)', '(5)', '(6)']],
+        rows=[grid_row('Draft Eligible', estim_hn, pvalues=pval_hn, bold=True),
+              grid_row('', std_hn),
+              grid_row('Constant', estim_const, pvalues=pval_const, bold=True),
+              grid_row('', std_const),
+              grid_row('Observations', ['5,000', '1,000', '1,000', '1,000', '1,000', '1,000']),
+              grid_row('Method', 6*['OLS'])],
+        notes=['Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-ID number combi-',
+               'nation. Column 1 includes cohort dummies.',
+               '*** Significant at 1 percent level.'],
+        width=112)
+    if cov_type != 'HC0':
+        grid['notes'] = grid['notes'] + [f'Standard errors: {_cov_label(cov_type)}.']
+    
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
 
 # Table 7.
-def table_7_IV():
+def table_7_IV(path=None, formats=DEFAULT_TABLE_FORMATS, data='data/Crime.dta'):
+    '''
+    Function returns table representing table 7 in Galiani et al. 2011 (2SLS estimates).
+    Arguments:
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
+    data: path of the crime panel (see get_variables()).
+    '''
     # Get variables.
-    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
-    formal = ['formal']
-    unemployment = ['unemployment']
-    income = ['income']
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables(data)
     
     est_sm = []
     std_sm = []
@@ -1049,77 +1058,43 @@ def table_7_IV():
         std_sm.append(rslts.std_errors.sm)
         pval_sm.append(rslts.pvalues.sm)
         n_obs.append(rslts.nobs)
-        mean = df_reg[outcome][df_reg.highnumber == 0].mean()
+        mean = wald_by_group(df_reg, outcome, group=None).y_0.iloc[0]
         change = (100*(rslts.params['sm'])/(mean))
         percent_change.append(change)
     
-    # Print header.
-    width = 95
-    print('\033[1m' 'Table 7 - Estimated Impact of Conscription on Labour Market Outcomes' '\033[0m')
-    print(width*'_')
-    
-    print('{:<15s}{:>17s}{:<3s}{:>17s}{:<3s}{:>17s}{:<3s}{:>17s}'\
-          .format('Dependent Var.', 'Formal job market', '', 'Unemployment rate', '', 'Earnings','', ''))
-    print(width*'_')
-    print('{:<15s}{:>17s}{:<3s}{:>17s}{:<3s}{:>17s}{:<3s}{:>17s}'\
-          .format('', '1958-1962', '', '1958-1962', '', '1958-1962', '', ''))
-    print('{:<15s}{:>17s}{:<3s}{:>17s}{:<3s}{:>17s}{:<3s}{:>17s}'\
-          .format('', '(1)', '', '(2)', '', '(3)', '', ''))
-    print(width*'_')
-
-    
-    # Conscription.
-    for i in range(len(est_sm)):
-        if i == 0:
-            print('{:<15s}'.format('Conscription'), end="")
-        if type(est_sm[i]) == str:
-            print('{:>17s}{:<3s}'.format('', ''), end="")
-        else:
-            print('\033[1m' '{:>17.5f}{:<3s}' '\033[0m'.format(est_sm[i], significance(pval_sm[i])), end="")
-    print('\n')
-    
-    # Standard errors.
-    for i in range(len(std_sm)):
-        if i == 0:
-            print('{:<15s}'.format(''), end="")
-        if type(est_sm[i]) == str:
-            print('{:>17s}{:<3s}'.format(''), end="")
-        else:
-            print('\033[1m' '{:>17.4f}{:<3s}' '\033[0m'.format(std_sm[i], ''), end="")
-    print('\n')
-                  
-    # Percent change.
-    for i in range(len(percent_change)):
-        if i == 0:
-            print('{:<15s}'.format('Percent change'), end="")
-        print('{:>17.2f}{:<3s}'.format(percent_change[i], ''), end="")
-    print('\n')
-    
-    # Number of observations.
-    for i in range(len(n_obs)):
-        if i == 0:
-            print('{:<15s}'.format('Observations'), end="")
-        print('{:>17.0f}{:<3s}'.format(n_obs[i], ''), end="")
-    print('\n')
-    
-    print('{:<15s}{:>17s}{:<3s}{:>17s}{:<3s}{:>17s}{:<3s}{:>17s}'\
-          .format('', '2SLS', '', '2SLS', '', '2SLS', '', ''))
-    print(width*'_')
-    
-    print('Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-')
-    print('ID number combination. Participation in the formal job market is as of 2004. Unemployment rates ')
-    print('and earnings are as of 2003. Earnings are hourly earnings in Argentine pesos. All models include')
-    print('cohort dummies. The instrument for Conscription is Draft Eligible. Percent change is calculated ')
-    print('as 100 × Estimate/mean dependent variable of draft-ineligible men.')
+    # Build table.
+    grid = make_grid(
+        title=['Table 7 - Estimated Impact of Conscription on Labour Market Outcomes'],
+        header=[['Dependent Var.', 'Formal job market', 'Unemployment rate', 'Earnings'],
+                ['', '1958-1962', '1958-1962', '1958-1962'],
+                ['', '(1)', '(2)', '(3)']],
+        rows=[grid_row('Conscription', est_sm, fmt='.5f', pvalues=pval_sm, bold=True),
+              grid_row('', std_sm, bold=True),
+              grid_row('Percent change', percent_change, fmt='.2f'),
+              grid_row('Observations', n_obs, fmt='.0f'),
+              grid_row('', 3*['2SLS'])],
+        notes=['Notes: Robust standard errors are shown below estimates. The level of observation is the cohort-',
+               'ID number combination. Participation in the formal job market is as of 2004. Unemployment rates ',
+               'and earnings are as of 2003. Earnings are hourly earnings in Argentine pesos. All models include',
+               'cohort dummies. The instrument for Conscription is Draft Eligible. Percent change is calculated ',
+               'as 100 × Estimate/mean dependent variable of draft-ineligible men.'],
+        width=95, cell_width=17)
+    
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
 
 # Table B.1.
-def table_B_1():
+def table_B_1(path=None, formats=DEFAULT_TABLE_FORMATS):
     '''
     Gives summary statistics for the core cohorts 1958-1962.
+    Arguments:
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
     '''
     # This data set provides cohort sizes.
-    path = ('data/baseB.dta')
-    baseb = pd.read_stata(path)
+    baseb = pd.read_stata('data/baseB.dta')
     
     # Get variables.
     constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
@@ -1137,19 +1112,7 @@ def table_B_1():
     #var_names = {['sm']: 'Conscription', ['crimerate']: 'Crime rate', ['formal']: 'Formal job market', ['unemployment']:'Unemployment rate', \
     #             ['earnings']: 'Earnings'}
     
-    width = 110
-    print('\033[1m' 'Table B.1 - Descriptive Statistics of Selected Variables of Interest for Male Birth Cohorts 1958 to 1962' '\033[0m')
-    print(width*'_')
-    
-    # Header: Mean, STD, etc.
-    print('{:<17s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('', '(1)', '', '(2)', '', '(3)', '', '(4)', '', '(5)', '', \
-                  '', ''))
-    print('{:<17s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}{:<3s}{:>13s}'\
-          .format('', 'Cohort size*Mean', '', 'Mean', '', 'St. dev.', '', 'Mean eligible', '', \
-                  'Mean exempt', '', ''))
-    print(width*'_')
-    print('Variables: \n')
+    rows = [grid_row('Variables:', [])]
     for i in core_variables:
         
         var_list = []
@@ -1159,15 +1122,15 @@ def table_B_1():
         #var_list.append(stat)
 
         stat = df_reg[i].mean()
-        var_list.append(stat[0]*baseb.sizecohort[(df.cohort > 1957) & (df.cohort < 1963)].mean()*1000)
+        var_list.append(stat.iloc[0]*baseb.sizecohort[(df.cohort > 1957) & (df.cohort < 1963)].mean()*1000)
         
         # Mean.
         stat = df_reg[i].mean()
-        var_list.append(stat[0])
+        var_list.append(stat.iloc[0])
         
         # Standard dev.
         stat = df_reg[i].std()
-        var_list.append(stat[0])
+        var_list.append(stat.iloc[0])
         
         # Cond. mean.
         
@@ -1176,7 +1139,7 @@ def table_B_1():
             var_list.append(1)
             
             #stat = df_reg[i].mean()
-            #var_list.append(stat[0]*baseb.sizecohort[(df.cohort > 1957) & (df.cohort < 1963)].mean()*1000)
+            #var_list.append(stat.iloc[0]*baseb.sizecohort[(df.cohort > 1957) & (df.cohort < 1963)].mean()*1000)
         
             var_list.append(0)
         
@@ -1185,14 +1148,14 @@ def table_B_1():
         else:
             
             stat = df_reg[i][df_reg.highnumber == 1].mean()
-            var_list.append(stat[0])
+            var_list.append(stat.iloc[0])
         
-            #var_list.append(stat[0]*(df_reg[i].mean()*baseb.sizecohort[(df.cohort > 1957) & (df.cohort < 1963)].mean())*1000)
+            #var_list.append(stat.iloc[0]*(df_reg[i].mean()*baseb.sizecohort[(df.cohort > 1957) & (df.cohort < 1963)].mean())*1000)
         
             stat = df_reg[i][df_reg.highnumber == 0].mean()
-            var_list.append(stat[0])
+            var_list.append(stat.iloc[0])
         
-            #var_list.append(stat[0]*(df_reg[i].mean()*baseb.sizecohort[(df.cohort > 1957) & (df.cohort < 1963)].mean())*1000)
+            #var_list.append(stat.iloc[0]*(df_reg[i].mean()*baseb.sizecohort[(df.cohort > 1957) & (df.cohort < 1963)].mean())*1000)
         
         # t-test.
         #a = df_reg[i][df_reg.highnumber == 0].copy()
@@ -1200,22 +1163,27 @@ def table_B_1():
         #ttest = stats.ttest_ind(a, b, axis=0, equal_var=False, nan_policy='propagate')
         #var_list.append(ttest.pvalue[0])
         
-        for d in range(len(var_list)):
-            if d == 0:
-                print('{:<17s}'.format(str(i)), end="")
-            if var_list[d] >= 100:
-                print('\033[1m' '{:>13.0f}{:<3s}' '\033[0m'.format(var_list[d], ''), end="")
-            else:
-                print('\033[1m' '{:>13.4f}{:<3s}' '\033[0m'.format(var_list[d], ''), end="")
-        print('\n')
-    print(width*'_')
-    print('Notes: highnumber = draft eligible, sm = conscription, formal = formal job market participation, income = ')
-    print('hourly earnings in Argentine pesos,arms = crimes involving usage of weapons, sexual = sexual attack, white-')
-    print('collar = white collar crimes (such as fraud, scams, extortion), navy = eligible for navy, hn_malvinas = eli-')
-    print('gible during Falklands War, enfdummy = failure rates of medical examination. The number in column 1 contains ') 
-    print('the mean number of individuals in the subgroup. It was calculated by using the mean size of cohorts from ')
-    print('1958 to 1962, which is 236,656. Columns 4 and 5 contain means conditional on draft eligible and draft exempt ')
-    print('cohort-ID groups.')
+        rows.append(grid_row(str(i), var_list, fmt=['.0f' if v >= 100 else '.4f' for v in var_list], bold=True))
+    
+    # Build table.
+    grid = make_grid(
+        title=['Table B.1 - Descriptive Statistics of Selected Variables of Interest for Male Birth Cohorts 1958 to 1962'],
+        header=[['', '(1)', '(2)', '(3)', '(4)', '(5)'],
+                ['', 'Cohort size*Mean', 'Mean', 'St. dev.', 'Mean eligible', 'Mean exempt']],
+        rows=rows,
+        notes=['Notes: highnumber = draft eligible, sm = conscription, formal = formal job market participation, income = ',
+               'hourly earnings in Argentine pesos,arms = crimes involving usage of weapons, sexual = sexual attack, white-',
+               'collar = white collar crimes (such as fraud, scams, extortion), navy = eligible for navy, hn_malvinas = eli-',
+               'gible during Falklands War, enfdummy = failure rates of medical examination. The number in column 1 contains ',
+               'the mean number of individuals in the subgroup. It was calculated by using the mean size of cohorts from ',
+               '1958 to 1962, which is 236,656. Columns 4 and 5 contain means conditional on draft eligible and draft exempt ',
+               'cohort-ID groups.'],
+        width=110, label_width=17)
+    
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
     
 # Get plot as in figure A.2.
 def figure_A_2(df, bin_num, ylim, years):
@@ -1236,36 +1204,22 @@ def figure_A_2(df, bin_num, ylim, years):
         df_bin.plot.line(x='Draftnumber', y='Conscription rate', title=f'Conscription Rates for Cohort {i}', ylim=ylim)
 
 # Section 3 1958-1962 Fake cutoffs.
-def table_test_fake_cutoff_1(df, draft_status):
+def table_test_fake_cutoff_1(df, draft_status, path=None, formats=DEFAULT_TABLE_FORMATS):
     '''
     df data frame
     highnumber = 1 or highnumber = 0 test for draft eligible and exempt group
-    
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
     '''
     years = list(range(1958, 1963, 1))
     constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
-    width = 100
-    # Print header.
-    print('\033[1m' 'Table B.2 - Differences in Crime Rates and Fake Eligibility Group by Birth Cohort' '\033[0m')
-    print(width*'_')
-    print('\033[1m' 'Differences by Cohort (fake draft exempt - fake draft eligible)' '\033[0m')
-    print(width*'_')
-    for i in years:
-        if i == 1958:
-            print('{:<14s}'.format('Cohort'), end="")
-        print('{:>13.0f}{:<3s}'.format(i, ''), end="")
-    print('\n')
     
-    # Container for test-stats & p-value.
-    t_q = []
-    p_q = []
-    
-
+    rows = []
     for q in np.linspace(0.1, 1, 9,endpoint=False):
-        # Reset container.
+        # Container for test-stats & p-value.
         t_q = []
         p_q = []
-        for c in range(1958, 1963, 1):
+        for c in years:
             dfa = df[(df.cohort == c) & (df.highnumber == draft_status)][['crimerate', 'draftnumber']].copy()
         
             fake_cutoff = dfa.draftnumber.quantile(q)
@@ -1273,75 +1227,2270 @@ def table_test_fake_cutoff_1(df, draft_status):
                            axis=0, equal_var=False, nan_policy='propagate')
             t_q.append(test.statistic)
             p_q.append(test.pvalue)
-        for i in range(len(t_q)):
-            if i == 0:
-                print('{:<9s}{:>5.1f}'.format('Decile', q), end='')
-            print('\033[1m' '{:>13.4f}{:<3s}' '\033[0m'.format(t_q[i], significance(p_q[i])), end="")
-        print('\n')
-
-        for i in range(len(p_q)):
-            if i == 0:
-                print('{:<14s}'.format(''), end="")
-            print('{:>13.4f}{:<3s}'.format(p_q[i], ''), end="")
-        print('\n')
-    print(width*'_')
-    print('Notes: P-values are shown below test statistics. The level of observation is the cohort-ID number ')
-    print('combination. Fake eligibility status computed by using only real draft exempt cohort-ID groups.')
-    print('Deciles refer to the different cutoffs generated.')
-    print('** Significant at 5 percent level.')
-    print(' * Significant at 10 percent level.')
+        rows += [grid_row(f'{"Decile":<9s}{q:>5.1f}', t_q, pvalues=p_q, bold=True),
+                 grid_row('', p_q)]
+    
+    # Build table.
+    grid = make_grid(
+        title=['Table B.2 - Differences in Crime Rates and Fake Eligibility Group by Birth Cohort'],
+        header=[['Differences by Cohort (fake draft exempt - fake draft eligible)'],
+                ['Cohort'] + [str(c) for c in years]],
+        rows=rows,
+        notes=['Notes: P-values are shown below test statistics. The level of observation is the cohort-ID number ',
+               'combination. Fake eligibility status computed by using only real draft exempt cohort-ID groups.',
+               'Deciles refer to the different cutoffs generated.',
+               '** Significant at 5 percent level.',
+               ' * Significant at 10 percent level.'],
+        width=100, label_width=14)
+    
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
 
     
 # Fake cutoff test for 1976.
-def table_test_fake_cutoff_2(df):
+def table_test_fake_cutoff_2(df, path=None, formats=DEFAULT_TABLE_FORMATS):
     '''
     df data frame
     highnumber = 1 or highnumber = 0 test for draft eligible and exempt group
-    
+    path: if given, the table is also written to path + extension in every format of formats
+    (see write_table()).
     '''
     constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas, df = get_variables()
-    width = 100
-    # Print header.
-    print('\033[1m' 'Table B.3 - Differences in Crime Rates and Fake Eligibility Group for Cohort 1976' '\033[0m')
-    print(width*'_')
-    print('\033[1m' 'Differences (fake draft exempt - fake draft eligible)' '\033[0m')
-    print(width*'_')
-    
-    print('{:<14s}'.format('Cohort'), end="")
-    print('{:>13s}{:<3s}'.format('1976', ''), end="")
-    print('\n')
     
-    # Container for test-stats & p-value.
-    t_q = []
-    p_q = []
-    
-
+    rows = []
     for q in np.linspace(0.1, 1, 9,endpoint=False):
-        # Reset container.
-        t_q = []
-        p_q = []
-        c = 1976
-        dfa = df[df.cohort == c][['crimerate', 'draftnumber']].copy()
+        dfa = df[df.cohort == 1976][['crimerate', 'draftnumber']].copy()
         
         fake_cutoff = dfa.draftnumber.quantile(q)
         test = stats.ttest_ind(dfa.crimerate[(dfa.draftnumber > fake_cutoff)], dfa.crimerate[dfa.draftnumber < fake_cutoff],
                         axis=0, equal_var=False, nan_policy='propagate')
-        t_q.append(test.statistic)
-        p_q.append(test.pvalue)
-        for i in range(len(t_q)):
-            if i == 0:
-                print('{:<9s}{:>5.1f}'.format('Decile', q), end='')
-            print('\033[1m' '{:>13.4f}{:<3s}' '\033[0m'.format(t_q[i], significance(p_q[i])), end="")
-        print('\n')
-
-        for i in range(len(p_q)):
-            if i == 0:
-                print('{:<14s}'.format(''), end="")
-            print('{:>13.4f}{:<3s}'.format(p_q[i], ''), end="")
-        print('\n')
-    print(width*'_')
-    print('Notes: P-values are shown below test statistics. The level of observation is the cohort-ID number ')
-    print('combination. Fake eligibility status computed by using only real draft exempt cohort-ID groups.')
-    print('Deciles refer to the different cutoffs generated.')
-    print('** Significant at 5 percent level.')
-    print(' * Significant at 10 percent level.')
+        rows += [grid_row(f'{"Decile":<9s}{q:>5.1f}', [test.statistic], pvalues=[test.pvalue], bold=True),
+                 grid_row('', [test.pvalue])]
+    
+    # Build table.
+    grid = make_grid(
+        title=['Table B.3 - Differences in Crime Rates and Fake Eligibility Group for Cohort 1976'],
+        header=[['Differences (fake draft exempt - fake draft eligible)'],
+                ['Cohort', '1976']],
+        rows=rows,
+        notes=['Notes: P-values are shown below test statistics. The level of observation is the cohort-ID number ',
+               'combination. Fake eligibility status computed by using only real draft exempt cohort-ID groups.',
+               'Deciles refer to the different cutoffs generated.',
+               '** Significant at 5 percent level.',
+               ' * Significant at 10 percent level.'],
+        width=100, label_width=14)
+    
+    # Print table.
+    print(render_table(grid), end='')
+    if path is not None:
+        write_table(grid, path, formats)
+
+
+# Sort rows by a group key and get the boundaries of each group block.
+def _group_blocks(keys):
+    '''
+    Returns the sorting order, the group labels and the start and stop positions of each group
+    in the sorted data.
+    keys: 1-d array of group keys (e.g. cohorts).
+    '''
+    order = np.argsort(keys, kind='stable')
+    labels, starts = np.unique(keys[order], return_index=True)
+    stops = np.append(starts[1:], len(keys))
+    return order, labels, starts, stops
+
+# Largest number of elements of the row products that _grouped_cross() holds at a time.
+GROUPED_CROSS_CHUNK_ELEMENTS = 2**22
+
+# Grouped cross products A_g'B_g for each group block.
+def _grouped_cross(A, B, starts, stops):
+    '''
+    Sums the row outer products a_i b_i' within every group block with np.add.reduceat, in chunks
+    of rows so that at most GROUPED_CROSS_CHUNK_ELEMENTS products are held at a time.
+    A, B: 2-d arrays sorted by group.
+    starts, stops: block boundaries from _group_blocks.
+    Returns an array of shape (groups, columns of A, columns of B).
+    '''
+    n, p, q = A.shape[0], A.shape[1], B.shape[1]
+    cross = np.zeros((len(starts), p, q))
+    group = np.repeat(np.arange(len(starts)), stops - starts)
+    rows = max(1, GROUPED_CROSS_CHUNK_ELEMENTS//max(1, p*q))
+    for a in range(0, n, rows):
+        g = group[a: a + rows]
+        cuts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+        cross[g[cuts]] += np.add.reduceat(A[a: a + rows, :, None]*B[a: a + rows, None, :], cuts, axis=0)
+    return cross
+
+# 2SLS (or OLS, if Z = X) coefficients from stacked cross products.
+def _solve_moments(ZZ, ZX, Zy):
+    '''
+    ZZ, ZX, Zy: stacked cross products Z'Z, Z'X and Z'y with shapes (groups, l, l), (groups, l, k)
+    and (groups, l, 1).
+    Returns the coefficients (groups, k, 1), the bread (X_hat'X_hat)^-1 and the first-stage
+    projection (Z'Z)^-1 Z'X. For OLS the projection is the identity.
+    '''
+    proj = np.linalg.pinv(ZZ) @ ZX
+    bread = np.linalg.pinv(np.swapaxes(ZX, 1, 2) @ proj)
+    params = bread @ (np.swapaxes(proj, 1, 2) @ Zy)
+    return params, bread, proj
+
+# Fit OLS or 2SLS separately for every group in one pass.
+def regress_by_group(df, method, group, dependent, exog, endog=('sm',), instruments=('highnumber',), groups=None):
+    '''
+    Fits the same specification independently for every group (e.g. cohort) using grouped moments
+    and batched solves instead of one statsmodels/linearmodels fit per group.
+    df: data frame to use.
+    method: string, either 'IV' (2SLS) or 'OLS'.
+    group: string, column to group by, e.g. 'cohort'.
+    dependent: string, dependent variable, e.g. 'crimerate'.
+    exog: list of exogenous regressors (including constant). For OLS these are all regressors.
+    endog, instruments: lists of endogenous regressors and excluded instruments (IV only).
+    groups: list of groups to keep, None keeps all groups.
+    Returns a data frame indexed by (group, variable) with params, std_errors (robust, HC0),
+    pvalues and nobs. P-values follow the reference estimators: classical t-test for OLS as in
+    sm.OLS().fit().pvalues and robust z-test for IV as in IV2SLS().fit().pvalues.
+    '''
+    exog, endog, instruments = list(exog), list(endog), list(instruments)
+    if method == 'OLS':
+        endog, instruments = [], []
+    cols = list(dict.fromkeys([group, dependent] + exog + endog + instruments))
+    data = df[cols]
+    if groups is not None:
+        data = data[data[group].isin(groups)]
+    data = data.dropna(axis=0)
+    
+    order, labels, starts, stops = _group_blocks(data[group].to_numpy())
+    y = data[dependent].to_numpy(dtype=float)[order]
+    X = data[exog + endog].to_numpy(dtype=float)[order]
+    Z = data[exog + instruments].to_numpy(dtype=float)[order]
+    nobs = stops - starts
+    k = X.shape[1]
+    
+    # Bread and coefficients from grouped moments.
+    params, bread, proj = _solve_moments(_grouped_cross(Z, Z, starts, stops), _grouped_cross(Z, X, starts, stops),
+                                         _grouped_cross(Z, y[:, None], starts, stops))
+    
+    # Robust (HC0) meat proj_g' (sum of e_i^2 z_i z_i') proj_g from the structural residuals.
+    group_of_row = np.repeat(np.arange(len(labels)), nobs)
+    resid = y - np.einsum('ik,ik->i', X, params[group_of_row, :, 0])
+    meat = np.swapaxes(proj, 1, 2) @ _grouped_cross(Z*(resid**2)[:, None], Z, starts, stops) @ proj
+    ssr = np.bincount(group_of_row, weights=resid**2, minlength=len(labels))
+    std_errors = np.sqrt(np.diagonal(bread @ meat @ bread, axis1=1, axis2=2))
+    
+    if method == 'OLS':
+        rank = np.linalg.matrix_rank(bread)
+        df_resid = nobs - rank
+        classical_se = np.sqrt(np.diagonal(bread, axis1=1, axis2=2)*(ssr/df_resid)[:, None])
+        pvalues = 2*stats.t.sf(np.abs(params[:, :, 0]/classical_se), df_resid[:, None])
+    else:
+        pvalues = 2*stats.norm.sf(np.abs(params[:, :, 0]/std_errors))
+    
+    index = pd.MultiIndex.from_product([labels, exog + endog], names=[group, 'variable'])
+    rslts = pd.DataFrame({'params': params[:, :, 0].ravel(),
+                          'std_errors': std_errors.ravel(),
+                          'pvalues': pvalues.ravel(),
+                          'nobs': np.repeat(nobs, k)}, index=index)
+    return rslts
+
+# Columns by which publish_panel() sorts and partitions the rows, and the largest row group.
+PANEL_PARTITION_COLUMNS = ['cohort', 'district', 'highnumber']
+PANEL_ROW_GROUP_ROWS = 65536
+
+# Publish the prepared panel once as a memory-mapped block for worker processes.
+def publish_panel(path, df=None, row_group_rows=PANEL_ROW_GROUP_ROWS):
+    '''
+    Writes the numeric columns of the prepared panel (as returned by get_variables()) into one
+    Fortran-ordered float64 block stored at path + '.npy', plus metadata at path + '.json' with
+    column positions, byte offsets, row ranges per cohort, row groups with the minimum and maximum
+    of the partition columns, and the variable lists of get_variables().
+    Rows are sorted by cohort, district (1 to 24, 0 if unknown) and highnumber, so that every cohort
+    window is a contiguous row range. Row groups are the runs of equal partition values, split
+    after row_group_rows rows; query_panel() skips the row groups whose statistics exclude its
+    predicates.
+    Put path on a RAM-backed file system (e.g. /dev/shm) to share the panel in memory.
+    path: string, path without file extension.
+    df: prepared data frame to publish, by default the one of get_variables(). Raises ValueError if a
+    cohort is missing.
+    row_group_rows: maximum number of rows of a row group.
+    '''
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas = get_variable_lists()
+    if df is None:
+        df = get_variables()[-1]
+    variables = {'constant': constant, 'highnumber': highnumber, 'conscription': conscription, 'crimerate': crimerate,
+                 'malvinas': malvinas, 'navy': navy, 'origin': origin, 'cohorts': cohorts, 'districts': districts,
+                 'hn_malvinas': hn_malvinas}
+    if df['cohort'].isna().any():
+        raise ValueError('cannot publish a panel with missing cohorts')
+    df_prep = df if 'district' in df.columns else df.assign(district=get_district(df))
+    
+    # Regressors of regress() first, in the order of get_variables(), then all other numeric columns.
+    first = highnumber + conscription + cohorts + origin + districts + constant
+    numeric = list(df_prep.select_dtypes('number').columns)
+    columns = [c for c in first if c in numeric] + [c for c in numeric if c not in first]
+    df_prep = df_prep.sort_values(PANEL_PARTITION_COLUMNS, kind='stable')
+    n = len(df_prep)
+    
+    block = np.lib.format.open_memmap(path + '.npy', mode='w+', dtype=np.float64, shape=(n, len(columns)), fortran_order=True)
+    for j, col in enumerate(columns):
+        block[:, j] = df_prep[col].to_numpy(dtype=np.float64)
+    block.flush()
+    
+    cohort_values = df_prep['cohort'].to_numpy()
+    cohort_labels, starts = np.unique(cohort_values, return_index=True)
+    stops = np.append(starts[1:], n)
+    
+    # Row groups start where a partition value changes (missing values form their own run).
+    partition = df_prep[PANEL_PARTITION_COLUMNS].to_numpy(dtype=np.float64)
+    changed = ((partition[1:] != partition[:-1]) & ~(np.isnan(partition[1:]) & np.isnan(partition[:-1]))).any(axis=1)
+    group_starts = []
+    for a, b in zip(np.r_[0, np.flatnonzero(changed) + 1], np.r_[np.flatnonzero(changed) + 1, n]):
+        group_starts += list(range(a, b, row_group_rows))
+    group_stops = group_starts[1:] + [n]
+    statistics = {col: [] for col in PANEL_PARTITION_COLUMNS}
+    for a, b in zip(group_starts, group_stops):
+        for j, col in enumerate(PANEL_PARTITION_COLUMNS):
+            values = partition[a:b, j][~np.isnan(partition[a:b, j])]
+            statistics[col].append([float(values.min()), float(values.max())] if len(values) else [None, None])
+    
+    meta = {'shape': [n, len(columns)],
+            'dtype': 'float64',
+            'columns': {col: j for j, col in enumerate(columns)},
+            'offsets': {col: j*n*8 for j, col in enumerate(columns)},
+            'cohort_rows': {str(int(c)): [int(a), int(b)] for c, a, b in zip(cohort_labels, starts, stops)},
+            'row_groups': [[int(a), int(b)] for a, b in zip(group_starts, group_stops)],
+            'statistics': statistics,
+            'variables': variables}
+    with open(path + '.json', 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+# Attach to a panel published by publish_panel() without copying it.
+def attach_panel(path):
+    '''
+    Returns the read-only memory-mapped block and its metadata.
+    path: string, path without file extension as passed to publish_panel().
+    '''
+    block = np.load(path + '.npy', mmap_mode='r')
+    with open(path + '.json') as f:
+        meta = json.load(f)
+    return block, meta
+
+# Design matrix on the shared panel for a cohort window.
+def panel_design(block, meta, columns, cohort_range=None):
+    '''
+    Returns the rows of cohort_range and the requested columns of an attached panel.
+    The result is a zero-copy view whenever the columns are adjacent in the block (e.g. a single
+    column or a run of cohort dummies); otherwise only the selected columns are gathered.
+    block, meta: as returned by attach_panel().
+    columns: list of column names, e.g. highnumber + cohorts[29: 33] + constant.
+    cohort_range: list/2-tuple, indicating first and last cohort, None for all rows. Raises
+    ValueError if no cohort of the panel is in the range.
+    '''
+    if cohort_range is None:
+        rows = slice(0, meta['shape'][0])
+    else:
+        ranges = [r for c, r in meta['cohort_rows'].items() if cohort_range[0] <= int(c) <= cohort_range[1]]
+        if not ranges:
+            raise ValueError(f'the panel has no cohorts in cohort_range {list(cohort_range)}')
+        rows = slice(min(r[0] for r in ranges), max(r[1] for r in ranges))
+    
+    idx = [meta['columns'][c] for c in columns]
+    if idx == list(range(idx[0], idx[0] + len(idx))):
+        return block[rows, idx[0]: idx[-1] + 1]
+    return np.asfortranarray(np.column_stack([block[rows, j] for j in idx]))
+
+# Query a published panel with predicate pushdown to its row groups.
+def query_panel(source, columns, cohort_range=None, **predicates):
+    '''
+    Returns a data frame with the requested columns of the rows of a published panel that satisfy
+    all predicates, e.g. query_panel(path, ['crimerate', 'sm'], cohort=1958, highnumber=1) instead
+    of df[(df.cohort == 1958) & (df.highnumber == 1)]. Predicates on the partition columns of
+    publish_panel() (cohort, district and highnumber) are checked against the minimum and maximum of
+    every row group first, so only row groups that can contain matching rows are read from the
+    memory-mapped block; the rows of these groups are then filtered exactly. Rows are in the order
+    of the block (sorted by cohort, district and highnumber).
+    source: path (without extension) of a panel published by publish_panel(), or (block, meta) as
+    returned by attach_panel().
+    columns: list of column names.
+    cohort_range: list/2-tuple, indicating first and last cohort.
+    predicates: column=value or column=list of values, e.g. cohort=[1958, 1959], district=3 or
+    highnumber=draft_status. Columns without row-group statistics are only filtered exactly.
+    '''
+    block, meta = _get_attached(source) if isinstance(source, str) else source
+    conditions = {col: np.atleast_1d(np.asarray(values, dtype=np.float64)) for col, values in predicates.items()}
+    if cohort_range is not None:
+        window = np.arange(cohort_range[0], cohort_range[1] + 1, dtype=np.float64)
+        conditions['cohort'] = np.intersect1d(conditions.get('cohort', window), window)
+    
+    # Row groups whose [min, max] contains one of the values of every predicate.
+    groups = np.asarray(meta['row_groups'], dtype=np.int64).reshape(-1, 2)
+    keep = np.ones(len(groups), dtype=bool)
+    for col, values in conditions.items():
+        if col in meta.get('statistics', {}):
+            lo, hi = np.asarray(meta['statistics'][col], dtype=np.float64).reshape(-1, 2).T
+            keep &= ((lo[:, None] <= values[None, :]) & (values[None, :] <= hi[:, None])).any(axis=1)
+    selected = groups[keep]
+    
+    # Adjacent row groups are read as one slice.
+    breaks = np.flatnonzero(selected[1:, 0] != selected[:-1, 1]) + 1
+    slices = zip(selected[np.r_[0, breaks], 0], selected[np.r_[breaks, len(selected)] - 1, 1]) if len(selected) else []
+    idx = [meta['columns'][c] for c in columns]
+    parts = []
+    for a, b in slices:
+        rows = np.ones(b - a, dtype=bool)
+        for col, values in conditions.items():
+            rows &= np.isin(block[a:b, meta['columns'][col]], values)
+        parts.append(np.column_stack([block[a:b, j][rows] for j in idx]) if idx else np.empty((rows.sum(), 0)))
+    data = np.concatenate(parts) if parts else np.empty((0, len(columns)))
+    return pd.DataFrame(data, columns=columns)
+
+# Fit one regressor set on many outcomes at once.
+def _fit_many(X, Z, Y, col, ZZ_inv=None):
+    '''
+    OLS (Z = X) or 2SLS coefficients and robust (HC0) standard errors of column col of X for every
+    column of Y, sharing one factorization of the design.
+    X: n x k regressors, Z: n x l instruments (exogenous regressors included), Y: n x m outcomes.
+    ZZ_inv: optional precomputed pseudo-inverse of Z'Z to share between estimators.
+    Returns coefficient and standard error arrays of length m.
+    '''
+    if ZZ_inv is None:
+        ZZ_inv = np.linalg.pinv(Z.T @ Z)
+    X_hat = Z @ (ZZ_inv @ (Z.T @ X))
+    bread = np.linalg.pinv(X_hat.T @ X_hat)
+    B = bread @ (X_hat.T @ Y)
+    U = Y - X @ B
+    # Influence of every observation on the coefficient of interest.
+    c = X_hat @ bread[:, col]
+    std_errors = np.sqrt(((c[:, None]*U)**2).sum(axis=0))
+    return B[col], std_errors
+
+# Get the attached shared panel of a worker process.
+_attached_panels = {}
+def _get_attached(path):
+    if path not in _attached_panels:
+        _attached_panels[path] = attach_panel(path)
+    return _attached_panels[path]
+
+# One multiverse task: all control sets, outcomes and estimators for one cohort window.
+def _multiverse_window(path, window, control_sets, outcomes, estimators):
+    block, meta = _get_attached(path)
+    variables = meta['variables']
+    controls_map = {'origin': variables['origin'], 'districts': variables['districts'], 'navy': variables['navy'],
+                    'malvinas': variables['hn_malvinas']}
+    dummies = ['cohort_' + f'{i}' for i in range(window[0] + 1, window[1] + 1) if 'cohort_' + f'{i}' in meta['columns']]
+    Y_all = panel_design(block, meta, outcomes, window)
+    sm_col = panel_design(block, meta, variables['conscription'], window)
+    rows = []
+    for control_set in control_sets:
+        exog = dummies + [c for name in control_set for c in controls_map[name]] + variables['constant']
+        Z = np.asarray(panel_design(block, meta, variables['highnumber'] + exog, window))
+        X_iv = np.column_stack([sm_col, Z[:, 1:]])
+        keep = ~np.isnan(Z).any(axis=1)
+        for estimator in estimators:
+            valid = keep & ~np.isnan(sm_col[:, 0]) if estimator == 'IV' else keep
+            if valid.sum() <= Z.shape[1]:
+                continue
+            Zv = Z[valid]
+            ZZ_inv = np.linalg.pinv(Zv.T @ Zv)
+            # Outcomes with the same missingness pattern share one solve.
+            missing = np.isnan(Y_all[valid])
+            patterns, pattern_of = np.unique(missing, axis=1, return_inverse=True)
+            for p in range(patterns.shape[1]):
+                cols = np.flatnonzero(pattern_of.ravel() == p)
+                rows_p = ~patterns[:, p]
+                X = X_iv[valid][rows_p] if estimator == 'IV' else Zv[rows_p]
+                ZZ_inv_p = ZZ_inv if rows_p.all() else None
+                coef, se = _fit_many(X, Zv[rows_p], Y_all[valid][rows_p][:, cols], 0, ZZ_inv_p)
+                for j, c, s in zip(cols, coef, se):
+                    rows.append((f'{window[0]}-{window[1]}', '+'.join(control_set) or 'none', outcomes[j], estimator,
+                                 c, s, int(rows_p.sum())))
+    return rows
+
+# Specification curve over cohort windows, control sets, outcomes and estimators.
+def multiverse(windows=((1958, 1962), (1929, 1965), (1929, 1955), (1958, 1965)),
+               controls=('origin', 'districts', 'navy', 'malvinas'),
+               outcomes=('crimerate', 'arms', 'property', 'sexual', 'murder', 'threat', 'drug', 'whitecollar'),
+               estimators=('OLS', 'IV'), workers=None, path=None):
+    '''
+    Fits every combination of cohort window, subset of controls, outcome and estimator. All
+    specifications include a constant and cohort dummies. OLS gives the intention-to-treat effect
+    of highnumber, IV the 2SLS effect of sm instrumented by highnumber ('malvinas' adds hn_malvinas
+    as in table 5). IV specifications use the cohorts of the window in which sm is observed.
+    Within a window and control set, all outcomes share one factorization.
+    windows: list of [first, last] cohorts.
+    controls: control groups to combine, subsets of 'origin', 'districts', 'navy', 'malvinas'.
+    outcomes: list of dependent variables.
+    estimators: list of 'OLS' and/or 'IV'.
+    workers: number of processes, windows are distributed over them.
+    path: path (without extension) of a panel published by publish_panel(), if None the panel is
+    published to a temporary directory.
+    Returns a data frame with one row per specification: window, controls, outcome, estimator,
+    params, std_errors (robust, HC0), pvalues (z-test) and nobs.
+    '''
+    control_sets = [list(c) for r in range(len(controls) + 1) for c in itertools.combinations(controls, r)]
+    with tempfile.TemporaryDirectory() as tmp:
+        if path is None:
+            path = os.path.join(tmp, 'panel')
+            publish_panel(path)
+        tasks = [(path, w, control_sets, outcomes, estimators) for w in windows]
+        rows = [row for window_rows in run_tasks(_multiverse_window, tasks, workers=workers) for row in window_rows]
+    
+    rslts = pd.DataFrame(rows, columns=['window', 'controls', 'outcome', 'estimator', 'params', 'std_errors', 'nobs'])
+    rslts['pvalues'] = 2*stats.norm.sf(np.abs(rslts.params/rslts.std_errors))
+    for col in ['window', 'controls', 'outcome', 'estimator']:
+        rslts[col] = rslts[col].astype('category')
+    return rslts[['window', 'controls', 'outcome', 'estimator', 'params', 'std_errors', 'pvalues', 'nobs']]
+
+# Regressor lists of a regress() specification.
+def _regress_spec(method, cohort_dummies, controls):
+    '''
+    Returns the exogenous regressors, endogenous regressors, excluded instruments and the columns
+    that only select rows, as regress() and regress_prepared() use them for method ('OLS' or 'IV')
+    and controls ('y' or 'n'). For OLS, highnumber is exogenous. For IV, the exogenous cohort dummies
+    are those of 1959-1962 whatever the window; the window's cohort_dummies only drop rows with
+    missing values.
+    '''
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas = get_variable_lists()
+    control_vars = origin + districts if controls == 'y' else []
+    if method == 'OLS':
+        return highnumber + cohort_dummies + control_vars + constant, [], [], []
+    exog = constant + cohorts[29: 33] + control_vars
+    return exog, conscription, highnumber, [c for c in cohort_dummies if c not in exog]
+
+# Get the district (1 to 24) of every row from the district dummies.
+def get_district(df):
+    dist = df[['dist' + f'{i}' for i in range(1, 25)]].to_numpy()
+    return np.where(dist.max(axis=1) > 0, dist.argmax(axis=1) + 1, 0)
+
+# Leave-one-group-out jackknife for a regress() specification by downdating cross products.
+def jackknife(df, method, cohort_range, cohort_dummies, controls, group='cohort'):
+    '''
+    Computes the cross products of the full sample once, subtracts the contribution of each cohort
+    (or district) and solves for every leave-one-out estimate of highnumber (OLS) or sm (IV).
+    df: data frame as returned by get_variables().
+    method, cohort_range, cohort_dummies, controls: as in regress().
+    group: string, either 'cohort' or 'district'.
+    Returns the full-sample estimate, the jackknife standard error and a data frame by omitted group
+    with the leave-one-out estimates, the influence (n-1)(full - leave-one-out) and the number of
+    omitted observations.
+    Other regressors may be collinear in a replicate (e.g. the constant and the remaining cohort
+    dummies); ValueError is raised if the reported variable is not identified in one of them.
+    '''
+    exog, endog, instruments, extra = _regress_spec(method, cohort_dummies, controls)
+    variable = 'highnumber' if method == 'OLS' else 'sm'
+    data = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])]
+    if group == 'district':
+        data = data.assign(district=get_district(data))
+    data = data[list(dict.fromkeys([group, 'crimerate'] + exog + endog + instruments + extra))].dropna(axis=0)
+    
+    order, labels, starts, stops = _group_blocks(data[group].to_numpy())
+    y = data['crimerate'].to_numpy(dtype=float)[order][:, None]
+    X = data[exog + endog].to_numpy(dtype=float)[order]
+    Z = data[exog + instruments].to_numpy(dtype=float)[order]
+    col = (exog + endog).index(variable)
+    
+    # Group contributions and their totals.
+    ZZ = _grouped_cross(Z, Z, starts, stops)
+    ZX = _grouped_cross(Z, X, starts, stops)
+    Zy = _grouped_cross(Z, y, starts, stops)
+    ZZ_loo, ZX_loo, Zy_loo = ZZ.sum(axis=0) - ZZ, ZX.sum(axis=0) - ZX, Zy.sum(axis=0) - Zy
+    full = _solve_moments(ZZ.sum(axis=0)[None], ZX.sum(axis=0)[None], Zy.sum(axis=0)[None])[0]
+    loo = _solve_moments(ZZ_loo, ZX_loo, Zy_loo)[0]
+    
+    # The variable is identified if its column of Z'X adds to the rank of the others.
+    singular = np.linalg.matrix_rank(ZX_loo) == np.linalg.matrix_rank(np.delete(ZX_loo, col, axis=2))
+    if singular.any():
+        raise ValueError(f'{variable} is not identified without {group} {", ".join(str(g) for g in labels[singular])}')
+    
+    estimate = full[0, col, 0]
+    theta = loo[:, col, 0]
+    n_groups = len(labels)
+    jackknife_se = np.sqrt((n_groups - 1)/n_groups*((theta - theta.mean())**2).sum())
+    rslts = pd.DataFrame({'params': theta,
+                          'influence': (n_groups - 1)*(estimate - theta),
+                          'nobs_omitted': stops - starts}, index=pd.Index(labels, name=group))
+    return estimate, jackknife_se, rslts
+
+# Sum scores within clusters.
+def _cluster_scores(scores, clusters):
+    codes = np.unique(clusters, return_inverse=True)[1].ravel()
+    order, labels, starts, stops = _group_blocks(codes)
+    return np.add.reduceat(scores[order], starts, axis=0)
+
+# Robust covariance matrices of one fit from precomputed scores.
+def robust_covariances(X_hat, resid, bread, cov_types=('HC0',), clusters=None):
+    '''
+    Computes several sandwich covariance matrices from a single fit. For OLS X_hat are the
+    regressors, for 2SLS the fitted first-stage regressors; bread is (X_hat'X_hat)^-1 and resid are
+    the structural residuals.
+    cov_types: list containing 'HC0', 'HC1', 'HC2', 'HC3', 'cluster_<name>' (one-way clustering
+    by clusters[name]) and tuples ('twoway', name1, name2) (two-way clustering).
+    clusters: dict mapping cluster names (e.g. 'cohort', 'district') to 1-d arrays of cluster keys.
+    Cluster covariances use the small-sample correction G/(G-1)*(n-1)/(n-k) as statsmodels.
+    Returns a dict mapping each cov_type to a k x k covariance matrix.
+    '''
+    clusters = clusters or {}
+    n, k = X_hat.shape
+    scores = X_hat*resid[:, None]
+    if 'HC2' in cov_types or 'HC3' in cov_types:
+        leverage = np.einsum('ij,jk,ik->i', X_hat, bread, X_hat)
+    
+    # Meat of one-way clustering, including its small-sample correction.
+    def cluster_meat(keys):
+        summed = _cluster_scores(scores, keys)
+        n_clusters = summed.shape[0]
+        return n_clusters/(n_clusters - 1)*(n - 1)/(n - k)*(summed.T @ summed)
+    
+    covariances = {}
+    for cov_type in cov_types:
+        if cov_type == 'HC0':
+            meat = scores.T @ scores
+        elif cov_type == 'HC1':
+            meat = n/(n - k)*(scores.T @ scores)
+        elif cov_type == 'HC2':
+            adjusted = scores/np.sqrt(1 - leverage)[:, None]
+            meat = adjusted.T @ adjusted
+        elif cov_type == 'HC3':
+            adjusted = scores/(1 - leverage)[:, None]
+            meat = adjusted.T @ adjusted
+        elif isinstance(cov_type, str) and cov_type.startswith('cluster_'):
+            meat = cluster_meat(clusters[cov_type[len('cluster_'):]])
+        elif isinstance(cov_type, tuple) and len(cov_type) == 3 and cov_type[0] == 'twoway':
+            first, second = cov_type[1:]
+            intersection = np.unique(np.column_stack([clusters[first], clusters[second]]), axis=0, return_inverse=True)[1]
+            meat = cluster_meat(clusters[first]) + cluster_meat(clusters[second]) - cluster_meat(intersection.ravel())
+        else:
+            raise ValueError(f'unknown cov_type {cov_type!r}')
+        covariances[cov_type] = bread @ meat @ bread
+    return covariances
+
+# Column label of a cov_type, e.g. 'twoway_cohort_district' for ('twoway', 'cohort', 'district').
+def _cov_label(cov_type):
+    return cov_type if isinstance(cov_type, str) else '_'.join(cov_type)
+
+# Fit a regress() specification once and get standard errors for several covariance types.
+def regress_cov(df, method, cohort_range, cohort_dummies, controls,
+                cov_types=('HC0', 'HC1', 'HC2', 'HC3', 'cluster_cohort', 'cluster_district', ('twoway', 'cohort', 'district'))):
+    '''
+    df: data frame as returned by get_variables().
+    method, cohort_range, cohort_dummies, controls: as in regress().
+    cov_types: see robust_covariances(); available clusters are 'cohort' and 'district'.
+    Returns the coefficients (Series) and a data frame of standard errors with one column per
+    cov_type (two-way types are labelled 'twoway_<name1>_<name2>').
+    '''
+    exog, endog, instruments, extra = _regress_spec(method, cohort_dummies, controls)
+    data = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])]
+    data = data.assign(district=get_district(data))
+    data = data[list(dict.fromkeys(['cohort', 'district', 'crimerate'] + exog + endog + instruments + extra))].dropna(axis=0)
+    y = data['crimerate'].to_numpy(dtype=float)
+    X = data[exog + endog].to_numpy(dtype=float)
+    Z = data[exog + instruments].to_numpy(dtype=float)
+    
+    params, bread, proj = _solve_moments((Z.T @ Z)[None], (Z.T @ X)[None], (Z.T @ y)[None, :, None])
+    beta = params[0, :, 0]
+    covariances = robust_covariances(Z @ proj[0], y - X @ beta, bread[0], cov_types,
+                                     clusters={'cohort': data['cohort'].to_numpy(), 'district': data['district'].to_numpy()})
+    std_errors = pd.DataFrame({_cov_label(cov_type): np.sqrt(np.diag(cov)) for cov_type, cov in covariances.items()}, index=exog + endog)
+    return pd.Series(beta, index=exog + endog), std_errors
+
+# Standard errors of several covariance types from the scores of an existing fit.
+def fit_std_errors(rslts, cov_types=('HC0',), clusters=None):
+    '''
+    Returns a data frame of standard errors with one column per cov_type (labelled as in
+    regress_cov(), index: regressors) of a fit of sm.OLS or linearmodels IV2SLS, e.g. from
+    regress_prepared(). Regressors (or fitted first-stage regressors), residuals and bread are taken
+    from the fit, so no covariance type refits the model.
+    rslts: results of sm.OLS(...).fit() or IV2SLS(...).fit().
+    cov_types: see robust_covariances().
+    clusters: dict mapping cluster names to cluster keys of the rows of the fit.
+    '''
+    if hasattr(rslts, 'resids'):
+        model = rslts.model
+        Z = np.column_stack([model.exog.ndarray, model.instruments.ndarray])
+        X = np.column_stack([model.exog.ndarray, model.endog.ndarray])
+        X_hat = Z @ np.linalg.lstsq(Z, X, rcond=None)[0]
+        bread = np.linalg.pinv(X_hat.T @ X_hat)
+        resid = rslts.resids.to_numpy()
+    else:
+        X_hat = np.asarray(rslts.model.exog, dtype=float)
+        bread = np.asarray(rslts.normalized_cov_params, dtype=float)
+        resid = np.asarray(rslts.resid, dtype=float)
+    covariances = robust_covariances(X_hat, resid, bread, cov_types, clusters)
+    return pd.DataFrame({_cov_label(cov_type): np.sqrt(np.diag(cov)) for cov_type, cov in covariances.items()},
+                        index=rslts.params.index)
+
+# Condition number and default tolerances of the mixed-precision mode.
+MIXED_MAX_CONDITION = 1e5
+MIXED_RTOL = 1e-6
+
+# Iterative refinement of a 2SLS (or OLS, if Z = X) solution in float64 over row chunks.
+def _refine_moments(design, ix, iz, iy, beta, solve, chunk, max_iter):
+    '''
+    design: float32 or float64 design matrix with the columns of X, Z and y.
+    ix, iz, iy: column positions of X, Z and y.
+    beta: initial coefficients.
+    solve: k x l matrix mapping the instrument moments Z'r of the residuals r to a correction of beta.
+    Residuals and their moments are computed in float64 chunk by chunk. Returns the refined
+    coefficients, the number of refinement steps and whether the corrections converged.
+    '''
+    for step in range(1, max_iter + 1):
+        moments = np.zeros(len(iz))
+        for a in range(0, design.shape[0], chunk):
+            block = design[a:a + chunk].astype(np.float64)
+            moments += block[:, iz].T @ (block[:, iy] - block[:, ix] @ beta)
+        delta = solve @ moments
+        beta = beta + delta
+        if np.abs(delta).max() <= 4*np.finfo(np.float64).eps*max(np.abs(beta).max(), 1.0):
+            return beta, step, True
+    return beta, max_iter, False
+
+# HC0 covariance of 2SLS (or OLS, if Z = X) with float64 cross products over row chunks.
+def _chunked_hc0(design, ix, iz, iy, beta, chunk):
+    '''
+    Returns the HC0 covariance of beta (as IV2SLS and OLS' HC0_se), the bread (X_hat'X_hat)^-1,
+    the sum of squared residuals, the number of rows and the rank of X_hat'X_hat.
+    '''
+    ZZ = np.zeros((len(iz), len(iz)))
+    ZX = np.zeros((len(iz), len(ix)))
+    meat = np.zeros((len(iz), len(iz)))
+    ssr = 0.0
+    for a in range(0, design.shape[0], chunk):
+        block = design[a:a + chunk].astype(np.float64)
+        Z = block[:, iz]
+        ZZ += Z.T @ Z
+        ZX += Z.T @ block[:, ix]
+        resid = block[:, iy] - block[:, ix] @ beta
+        ssr += resid @ resid
+        Zu = Z*resid[:, None]
+        meat += Zu.T @ Zu
+    proj = np.linalg.pinv(ZZ) @ ZX
+    bread = np.linalg.pinv(ZX.T @ proj)
+    return bread @ proj.T @ meat @ proj @ bread, bread, ssr, design.shape[0], np.linalg.matrix_rank(ZX.T @ proj)
+
+# regress() with float32 design matrices and float64 refinement.
+def regress_mixed(df, method, cohort_range, cohort_dummies, controls, dependent='crimerate', precision='mixed',
+                  max_condition=MIXED_MAX_CONDITION, rtol=MIXED_RTOL, max_iter=5, chunk=65536):
+    '''
+    Fits the specification of regress() (OLS, or 2SLS of the dependent variable on sm instrumented by
+    highnumber) from a cached float32 design matrix. Cross products are accumulated in float32;
+    their solution is the starting point of an iterative refinement in which residuals and their
+    moments are computed in float64, and the HC0 standard errors come from one float64 pass over
+    the float32 rows. For OLS and just-identified 2SLS, such as regress(), the refined coefficients
+    solve the float64 normal equations of the stored data.
+    The float64 design is used instead if the condition number of the equilibrated instrument
+    cross products (the cohort and district dummy system) exceeds max_condition, if the rounding of
+    the data to float32 (design_rounding()) times that condition number exceeds rtol, or if the
+    refinement does not converge in max_iter steps.
+    df: data frame as returned by get_variables().
+    method, cohort_range, cohort_dummies, controls: as in regress().
+    dependent: name of the dependent variable.
+    precision: 'mixed', or 'float64' to skip the float32 design.
+    chunk: rows per float64 block of the refinement and standard errors.
+    Returns a data frame with params, std_errors (HC0), pvalues and nobs (index: regressors) and a dict
+    with the precision used, the condition number, the rounding and the refinement steps.
+    '''
+    exog, endog, instruments, extra = _regress_spec(method, cohort_dummies, controls)
+    columns = exog + endog + instruments + [dependent] + extra
+    ix = np.arange(len(exog + endog))
+    iz = np.r_[np.arange(len(exog)), np.arange(len(exog + endog), len(exog + endog + instruments))].astype(int)
+    iy = len(exog + endog + instruments)
+    info = {'precision': 'float64', 'condition': np.nan, 'rounding': 0.0, 'steps': 0}
+    
+    beta = None
+    if precision == 'mixed':
+        design = cached_design(df, cohort_range, columns, dtype=np.float32)[0]
+        moments = (design.T @ design).astype(np.float64)
+        ZZ, ZX, Zy = moments[np.ix_(iz, iz)], moments[np.ix_(iz, ix)], moments[iz, iy]
+        scale = np.sqrt(np.diag(ZZ))
+        scale[scale == 0] = 1
+        info['condition'] = np.linalg.cond(ZZ/np.outer(scale, scale))
+        info['rounding'] = design_rounding(df, cohort_range, columns)
+        if info['condition'] <= max_condition and info['condition']*info['rounding'] <= rtol:
+            proj = np.linalg.pinv(ZZ) @ ZX
+            solve = np.linalg.pinv(ZX.T @ proj) @ proj.T
+            beta, info['steps'], converged = _refine_moments(design, ix, iz, iy, solve @ Zy, solve, chunk, max_iter)
+            if converged:
+                info['precision'] = 'mixed'
+            else:
+                beta = None
+    if beta is None:
+        design = cached_design(df, cohort_range, columns)[0]
+        params, bread, proj = _solve_moments((design[:, iz].T @ design[:, iz])[None], (design[:, iz].T @ design[:, ix])[None],
+                                             (design[:, iz].T @ design[:, iy])[None, :, None])
+        beta = params[0, :, 0]
+    
+    cov, bread, ssr, nobs, rank = _chunked_hc0(design, ix, iz, iy, beta, chunk)
+    std_errors = np.sqrt(np.diag(cov))
+    # As in the tables, OLS p-values are those of sm.OLS (classical t statistics), IV p-values robust ones.
+    if method == 'OLS':
+        pvalues = 2*stats.t.sf(np.abs(beta/np.sqrt(np.diag(bread)*ssr/(nobs - rank))), nobs - rank)
+    else:
+        pvalues = 2*stats.norm.sf(np.abs(beta/std_errors))
+    rslts = pd.DataFrame({'params': beta, 'std_errors': std_errors, 'pvalues': pvalues, 'nobs': float(nobs)}, index=exog + endog)
+    return rslts, info
+
+# Anderson-Rubin confidence set of a just-identified model in closed form.
+def _ar_set(zy, zx, s_yy, s_xy, s_xx, critical):
+    '''
+    The set {b: (zy - b*zx)^2 <= critical*(s_yy - 2*b*s_xy + b^2*s_xx)} is where the quadratic
+    a*b^2 + c*b + d is not positive, with a = zx^2 - critical*s_xx, c = 2*(critical*s_xy - zx*zy) and
+    d = zy^2 - critical*s_yy. Depending on a and the discriminant it is a bounded interval, empty,
+    the union of two rays, a half-line or the real line.
+    Returns a list of [lower, upper] intervals (bounds -inf or inf if unbounded) and the shape:
+    'interval', 'empty', 'two rays', 'half-line' or 'real line'.
+    '''
+    a = zx**2 - critical*s_xx
+    c = 2*(critical*s_xy - zx*zy)
+    d = zy**2 - critical*s_yy
+    if a == 0:
+        if c == 0:
+            return ([[-np.inf, np.inf]], 'real line') if d <= 0 else ([], 'empty')
+        return ([[-d/c, np.inf]], 'half-line') if c < 0 else ([[-np.inf, -d/c]], 'half-line')
+    disc = c**2 - 4*a*d
+    if disc < 0:
+        return ([], 'empty') if a > 0 else ([[-np.inf, np.inf]], 'real line')
+    roots = np.sort((-c + np.array([-1, 1])*np.sqrt(disc))/(2*a))
+    if a > 0:
+        return [[roots[0], roots[1]]], 'interval'
+    return [[-np.inf, roots[0]], [roots[1], np.inf]], 'two rays'
+
+# First-stage F, Kleibergen-Paap F and Anderson-Rubin confidence set for one sample.
+def _weak_iv_stats(y, x, z, W, alpha=0.05):
+    '''
+    y: outcome, x: endogenous regressor (sm), z: instrument (highnumber), W: exogenous regressors.
+    With one instrument, the robust Anderson-Rubin statistic is a ratio of quadratics in beta, so
+    its confidence set is inverted in closed form (see _ar_set()).
+    '''
+    # Partial out the exogenous regressors.
+    coef = np.linalg.lstsq(W, np.column_stack([y, x, z]), rcond=None)[0]
+    y_t, x_t, z_t = (np.column_stack([y, x, z]) - W @ coef).T
+    n, k_w = W.shape
+    zz, zy, zx = z_t @ z_t, z_t @ y_t, z_t @ x_t
+    
+    # First stage.
+    pi = zx/zz
+    v = x_t - pi*z_t
+    f_classical = pi**2/((v @ v)/(n - k_w - 1)/zz)
+    f_robust = pi**2/(((z_t*v)**2).sum()/zz**2)
+    
+    # Robust 2SLS estimate and standard error (HC0).
+    beta = zy/zx
+    u = y_t - beta*x_t
+    se = np.sqrt(((z_t*u)**2).sum())/abs(zx)
+    
+    # Anderson-Rubin: reduced-form residuals r_y, r_x give the robust variance as a quadratic in beta.
+    r_y, r_x = y_t - (zy/zz)*z_t, x_t - (zx/zz)*z_t
+    w = z_t**2
+    s_yy, s_xy, s_xx = w @ (r_y*r_y), w @ (r_x*r_y), w @ (r_x*r_x)
+    ar_set, ar_shape = _ar_set(zy, zx, s_yy, s_xy, s_xx, stats.chi2.ppf(1 - alpha, 1))
+    return {'params': beta, 'std_errors': se, 'first_stage_F': f_classical, 'first_stage_F_robust': f_robust,
+            'kleibergen_paap_F': f_robust, 'ar_set': ar_set, 'ar_shape': ar_shape, 'nobs': n}
+
+# Weak-instrument diagnostics for a regress() IV specification.
+def weak_iv_diagnostics(df, cohort_range, cohort_dummies, controls, alpha=0.05, dependent='crimerate'):
+    '''
+    Returns a dict with the 2SLS estimate of sm and its robust standard error, the classical and
+    robust first-stage F, the Kleibergen-Paap rk Wald F and the Anderson-Rubin confidence set at
+    level 1 - alpha (ar_set: list of intervals, ar_shape: 'interval', 'empty', 'two rays',
+    'half-line' or 'real line').
+    With one endogenous regressor the Kleibergen-Paap rk Wald F equals the robust first-stage F.
+    df: data frame as returned by get_variables().
+    cohort_range, cohort_dummies, controls: as in regress() with method='IV'.
+    dependent: name of the dependent variable.
+    '''
+    exog, endog, instruments, extra = _regress_spec('IV', cohort_dummies, controls)
+    data = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])]
+    data = data[list(dict.fromkeys([dependent] + exog + endog + instruments + extra))].dropna(axis=0)
+    return _weak_iv_stats(data[dependent].to_numpy(dtype=float), data['sm'].to_numpy(dtype=float),
+                          data['highnumber'].to_numpy(dtype=float), data[exog].to_numpy(dtype=float), alpha)
+
+# Weak-instrument diagnostics for every group, e.g. for the by-cohort tables.
+def weak_iv_by_group(df, group, exog, dependent='crimerate', groups=None, alpha=0.05):
+    '''
+    df: data frame as returned by get_variables().
+    group: string, column to group by, e.g. 'cohort'.
+    exog: list of exogenous regressors (including constant) as in regress_by_group().
+    Returns a data frame by group with the diagnostics of weak_iv_diagnostics(). The Anderson-Rubin
+    set is reported by the lower and upper bound of its hull, its shape and whether it is a single
+    bounded interval.
+    '''
+    data = df[list(dict.fromkeys([group, dependent, 'sm', 'highnumber'] + exog))]
+    if groups is not None:
+        data = data[data[group].isin(groups)]
+    data = data.dropna(axis=0)
+    order, labels, starts, stops = _group_blocks(data[group].to_numpy())
+    y = data[dependent].to_numpy(dtype=float)[order]
+    x = data['sm'].to_numpy(dtype=float)[order]
+    z = data['highnumber'].to_numpy(dtype=float)[order]
+    W = data[exog].to_numpy(dtype=float)[order]
+    
+    # Partial out the exogenous regressors with the grouped cross products, column by column.
+    V = np.column_stack([y, x, z])
+    coef = np.linalg.pinv(_grouped_cross(W, W, starts, stops)) @ _grouped_cross(W, V, starts, stops)
+    block = np.repeat(np.arange(len(starts)), stops - starts)
+    for j in range(W.shape[1]):
+        V = V - W[:, j, None]*coef[block, j]
+    y_t, x_t, z_t = V.T
+    n = stops - starts
+    # Sum over the rows of every group.
+    def total(values):
+        return np.add.reduceat(values, starts)
+    zz, zy, zx = total(z_t*z_t), total(z_t*y_t), total(z_t*x_t)
+    
+    # First stage, 2SLS and reduced-form moments of every group as in _weak_iv_stats().
+    pi = zx/zz
+    v = x_t - pi[block]*z_t
+    f_classical = pi**2/(total(v*v)/(n - W.shape[1] - 1)/zz)
+    f_robust = pi**2/(total((z_t*v)**2)/zz**2)
+    beta = zy/zx
+    se = np.sqrt(total((z_t*(y_t - beta[block]*x_t))**2))/np.abs(zx)
+    r_y, r_x = y_t - (zy/zz)[block]*z_t, x_t - (zx/zz)[block]*z_t
+    w = z_t**2
+    s_yy, s_xy, s_xx = total(w*r_y*r_y), total(w*r_x*r_y), total(w*r_x*r_x)
+    
+    # Anderson-Rubin sets from the scalar moments of each group.
+    critical = stats.chi2.ppf(1 - alpha, 1)
+    ar = [_ar_set(*moments, critical) for moments in zip(zy, zx, s_yy, s_xy, s_xx)]
+    ar_shape = [shape for _, shape in ar]
+    return pd.DataFrame({'params': beta, 'std_errors': se, 'first_stage_F': f_classical, 'first_stage_F_robust': f_robust,
+                         'kleibergen_paap_F': f_robust, 'ar_shape': ar_shape, 'nobs': n,
+                         'ar_lower': [ar_set[0][0] if ar_set else np.nan for ar_set, _ in ar],
+                         'ar_upper': [ar_set[-1][1] if ar_set else np.nan for ar_set, _ in ar],
+                         'ar_bounded': [shape == 'interval' for shape in ar_shape]}, index=pd.Index(labels, name=group))
+
+# Rows and notes of the weak-instrument diagnostics for the IV tables.
+def _weak_iv_rows(diagnostics):
+    '''
+    diagnostics: list of dicts from weak_iv_diagnostics() or rows of weak_iv_by_group(), one per
+    table column.
+    '''
+    def bounds(d):
+        ar_set = d['ar_set'] if 'ar_set' in d else [[d['ar_lower'], d['ar_upper']]]
+        return (ar_set[0][0], ar_set[-1][1]) if len(ar_set) else (np.nan, np.nan)
+    return [grid_row('First-stage F', [d['first_stage_F_robust'] for d in diagnostics], fmt='.1f'),
+            grid_row('AR set, lower', [bounds(d)[0] for d in diagnostics], fmt='.5f'),
+            grid_row('AR set, upper', [bounds(d)[1] for d in diagnostics], fmt='.5f'),
+            grid_row('AR set shape', [d['ar_shape'] for d in diagnostics])], \
+           ['First-stage F is the robust (Kleibergen-Paap) F. AR set: bounds and shape of the robust Ander-',
+            'son-Rubin 95% confidence set of Conscription (bounds of its hull if it is not one interval).']
+
+# Get subgroup keys for heterogeneous effects.
+def get_subgroup(df, key):
+    '''
+    key: 'district' (1 to 24 from the district dummies), 'origin' ('argentine', 'naturalized' or
+    'indigenous'), any other column name, or a list of these for their combinations.
+    Returns a 1-d array of subgroup labels.
+    '''
+    if isinstance(key, list):
+        parts = [get_subgroup(df, k).astype(str) for k in key]
+        return np.array(['_'.join(p) for p in zip(*parts)])
+    if key == 'district':
+        return get_district(df)
+    if key == 'origin':
+        return np.select([df.naturalized.to_numpy() == 1, df.indigenous.to_numpy() == 1], ['naturalized', 'indigenous'], 'argentine')
+    return df[key].to_numpy()
+
+# Subgroup-specific effects of conscription from one interacted 2SLS fit.
+def interacted_iv(df, key, cohort_range=(1958, 1962), dependent='crimerate'):
+    '''
+    Fits crimerate (or dependent) on sm x subgroup dummies, instrumented by highnumber x subgroup
+    dummies, with subgroup fixed effects and shared cohort dummies. Observations of different
+    subgroups never share an interaction column, so the cross products are assembled from grouped
+    moments (2 x 2 blocks per subgroup plus the shared cohort dummies) instead of building the full
+    interacted design matrix.
+    df: data frame as returned by get_variables().
+    key: subgroup key, see get_subgroup(), e.g. 'district', 'origin' or ['district', 'origin'].
+    cohort_range: list/2-tuple, indicating first and last cohort.
+    Returns a data frame by subgroup with params, std_errors (robust, HC0), pvalues (z-test) and nobs
+    of the sm effect.
+    '''
+    data = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])]
+    data = data.assign(subgroup=get_subgroup(data, key))
+    shared = ['cohort_' + f'{i}' for i in range(cohort_range[0] + 1, cohort_range[1] + 1)]
+    data = data[list(dict.fromkeys(['subgroup', dependent, 'sm', 'highnumber'] + shared))].dropna(axis=0)
+    
+    order, labels, starts, stops = _group_blocks(data['subgroup'].to_numpy())
+    n_groups, n_shared = len(labels), len(shared)
+    y = data[dependent].to_numpy(dtype=float)[order][:, None]
+    ones = np.ones((len(data), 1))
+    L_z = np.column_stack([data['highnumber'].to_numpy(dtype=float)[order], ones])  # Subgroup-specific instrument columns.
+    L_x = np.column_stack([data['sm'].to_numpy(dtype=float)[order], ones])  # Subgroup-specific regressor columns.
+    W = data[shared].to_numpy(dtype=float)[order].reshape(len(data), n_shared)
+    
+    # Assemble Z'Z, Z'X and Z'y; columns are [2 per subgroup..., shared].
+    k = 2*n_groups + n_shared
+    def cross(L_a, L_b):
+        M = np.zeros((k, k))
+        local = _grouped_cross(L_a, L_b, starts, stops)
+        a_shared = _grouped_cross(L_a, W, starts, stops)
+        shared_b = _grouped_cross(W, L_b, starts, stops)
+        for g in range(n_groups):
+            M[2*g: 2*g + 2, 2*g: 2*g + 2] = local[g]
+            M[2*g: 2*g + 2, 2*n_groups:] = a_shared[g]
+            M[2*n_groups:, 2*g: 2*g + 2] = shared_b[g]
+        M[2*n_groups:, 2*n_groups:] = W.T @ W
+        return M
+    ZZ, ZX = cross(L_z, L_z), cross(L_z, L_x)
+    Zy = np.concatenate([_grouped_cross(L_z, y, starts, stops).reshape(-1), W.T @ y[:, 0]])
+    params, bread, proj = _solve_moments(ZZ[None], ZX[None], Zy[None, :, None])
+    params, bread, proj = params[0, :, 0], bread[0], proj[0]
+    
+    # Robust meat, accumulated subgroup by subgroup.
+    meat = np.zeros((k, k))
+    for g, (a, b) in enumerate(zip(starts, stops)):
+        resid = y[a:b, 0] - L_x[a:b] @ params[2*g: 2*g + 2] - W[a:b] @ params[2*n_groups:]
+        X_hat = L_z[a:b] @ proj[2*g: 2*g + 2] + W[a:b] @ proj[2*n_groups:]
+        scores = X_hat*resid[:, None]
+        meat += scores.T @ scores
+    std_errors = np.sqrt(np.diag(bread @ meat @ bread))
+    
+    idx = 2*np.arange(n_groups)
+    rslts = pd.DataFrame({'params': params[idx],
+                          'std_errors': std_errors[idx],
+                          'pvalues': 2*stats.norm.sf(np.abs(params[idx]/std_errors[idx])),
+                          'nobs': stops - starts}, index=pd.Index(labels, name='subgroup'))
+    return rslts
+
+# Load cohort-level conscription records.
+def load_compliers(path='data/Compliers.dta'):
+    '''
+    Returns the cohort-level data in data/Compliers.dta with English column names:
+    cohort, year (year of incorporation, 'ao'), served (number of conscripts, 'total'), cohort_size,
+    share_served ('proporcinquelahizo'), share_called ('proporcinqueladebahacer') and p1 (share
+    served among those called).
+    '''
+    compliers = pd.read_stata(path)
+    compliers = compliers.rename(columns={'ao': 'year', 'total': 'served', 'sizedelcohort': 'cohort_size',
+                                          'proporcinquelahizo': 'share_served', 'proporcinqueladebahacer': 'share_called'})
+    return compliers
+
+# Cache of first-stage quantities by data frame and cohorts.
+FIRST_STAGE_CACHE_MAX_ENTRIES = 64
+_first_stage_cache = OrderedDict()
+
+# First stage by cohort in one grouped pass.
+def first_stage_by_cohort(df, years=tuple(range(1958, 1963, 1))):
+    '''
+    Returns a data frame by cohort with p1 (mean of sm among draft eligible), p2 (mean of sm among
+    draft exempt), the first stage p1 - p2 (complier share), p_z (share draft eligible) and nobs.
+    Results are kept in a least-recently-used cache of FIRST_STAGE_CACHE_MAX_ENTRIES entries tied
+    to the data frame object, its column list and shape like cached_design(); after changing values
+    in place call invalidate_caches(df).
+    df: data frame as returned by get_variables().
+    years: list of cohorts.
+    '''
+    token = _frame_token(df)
+    key = (id(df), tuple(years))
+    entry = _first_stage_cache.get(key)
+    if entry is not None and entry[0]() is df and entry[1] == token:
+        _first_stage_cache.move_to_end(key)
+        return entry[2].copy()
+    
+    data = df[df.cohort.isin(years)][['cohort', 'sm', 'highnumber']].dropna(axis=0)
+    labels, codes = np.unique(data['cohort'].to_numpy(), return_inverse=True)
+    codes = codes.ravel()
+    d = data['sm'].to_numpy(dtype=float)
+    z = data['highnumber'].to_numpy(dtype=float)
+    n = np.bincount(codes)
+    n_z = np.bincount(codes, weights=z)
+    p1 = np.bincount(codes, weights=d*z)/n_z
+    p2 = np.bincount(codes, weights=d*(1 - z))/(n - n_z)
+    first_stage = pd.DataFrame({'p1': p1, 'p2': p2, 'first_stage': p1 - p2, 'p_z': n_z/n, 'nobs': n},
+                               index=pd.Index(labels, name='cohort'))
+    
+    _first_stage_cache[key] = (weakref.ref(df), token, first_stage)
+    # Drop entries of data frames that no longer exist, then the least recently used ones.
+    for old_key in [k for k, e in _first_stage_cache.items() if e[0]() is None]:
+        del _first_stage_cache[old_key]
+    while len(_first_stage_cache) > FIRST_STAGE_CACHE_MAX_ENTRIES:
+        _first_stage_cache.popitem(last=False)
+    return first_stage.copy()
+
+# Compliance rates of several cohorts together.
+def pooled_compliance(df, years=tuple(range(1958, 1963, 1))):
+    '''
+    Returns p1 (mean of sm among draft eligible) and p2 (mean of sm among draft exempt) of the
+    cohorts in years pooled, from the cohort means of first_stage_by_cohort() weighted by the
+    number of draft eligible and exempt men.
+    df: data frame as returned by get_variables().
+    years: list of cohorts.
+    '''
+    first_stage = first_stage_by_cohort(df, years)
+    n_z = first_stage['p_z']*first_stage['nobs']
+    n_0 = first_stage['nobs'] - n_z
+    p1 = (first_stage['p1']*n_z).sum()/n_z.sum()
+    p2 = (first_stage['p2']*n_0).sum()/n_0.sum()
+    return p1, p2
+
+# Complier shares and complier means of covariates by cohort.
+def complier_analysis(df, covariates=('argentine', 'naturalized', 'indigenous', 'enfdummy'), years=tuple(range(1958, 1963, 1)),
+                      path='data/Compliers.dta'):
+    '''
+    Characterizes compliers by cohort with highnumber as instrument and sm as treatment.
+    Shares of compliers, always takers and never takers come from the first stage. Complier means
+    of covariates use Abadie's kappa, kappa = 1 - sm*(1 - z)/(1 - p_z) - (1 - sm)*z/p_z, which is
+    linear in sm and therefore also valid for the conscription rates of cohort-ID cells. The
+    population means and the cohort-level records of data/Compliers.dta ('p1_admin',
+    'share_served_admin') are added for comparison.
+    df: data frame as returned by get_variables().
+    covariates: list of pre-treatment covariates.
+    years: list of cohorts.
+    path: path of the cohort-level records.
+    '''
+    first_stage = first_stage_by_cohort(df, years)
+    data = df[df.cohort.isin(years)][['cohort', 'sm', 'highnumber'] + list(covariates)].dropna(axis=0)
+    codes = np.searchsorted(first_stage.index.to_numpy(), data['cohort'].to_numpy())
+    d = data['sm'].to_numpy(dtype=float)
+    z = data['highnumber'].to_numpy(dtype=float)
+    p_z = first_stage['p_z'].to_numpy()[codes]
+    kappa = 1 - d*(1 - z)/(1 - p_z) - (1 - d)*z/p_z
+    kappa_sum = np.bincount(codes, weights=kappa)
+    n = np.bincount(codes)
+    
+    rslts = pd.DataFrame({'compliers': first_stage['first_stage'],
+                          'always_takers': first_stage['p2'],
+                          'never_takers': 1 - first_stage['p1']}, index=first_stage.index)
+    for cov in covariates:
+        x = data[cov].to_numpy(dtype=float)
+        rslts[cov + '_compliers'] = np.bincount(codes, weights=kappa*x)/kappa_sum
+        rslts[cov + '_all'] = np.bincount(codes, weights=x)/n
+    
+    compliers = load_compliers(path).set_index('cohort')
+    rslts['p1_admin'] = compliers['p1'].reindex(rslts.index).to_numpy()
+    rslts['share_served_admin'] = compliers['share_served'].reindex(rslts.index).to_numpy()
+    return rslts
+
+# Local-linear predictions at the edge of many windows from moments centered at the edge.
+def _local_linear_windows(moments, counts, h, kernel, side):
+    '''
+    moments: dict mapping (p, q) to the sums of u^p*y^q over the window of every bandwidth and
+    evaluation point x0, where u = x - x0 (shape bandwidths x points).
+    counts: number of points in each window (shape bandwidths x points).
+    h: bandwidths (shape bandwidths x 1).
+    kernel, side: see _rd_side(); the triangular weight of a neighbour is 1 - |u|/h.
+    Returns the weighted local-linear predictions at x0 (NaN for windows with fewer than 3 points).
+    '''
+    def s(p, q):
+        return moments[(p, q)] if kernel == 'uniform' else moments[(p, q)] - side*moments[(p + 1, q)]/h
+    n_w, s_u, s_uu, s_y, s_uy = s(0, 0), s(1, 0), s(2, 0), s(0, 1), s(1, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n_w*s_uy - s_u*s_y)/(n_w*s_uu - s_u**2)
+        intercept = (s_y - slope*s_u)/n_w
+    return np.where(counts >= 3, intercept, np.nan)
+
+# Cross-validated bandwidth for one cohort.
+def _rd_bandwidth(x, y, grid, kernel, cv_share):
+    '''
+    Ludwig-Miller cross-validation: every observation in the cv_share closest to the cutoff on each
+    side is predicted by a one-sided local-linear fit on the points between it and the next
+    bandwidth towards the outside, mimicking estimation at a boundary. Every window is a range of
+    the sorted running variable, so its moments are differences of cumulative sums of powers of x
+    centered at the mean of the side; the moments centered at the evaluation point follow from the
+    binomial expansion. A pass over all points and bandwidths is linear in the number of points.
+    '''
+    errors = []
+    for side in [-1, 1]:
+        keep = x < 0 if side == -1 else x >= 0
+        xs, ys = x[keep], y[keep]
+        order = np.argsort(xs, kind='stable')
+        xs, ys = xs[order], ys[order]
+        evaluate = np.flatnonzero(np.abs(xs) <= np.quantile(np.abs(xs), cv_share))
+        x0 = xs[evaluate]
+        h = grid[:, None]
+        
+        # Window of the points towards the outside within each bandwidth: sorted positions lo to hi.
+        if side == -1:
+            lo = np.searchsorted(xs, x0[None, :] - h, 'left')
+            hi = np.broadcast_to(np.searchsorted(xs, x0, 'left')[None, :], lo.shape)
+        else:
+            lo = np.broadcast_to(np.searchsorted(xs, x0, 'right')[None, :], h.shape[:1] + x0.shape)
+            hi = np.searchsorted(xs, x0[None, :] + h, 'right')
+        
+        # Window sums of t^j*y^q with t = x - center, then centered at x0 with u = t + (center - x0).
+        center = xs.mean() if len(xs) > 0 else 0.0
+        t = xs - center
+        cumulative = {(j, q): np.concatenate([[0.0], np.cumsum(t**j*ys**q)]) for j in range(4) for q in range(2)}
+        window = {key: values[hi] - values[lo] for key, values in cumulative.items()}
+        d = center - x0[None, :]
+        moments = {(p, q): sum(special.comb(p, j, exact=True)*d**(p - j)*window[(j, q)] for j in range(p + 1)) for p in range(4) for q in range(2)}
+        errors.append(ys[evaluate][None, :] - _local_linear_windows(moments, hi - lo, h, kernel, side))
+    errors = np.concatenate(errors, axis=1)
+    errors = errors[:, np.isfinite(errors).all(axis=0)]
+    cv = (errors**2).mean(axis=1) if errors.shape[1] > 0 else np.full(len(grid), np.nan)
+    return grid[np.nanargmin(cv)] if np.isfinite(cv).any() else np.nan, cv
+
+# Local-linear fit at the cutoff from one side with robust standard error.
+def _rd_side(x, y, h, kernel, side):
+    window = (x < 0) & (x >= -h) if side == -1 else (x >= 0) & (x <= h)
+    xw, yw = x[window], y[window]
+    w = np.ones_like(xw) if kernel == 'uniform' else 1 - np.abs(xw)/h
+    X = np.column_stack([np.ones_like(xw), xw])
+    bread = np.linalg.pinv(X.T @ (w[:, None]*X))
+    coef = bread @ (X.T @ (w*yw))
+    scores = X*(w*(yw - X @ coef))[:, None]
+    cov = bread @ (scores.T @ scores) @ bread
+    return coef[0], cov[0, 0], len(xw)
+
+# Local-linear discontinuity at every cohort's eligibility cutoff.
+def rd_cutoff(df, outcome='sm', years=tuple(range(1958, 1963, 1)), kernel='triangular', grid=None, cv_share=0.5):
+    '''
+    Estimates the jump of outcome at the draft-eligibility cutoff of every cohort with a
+    local-linear regression in draftnumber on each side. The cutoff of a cohort is the lowest
+    draftnumber with highnumber == 1. The bandwidth is chosen per cohort by cross-validation over
+    grid (see _rd_bandwidth()), with all bandwidths evaluated from one set of cumulative window
+    moments per side.
+    df: data frame as returned by get_variables().
+    outcome: string, e.g. 'sm' (first stage), 'enfdummy' or 'crimerate'.
+    years: list of cohorts.
+    kernel: string, either 'triangular' or 'uniform'.
+    grid: array of candidate bandwidths in draftnumbers, default 10 to 500 in steps of 2.
+    cv_share: share of observations closest to the cutoff used in cross-validation.
+    Returns a data frame by cohort with cutoff, bandwidth, jump, std_errors (robust), pvalues and
+    the number of observations left and right of the cutoff within the bandwidth.
+    '''
+    if grid is None:
+        grid = np.arange(10, 502, 2, dtype=float)
+    grid = np.asarray(grid, dtype=float)
+    if len(grid) == 0 or not np.isfinite(grid).all() or (grid <= 0).any():
+        raise ValueError('grid must contain positive, finite bandwidths')
+    rows = []
+    for i in years:
+        data = df[df.cohort == i][['draftnumber', 'highnumber', outcome]].dropna(axis=0)
+        cutoff = data.draftnumber[data.highnumber == 1].min()
+        x = (data.draftnumber - cutoff).to_numpy(dtype=float)
+        y = data[outcome].to_numpy(dtype=float)
+        h, cv = _rd_bandwidth(x, y, grid, kernel, cv_share)
+        if np.isnan(h):
+            raise ValueError(f'no bandwidth of grid has at least 3 observations on both sides for cohort {i}')
+        left, var_left, n_left = _rd_side(x, y, h, kernel, -1)
+        right, var_right, n_right = _rd_side(x, y, h, kernel, 1)
+        jump, se = right - left, np.sqrt(var_left + var_right)
+        rows.append({'cohort': i, 'cutoff': cutoff, 'bandwidth': h, 'jump': jump, 'std_errors': se,
+                     'pvalues': 2*stats.norm.sf(abs(jump/se)), 'nobs_left': n_left, 'nobs_right': n_right})
+    return pd.DataFrame(rows).set_index('cohort')
+
+# Bootstrap 2SLS coefficients of sm for many outcomes and replications at once.
+def _bootstrap_iv(X, Z, Y, col, reps, seed, chunk, workers=1):
+    '''
+    Draws reps pairs-bootstrap samples (row indices, shared by all outcomes) and returns the
+    reps x outcomes matrix of coefficients of column col of X. A bootstrap sample only changes the
+    row weights (counts), so the cross products of all replications in a chunk are one matrix
+    product of the counts with the row-wise products of Z, X and Y. Every chunk has its own seed
+    stream (see run_tasks()), so the draws do not depend on workers.
+    '''
+    n, l, k, m = Z.shape[0], Z.shape[1], X.shape[1], Y.shape[1]
+    products = np.column_stack([np.einsum('na,nb->nab', Z, Z).reshape(n, -1),
+                                np.einsum('na,nb->nab', Z, X).reshape(n, -1),
+                                np.einsum('na,nb->nab', Z, Y).reshape(n, -1)])
+    tasks = [(products, (l, k, m), col, min(chunk, reps - start)) for start in range(0, reps, chunk)]
+    return np.concatenate(run_tasks(_bootstrap_chunk, tasks, seed=seed, workers=workers), axis=0)
+
+# One chunk of bootstrap replications.
+def _bootstrap_chunk(products, shape, col, size, seed):
+    l, k, m = shape
+    n = products.shape[0]
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, n, size=(size, n))
+    counts = np.bincount((idx + n*np.arange(size)[:, None]).ravel(), minlength=size*n).reshape(size, n)
+    moments = counts.astype(float) @ products
+    ZZ = moments[:, :l*l].reshape(size, l, l)
+    ZX = moments[:, l*l: l*l + l*k].reshape(size, l, k)
+    ZY = moments[:, l*l + l*k:].reshape(size, l, m)
+    return _solve_moments(ZZ, ZX, ZY)[0][:, col, :]
+
+# Romano-Wolf, Holm and Benjamini-Hochberg adjusted p-values for the 2SLS effect on several outcomes.
+def multiple_outcomes(df, outcomes=('arms', 'property', 'sexual', 'murder', 'threat', 'drug', 'whitecollar'),
+                      cohort_range=(1958, 1962), reps=5000, seed=0, chunk=250, workers=1):
+    '''
+    Fits the 2SLS specification of table 6 (sm instrumented by highnumber, constant and cohort
+    dummies) for every outcome and adjusts the p-values of sm for multiple testing.
+    The Romano-Wolf step-down uses one set of pairs-bootstrap draws shared by all outcomes, with
+    t-statistics standardized by the bootstrap standard errors. Rows with a missing value in any
+    outcome are dropped so that all outcomes use the same sample.
+    df: data frame as returned by get_variables().
+    outcomes: list of outcomes, e.g. the crime types of table 6 or ['formal', 'unemployment', 'income'].
+    cohort_range: list/2-tuple, indicating first and last cohort.
+    reps: number of bootstrap replications.
+    seed: seed of the random number generator.
+    chunk: replications solved per batch.
+    workers: number of processes for the bootstrap, results are identical for every value.
+    Returns a data frame by outcome with params, std_errors (robust, HC0), pvalues (unadjusted) and
+    the bootstrap standard error plus Romano-Wolf, Holm and Benjamini-Hochberg adjusted p-values.
+    '''
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas = get_variable_lists()
+    exog = constant + ['cohort_' + f'{i}' for i in range(cohort_range[0] + 1, cohort_range[1] + 1)]
+    data = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])]
+    outcomes = list(outcomes)
+    data = data[list(dict.fromkeys(exog + conscription + highnumber + outcomes))].dropna(axis=0)
+    X = data[exog + conscription].to_numpy(dtype=float)
+    Z = data[exog + highnumber].to_numpy(dtype=float)
+    Y = data[outcomes].to_numpy(dtype=float)
+    col = len(exog)
+    
+    params, std_errors = _fit_many(X, Z, Y, col)
+    pvalues = 2*stats.norm.sf(np.abs(params/std_errors))
+    draws = _bootstrap_iv(X, Z, Y, col, reps, seed, chunk, workers)
+    boot_se = draws.std(axis=0, ddof=1)
+    
+    # Romano-Wolf step-down on |t| with bootstrap standard errors.
+    t_stat = np.abs(params)/boot_se
+    t_boot = np.abs(draws - params)/boot_se
+    order = np.argsort(-t_stat)
+    p_rw = np.empty(len(outcomes))
+    for step, j in enumerate(order):
+        max_boot = t_boot[:, order[step:]].max(axis=1)
+        p_rw[j] = ((max_boot >= t_stat[j]).sum() + 1)/(reps + 1)
+    p_rw[order] = np.maximum.accumulate(p_rw[order])
+    
+    # Holm and Benjamini-Hochberg on the unadjusted p-values.
+    m = len(outcomes)
+    ascending = np.argsort(pvalues)
+    p_holm = np.empty(m)
+    p_holm[ascending] = np.minimum(np.maximum.accumulate((m - np.arange(m))*pvalues[ascending]), 1)
+    p_bh = np.empty(m)
+    p_bh[ascending] = np.minimum(np.minimum.accumulate((m/np.arange(m, 0, -1)*pvalues[ascending[::-1]]))[::-1], 1)
+    
+    return pd.DataFrame({'params': params, 'std_errors': std_errors, 'pvalues': pvalues, 'bootstrap_se': boot_se,
+                         'pvalues_romano_wolf': p_rw, 'pvalues_holm': p_holm, 'pvalues_bh': p_bh},
+                        index=pd.Index(outcomes, name='outcome'))
+
+# Simulate a cohort x ID panel with the schema of data/Crime.dta.
+def simulate_panel(cohorts=tuple(range(1929, 1966, 1)) + (1976,), ids=1000, first_stage=0.65, always_takers=0.05,
+                   effect=0.003, crime_effects=None, labour_effects=None, seed=0):
+    '''
+    Returns a synthetic panel with the columns used by get_variables() and the table functions:
+    cohort, id, draftnumber, highnumber, sm, enfdummy, crimerate, the crime types, dist1..dist24,
+    argentine, naturalized, indigenous, navy, malvinas, formal, unemployment and income.
+    Within every cohort the draft numbers are a random permutation of 1..ids and a random share of
+    30 to 70 percent of the highest numbers is draft eligible. The output is identical for equal
+    arguments.
+    cohorts: list of cohorts, or an int for that many consecutive cohorts starting in 1929.
+    ids: number of ID cells per cohort (1000 for the last three digits of the ID).
+    first_stage: increase of the conscription rate for the draft eligible.
+    always_takers: conscription rate of the draft exempt.
+    effect: effect of conscription on crimerate.
+    crime_effects, labour_effects: dicts with the effect of conscription on the crime types and on
+    the labour market outcomes, by default effect/7 for each crime type and no labour effects.
+    seed: seed of the random number generator.
+    '''
+    if isinstance(cohorts, int):
+        cohorts = list(range(1929, 1929 + cohorts, 1))
+    crime_types = ['arms', 'property', 'sexual', 'murder', 'threat', 'drug', 'whitecollar']
+    if crime_effects is None:
+        crime_effects = {crime: effect/7 for crime in crime_types}
+    if labour_effects is None:
+        labour_effects = {'formal': 0, 'unemployment': 0, 'income': 0}
+    rng = np.random.default_rng(seed)
+    n_cohorts = len(cohorts)
+    n = n_cohorts*ids
+    
+    cohort = np.repeat(np.asarray(cohorts, dtype=np.int16), ids)
+    draftnumber = (rng.random((n_cohorts, ids)).argsort(axis=1) + 1).ravel().astype(np.int32)
+    cutoff = np.repeat(np.round(ids*(1 - rng.uniform(0.3, 0.7, n_cohorts))), ids)
+    highnumber = (draftnumber > cutoff).astype(np.int8)
+    navy = (draftnumber > round(ids*0.9)).astype(np.int8)
+    
+    # Origin and district are ID-cell characteristics.
+    origin = rng.choice(3, size=n, p=[0.9, 0.07, 0.03])
+    district = rng.integers(1, 25, size=n)
+    enfdummy = np.clip(rng.normal(0.25, 0.05, n), 0, 1).astype(np.float32)
+    
+    # Conscription rate of the cell: always takers plus compliers among the draft eligible.
+    sm_rate = np.clip(always_takers + first_stage*highnumber*(1 - enfdummy)/0.75 + rng.normal(0, 0.03, n), 0, 1)
+    cohort_level = np.repeat(rng.normal(0, 0.005, n_cohorts), ids)
+    district_level = rng.normal(0, 0.003, 25)[district]
+    
+    panel = pd.DataFrame({'cohort': cohort, 'id': np.tile(np.arange(ids, dtype=np.int32), n_cohorts),
+                          'draftnumber': draftnumber, 'highnumber': highnumber, 'sm': sm_rate.astype(np.float32),
+                          'enfdummy': enfdummy})
+    panel['crimerate'] = (0.07 + cohort_level + district_level + effect*sm_rate + rng.normal(0, 0.01, n)).astype(np.float32)
+    for crime in crime_types:
+        panel[crime] = np.abs(0.005 + crime_effects[crime]*sm_rate + rng.normal(0, 0.003, n)).astype(np.float32)
+    for k in range(1, 25, 1):
+        panel['dist' + f'{k}'] = (district == k).astype(np.int8)
+    panel['argentine'] = (origin == 0).astype(np.int8)
+    panel['naturalized'] = (origin == 1).astype(np.int8)
+    panel['indigenous'] = (origin == 2).astype(np.int8)
+    panel['navy'] = navy
+    panel['malvinas'] = np.isin(cohort, [1962, 1963]).astype(np.int8)
+    panel['formal'] = np.clip(0.5 + labour_effects['formal']*sm_rate + rng.normal(0, 0.05, n), 0, 1).astype(np.float32)
+    panel['unemployment'] = np.clip(0.1 + labour_effects['unemployment']*sm_rate + rng.normal(0, 0.02, n), 0, 1).astype(np.float32)
+    panel['income'] = (1000 + labour_effects['income']*sm_rate + rng.normal(0, 100, n)).astype(np.float32)
+    return panel
+
+# Write a (simulated) panel to disk.
+def write_panel(panel, path):
+    '''
+    Writes panel as Stata file (.dta, readable by get_variables()), CSV (.csv) or columnar NumPy
+    archive (.npz, one array per column) depending on the extension of path.
+    '''
+    if path.endswith('.dta'):
+        panel.to_stata(path, write_index=False)
+    elif path.endswith('.csv'):
+        panel.to_csv(path, index=False)
+    elif path.endswith('.npz'):
+        np.savez(path, **{col: panel[col].to_numpy() for col in panel.columns})
+    else:
+        raise ValueError('path must end with .dta, .csv or .npz')
+
+# Lottery design and variance structure of a cohort window for the power simulations.
+def _power_calibration(df, cohort_range, outcomes):
+    '''
+    Returns a dict with the cohorts of cohort_range, their draft-eligible shares, the first stage by
+    cohort as in table 3 (constant and highnumber coefficient), the standard deviation of the
+    first-stage residuals, and by outcome the slope of the 2SLS residuals (cohort fixed effects, as
+    in table 6) on the first-stage residuals, the standard deviation of the remainder and the mean
+    of the draft exempt.
+    '''
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas = get_variable_lists()
+    data = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])]
+    data = data[['cohort', 'constant', 'highnumber', 'sm'] + list(outcomes)].dropna(axis=0)
+    years = np.unique(data['cohort'].to_numpy())
+    first_stage = regress_by_group(data, 'OLS', 'cohort', 'sm', highnumber + constant, groups=list(years))['params'].unstack()
+    cohort = data['cohort'].to_numpy()
+    hn = data['highnumber'].to_numpy(dtype=float)
+    intercepts = first_stage['constant'].reindex(years).to_numpy()
+    slopes = first_stage['highnumber'].reindex(years).to_numpy()
+    position = np.searchsorted(years, cohort)
+    nu = data['sm'].to_numpy(dtype=float) - intercepts[position] - slopes[position]*hn
+    
+    dummies = (cohort[:, None] == years[None, 1:]).astype(float)
+    exog = np.column_stack([np.ones(len(data)), dummies])
+    X = np.column_stack([exog, data['sm'].to_numpy(dtype=float)])
+    Z = np.column_stack([exog, hn])
+    Y = data[list(outcomes)].to_numpy(dtype=float)
+    params = _solve_moments((Z.T @ Z)[None], (Z.T @ X)[None], (Z.T @ Y)[None])[0][0]
+    U = Y - X @ params
+    loading = (nu @ U)/(nu @ nu)
+    remainder = U - nu[:, None]*loading
+    return {'cohorts': years, 'share': np.array([hn[cohort == c].mean() for c in years]), 'intercepts': intercepts,
+            'slopes': slopes, 'sd_nu': nu.std(), 'loading': loading, 'sd_outcome': remainder.std(axis=0),
+            'ineligible_mean': Y[hn == 0].mean(axis=0)}
+
+# One chunk of simulated panels under the null of no effect.
+def _power_chunk(calibration, ids, size, seed):
+    '''
+    Simulates size panels of ids ID cells per cohort with the lottery design and variance structure
+    of calibration (see _power_calibration()) and no effect of conscription, and fits the 2SLS of
+    every outcome with cohort fixed effects on all panels at once. The eligible cells and hence the
+    instruments are the same in every panel, so the cross products of all panels are single matrix
+    products of the fixed instruments with the simulated columns.
+    Returns the coefficients and HC0 standard errors of sm, arrays of shape (size, outcomes).
+    '''
+    years, share = calibration['cohorts'], calibration['share']
+    rng = np.random.default_rng(seed)
+    cohort = np.repeat(np.arange(len(years)), ids)
+    hn = np.concatenate([np.arange(ids) >= ids - round(ids*p) for p in share]).astype(float)
+    exog = np.column_stack([np.ones(len(cohort)), (cohort[:, None] == np.arange(1, len(years))[None, :]).astype(float)])
+    Z = np.column_stack([exog, hn])
+    n, l, m = len(cohort), Z.shape[1], len(calibration['loading'])
+    
+    nu = calibration['sd_nu']*rng.standard_normal((n, size))
+    S = (calibration['intercepts'][cohort] + calibration['slopes'][cohort]*hn)[:, None] + nu
+    U = nu[:, :, None]*calibration['loading'] + calibration['sd_outcome']*rng.standard_normal((n, size, m))
+    
+    ZS = Z.T @ S
+    ZX = np.concatenate([np.broadcast_to((Z.T @ exog)[None], (size, l, exog.shape[1])), ZS.T[:, :, None]], axis=2)
+    ZY = np.moveaxis((Z.T @ U.reshape(n, size*m)).reshape(l, size, m), 1, 0)
+    params, bread, proj = _solve_moments((Z.T @ Z)[None], ZX, ZY)
+    resid = U - np.einsum('nj,rjm->nrm', exog, params[:, :-1, :]) - S[:, :, None]*params[None, :, -1, :]
+    # Influence of every cell on the coefficient of sm in each panel.
+    c = Z @ (proj @ bread[:, :, -1:])[:, :, 0].T
+    return params[:, -1, :], np.sqrt(np.einsum('nr,nrm->rm', c**2, resid**2))
+
+# Power and minimum detectable effects of the 2SLS effect of conscription.
+def power_analysis(df, outcomes=('arms', 'property', 'sexual', 'murder', 'threat', 'drug', 'whitecollar'), windows=((1958, 1962),),
+                   ids=(250, 500, 1000, 2000), effects=(0, 2.5, 5, 10, 15, 20, 30, 50), reps=1000, alpha=0.05, power=0.8,
+                   seed=0, workers=1, chunk=100):
+    '''
+    Simulates panels with the lottery design of the data (cohorts of the window and their
+    draft-eligible shares), the first stage by cohort of table 3 and the residual (co)variances of
+    the first stage and the 2SLS of table 6, fits the 2SLS of each outcome on sm with cohort fixed
+    effects on every panel and returns power and minimum detectable effects of two-sided tests at
+    level alpha with IV2SLS' normal critical values.
+    Panels are simulated without an effect: in the linear model an effect b only shifts the 2SLS
+    coefficient by b and leaves the residuals and standard errors unchanged, so all effects are
+    evaluated on the same replications.
+    df: data frame as returned by get_variables().
+    outcomes: list of outcomes, by default the crime types of table 6.
+    windows: list of cohort windows (list/2-tuples of first and last cohort).
+    ids: list of numbers of ID cells per cohort (the data have 1000).
+    effects: effects of conscription in percent of the mean of the draft exempt, as the percent
+    changes of table 6.
+    reps: simulated panels per window and number of cells.
+    power: target power of the minimum detectable effect.
+    seed, workers: see run_tasks(); chunks of chunk panels are the tasks, so results do not depend
+    on workers.
+    Returns the power surface (rows window, ids, outcome and effect) and a data frame of minimum
+    detectable effects in levels and percent, mean standard errors and first stages (rows window,
+    ids and outcome).
+    '''
+    critical = stats.norm.ppf(1 - alpha/2)
+    calibrations = [_power_calibration(df, w, outcomes) for w in windows]
+    tasks = [(calibration, n, min(chunk, reps - start)) for calibration in calibrations for n in ids for start in range(0, reps, chunk)]
+    chunks = iter(run_tasks(_power_chunk, tasks, seed=seed, workers=workers))
+    
+    surface = []
+    mde = []
+    for w, calibration in zip(windows, calibrations):
+        for n in ids:
+            parts = [next(chunks) for start in range(0, reps, chunk)]
+            estimates = np.concatenate([part[0] for part in parts])
+            std_errors = np.concatenate([part[1] for part in parts])
+            
+            def rejections(b):
+                return (np.abs(estimates + b) > critical*std_errors).mean(axis=0)
+            
+            window = f'{w[0]}-{w[1]}'
+            for effect in effects:
+                rate = rejections(np.asarray(effect)/100*calibration['ineligible_mean'])
+                surface += [(window, n, outcome, effect, rate[j]) for j, outcome in enumerate(outcomes)]
+            # Bisection on the simulated power of positive effects.
+            lo, hi = np.zeros(len(outcomes)), 10*std_errors.max(axis=0)
+            for _ in range(60):
+                mid = (lo + hi)/2
+                reached = rejections(mid) >= power
+                hi, lo = np.where(reached, mid, hi), np.where(reached, lo, mid)
+            first_stage = np.average(calibration['slopes'], weights=calibration['share']*(1 - calibration['share']))
+            mde += [(window, n, outcome, hi[j], 100*hi[j]/calibration['ineligible_mean'][j], std_errors[:, j].mean(), first_stage)
+                    for j, outcome in enumerate(outcomes)]
+    surface = pd.DataFrame(surface, columns=['window', 'ids', 'outcome', 'effect', 'power']).set_index(['window', 'ids', 'outcome', 'effect'])
+    mde = pd.DataFrame(mde, columns=['window', 'ids', 'outcome', 'mde', 'mde_percent', 'std_error', 'first_stage'])
+    return surface, mde.set_index(['window', 'ids', 'outcome'])
+
+# Row of a result grid.
+def grid_row(label, values, fmt='.4f', pvalues=None, bold=False):
+    '''
+    label: string, row label.
+    values: list of numbers or strings, None for an empty cell.
+    fmt: format specification of numbers, e.g. '.4f' or '.0f', or a list with one per value.
+    pvalues: list of p-values for significance stars, None for no stars.
+    bold: bool, print the row in bold in the terminal.
+    '''
+    return {'label': label, 'values': list(values), 'format': fmt, 'pvalues': pvalues, 'bold': bold}
+
+# Result grid of a table, independent of the output format.
+def make_grid(title, header, rows, notes, width=None, label_width=15, cell_width=13):
+    '''
+    title: list of title lines.
+    header: list of header rows, each a list [label, column 1, column 2, ...].
+    rows: list of rows from grid_row().
+    notes: list of note lines.
+    width: width of horizontal rules in text output, by default the width of the table.
+    label_width, cell_width: column widths in text output.
+    '''
+    if width is None:
+        width = label_width + (cell_width + 3)*max(len(r['values']) for r in rows)
+    return {'title': title, 'header': header, 'rows': rows, 'notes': notes, 'width': width,
+            'label_width': label_width, 'cell_width': cell_width}
+
+# Format one cell of a grid row.
+def _grid_cell(row, i, stars=True):
+    value = row['values'][i]
+    if value is None:
+        return '', ''
+    if isinstance(value, str):
+        return value, ''
+    star = significance(row['pvalues'][i]).strip() if stars and row['pvalues'] is not None else ''
+    fmt = row['format'][i] if isinstance(row['format'], list) else row['format']
+    return format(value, fmt), star
+
+# Render a result grid as text, LaTeX, Markdown, HTML or CSV.
+def render_table(grid, fmt='text', ansi=True):
+    '''
+    Returns the whole table as one string.
+    grid: result grid from make_grid().
+    fmt: string, one of 'text', 'latex', 'markdown', 'html' or 'csv'. CSV contains unrounded values
+    and an extra p-value row below every row with significance stars.
+    ansi: bool, print bold rows and titles with ANSI escape codes in text output.
+    '''
+    out = io.StringIO()
+    n_cols = max(len(r) - 1 for r in grid['header'] + [[''] + r['values'] for r in grid['rows']])
+    
+    if fmt == 'text':
+        bold, end = ('\033[1m', '\033[0m') if ansi else ('', '')
+        lw, cw = grid['label_width'], grid['cell_width']
+        rule = grid['width']*'_' + '\n'
+        for line in grid['title']:
+            out.write(bold + line + end + '\n')
+        out.write(rule)
+        for header in grid['header']:
+            out.write(f'{header[0]:<{lw}s}' + ''.join(f'{c:>{cw}s}{"":<3s}' for c in header[1:]) + '\n')
+        out.write(rule)
+        for row in grid['rows']:
+            cells = [_grid_cell(row, i) for i in range(len(row['values']))]
+            b, e = (bold, end) if row['bold'] else ('', '')
+            out.write(f'{row["label"]:<{lw}s}' + ''.join(f'{b}{v:>{cw}s}{s:<3s}{e}' for v, s in cells) + '\n\n')
+        out.write(rule)
+        for line in grid['notes']:
+            out.write(line + '\n')
+    
+    elif fmt == 'markdown':
+        def md(cells):
+            cells = list(cells) + (n_cols + 1 - len(cells))*['']
+            return '| ' + ' | '.join(c.replace('*', '\\*').replace('|', '\\|') for c in cells) + ' |\n'
+        for line in grid['title']:
+            out.write('**' + line + '**\n\n')
+        out.write(md(grid['header'][0]))
+        out.write('|' + '---|'*(n_cols + 1) + '\n')
+        for header in grid['header'][1:]:
+            out.write(md(header))
+        for row in grid['rows']:
+            out.write(md([row['label']] + [v + s for v, s in (_grid_cell(row, i) for i in range(len(row['values'])))]))
+        out.write('\n' + ' '.join(grid['notes']) + '\n')
+    
+    elif fmt == 'latex':
+        def tex(text):
+            escapes = {'\\': '\\textbackslash{}', '&': '\\&', '%': '\\%', '_': '\\_', '#': '\\#', '$': '\\$', '{': '\\{',
+                       '}': '\\}', '^': '\\textasciicircum{}', '~': '\\textasciitilde{}'}
+            return ''.join(escapes.get(c, c) for c in text)
+        out.write('\\begin{table}[htbp]\n\\centering\n')
+        out.write('\\caption{' + tex(' '.join(grid['title'])) + '}\n')
+        out.write('\\begin{tabular}{l' + 'c'*n_cols + '}\n\\toprule\n')
+        for header in grid['header']:
+            out.write(' & '.join(tex(c) for c in header) + ' \\\\\n')
+        out.write('\\midrule\n')
+        for row in grid['rows']:
+            cells = [v + ('$^{' + s + '}$' if s else '') for v, s in (_grid_cell(row, i) for i in range(len(row['values'])))]
+            out.write(' & '.join([tex(row['label'])] + cells) + ' \\\\\n')
+        out.write('\\bottomrule\n\\end{tabular}\n')
+        out.write('\\par\\footnotesize ' + tex(' '.join(grid['notes'])) + '\n\\end{table}\n')
+    
+    elif fmt == 'html':
+        out.write('<table>\n<caption>' + html.escape(' '.join(grid['title'])) + '</caption>\n<thead>\n')
+        for header in grid['header']:
+            out.write('<tr>' + ''.join('<th>' + html.escape(c) + '</th>' for c in header) + '</tr>\n')
+        out.write('</thead>\n<tbody>\n')
+        for row in grid['rows']:
+            cells = [html.escape(v) + ('<sup>' + s + '</sup>' if s else '') for v, s in (_grid_cell(row, i) for i in range(len(row['values'])))]
+            tag = ('<b>', '</b>') if row['bold'] else ('', '')
+            out.write('<tr><td>' + html.escape(row['label']) + '</td>' + ''.join('<td>' + (tag[0] + c + tag[1] if c else '') + '</td>' for c in cells)
+                      + '</tr>\n')
+        out.write('</tbody>\n<tfoot><tr><td colspan="' + str(n_cols + 1) + '">' + html.escape(' '.join(grid['notes'])) + '</td></tr></tfoot>\n</table>\n')
+    
+    elif fmt == 'csv':
+        writer = csv.writer(out)
+        for header in grid['header']:
+            writer.writerow(header)
+        for row in grid['rows']:
+            counts = row['format'] == '.0f'
+            writer.writerow([row['label']] + ['' if v is None else int(round(v)) if counts and not isinstance(v, str) else v
+                                              for v in row['values']])
+            if row['pvalues'] is not None:
+                writer.writerow([row['label'] + ' (p-value)'] + ['' if isinstance(p, str) or p is None else p for p in row['pvalues']])
+    
+    else:
+        raise ValueError(f'unknown format {fmt}')
+    return out.getvalue()
+
+# Write a result grid in several formats in one pass.
+def write_table(grid, path, formats=DEFAULT_TABLE_FORMATS):
+    '''
+    Writes path + extension for every format (see render_table(); text is written without ANSI
+    codes) and returns the list of written files.
+    grid: result grid from make_grid().
+    path: file path without extension.
+    formats: list of formats, keys of TABLE_FORMATS.
+    '''
+    files = []
+    for fmt in formats:
+        file = path + '.' + TABLE_FORMATS[fmt]
+        with open(file, 'w', encoding='utf-8') as f:
+            f.write(render_table(grid, fmt, ansi=False))
+        files.append(file)
+    return files
+
+# Cohorts with more points than this are hexbinned or downsampled in figure files.
+FIGURE_MAX_POINTS = 20000
+
+# Draw one figure file in a worker with the non-interactive backend.
+def _draw_figure(spec, x, y, file):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    
+    fig, ax = plt.subplots(figsize=(6.4, 4.8))
+    if spec['kind'] == 'binned':
+        ax.plot(x, y)
+    elif spec['large'] == 'hexbin':
+        ax.hexbin(x, y, gridsize=50, mincnt=1, cmap='Blues')
+    else:
+        ax.scatter(x, y, s=4 if len(x) > 1000 else 20, alpha=0.5 if len(x) > 1000 else 1)
+    ax.set_xlabel(spec['xlabel'])
+    ax.set_ylabel(spec['ylabel'])
+    ax.set_title(spec['title'])
+    if spec.get('ylim') is not None:
+        ax.set_ylim(spec['ylim'])
+    if spec.get('xticks') is not None:
+        ax.set_xticks(spec['xticks'])
+    fig.savefig(file, dpi=spec.get('dpi', 100))
+    plt.close(fig)
+    return file
+
+# Data and drawing parameters of one figure per cohort.
+def _figure_jobs(df, figure, max_points):
+    bins = np.linspace(0, 1000, figure['bin_num'] + 1) if figure['kind'] == 'binned' else None
+    for i in figure['years']:
+        cohort = df[df.cohort == i]
+        spec = {'kind': figure['kind'], 'title': figure['title'].format(cohort=i), 'xlabel': figure.get('xlabel', figure['x']),
+                'ylabel': figure.get('ylabel', figure['y']), 'ylim': figure.get('ylim'), 'xticks': figure.get('xticks'),
+                'dpi': figure.get('dpi', 100), 'large': None}
+        if figure['kind'] == 'binned':
+            # Only the bin means are passed to the worker.
+            y = stats.binned_statistic(x=cohort[figure['x']], values=cohort[figure['y']], statistic='mean', bins=bins).statistic
+            x = bins[1:]
+        else:
+            data = cohort[[figure['x'], figure['y']]].dropna()
+            x, y = data[figure['x']].to_numpy(dtype=float), data[figure['y']].to_numpy(dtype=float)
+            if len(x) > max_points:
+                # Discrete x (e.g. highnumber) would collapse into one hexagon column, so it is sampled instead.
+                large = figure.get('large', 'auto')
+                spec['large'] = large if large != 'auto' else ('sample' if len(np.unique(x)) <= 10 else 'hexbin')
+                if spec['large'] == 'sample':
+                    keep = np.random.default_rng(i).choice(len(x), max_points, replace=False)
+                    keep.sort()
+                    x, y = x[keep], y[keep]
+        x, y = np.ascontiguousarray(x), np.ascontiguousarray(y)
+        key = hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode())
+        key.update(x.tobytes())
+        key.update(y.tobytes())
+        yield f'{figure["name"]}_{i}.png', spec, x, y, key.hexdigest()
+
+# Render per-cohort figures to files in parallel, skipping unchanged ones.
+def render_figures(df, figures, out_dir, workers=None, max_points=FIGURE_MAX_POINTS, force=False):
+    '''
+    Draws one PNG per figure and cohort in a process pool with matplotlib's Agg backend. The
+    content hash of every figure's data and parameters is kept in out_dir/figures.json; figures
+    whose hash and file are unchanged are not drawn again.
+    df: data frame to use.
+    figures: list of dicts with keys
+        name: file name prefix, files are named name_cohort.png,
+        kind: 'scatter' or 'binned' (binned means of y by draftnumber bins as in binned_plot()),
+        x, y: column names,
+        years: list of cohorts,
+        title: title, '{cohort}' is replaced by the cohort,
+        optional: bin_num (binned), ylim, xticks, xlabel, ylabel, dpi, large ('auto', 'hexbin' or 'sample').
+    out_dir: directory for the figures.
+    workers: number of processes.
+    max_points: scatter plots of cohorts with more points are hexbinned (continuous x) or sampled
+    down to max_points (discrete x, 'auto').
+    force: bool, draw all figures even if unchanged.
+    Returns a data frame with file, hash and status ('drawn' or 'cached') per figure.
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_file = os.path.join(out_dir, 'figures.json')
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    
+    rows = []
+    pending = []
+    for figure in figures:
+        for name, spec, x, y, key in _figure_jobs(df, figure, max_points):
+            file = os.path.join(out_dir, name)
+            cached = not force and manifest.get(name) == key and os.path.exists(file)
+            rows.append({'file': file, 'hash': key, 'status': 'cached' if cached else 'drawn'})
+            if not cached:
+                pending.append((name, spec, x, y, file, key))
+    
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(name, key, executor.submit(_draw_figure, spec, x, y, file)) for name, spec, x, y, file, key in pending]
+            for name, key, future in futures:
+                future.result()
+                manifest[name] = key
+        with open(manifest_file, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+    return pd.DataFrame(rows)
+
+# Figures of the notebook: scatter plots by cohort, failure and conscription rates by draftnumber.
+def notebook_figures(years=tuple(range(1958, 1963, 1)), bin_num=200):
+    '''
+    Returns the figure list for render_figures() that reproduces the per-cohort plots of the notebook.
+    '''
+    return [{'name': 'crime_eligibility', 'kind': 'scatter', 'x': 'highnumber', 'y': 'crimerate', 'years': years,
+             'title': 'Crime Rates by Draft Eligiblity for Cohort {cohort}', 'xticks': (0, 1)},
+            {'name': 'crime_conscription', 'kind': 'scatter', 'x': 'sm', 'y': 'crimerate', 'years': years,
+             'title': 'Crime Rates by Conscription Rates for Cohort {cohort}'},
+            {'name': 'failure_rate', 'kind': 'binned', 'x': 'draftnumber', 'y': 'enfdummy', 'years': years, 'bin_num': bin_num,
+             'ylim': [0.04, 0.115],
+             'title': 'Failure Rates for Cohort {cohort}', 'xlabel': 'Draftnumber', 'ylabel': 'Failure rate'},
+            {'name': 'conscription_rate', 'kind': 'binned', 'x': 'draftnumber', 'y': 'sm', 'years': years, 'bin_num': bin_num,
+             'ylim': [0, 0.9],
+             'title': 'Conscription Rates for Cohort {cohort}', 'xlabel': 'Draftnumber', 'ylabel': 'Conscription rate'}]
+
+# Columns of individual-level records by panel variable. Rates are cell means of the 0/1 or
+# numeric record columns, origin and district are categorical and give shares per cell.
+RECORD_COLUMNS = {'cohort': 'cohort', 'id': 'id', 'draftnumber': 'draftnumber', 'highnumber': 'highnumber', 'navy': 'navy',
+                  'sm': 'served', 'enfdummy': 'failed_exam', 'crimerate': 'criminal_record', 'arms': 'arms',
+                  'property': 'property', 'sexual': 'sexual', 'murder': 'murder', 'threat': 'threat', 'drug': 'drug',
+                  'whitecollar': 'whitecollar', 'formal': 'formal', 'unemployment': 'unemployed', 'income': 'income',
+                  'origin': 'origin', 'district': 'district'}
+
+# Cell variables of the panel: lottery variables (constant within a cell) and rates.
+_LOTTERY_VARIABLES = ['draftnumber', 'highnumber', 'navy']
+_RATE_VARIABLES = ['sm', 'enfdummy', 'crimerate', 'arms', 'property', 'sexual', 'murder', 'threat', 'drug', 'whitecollar',
+                   'formal', 'unemployment', 'income']
+_ORIGINS = ['argentine', 'naturalized', 'indigenous']
+
+# Partial sums of one chunk of records by cell.
+def _aggregate_chunk(chunk, columns):
+    '''
+    chunk: data frame of records, or (directory, start, stop) of columnar records that the worker
+    reads itself.
+    Returns the cell keys (cohort*1000 + id) and data frames of sums, non-missing counts and
+    maxima of the lottery variables, indexed by key.
+    '''
+    if isinstance(chunk, tuple):
+        directory, start, stop = chunk
+        chunk = pd.DataFrame({name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')[start: stop]
+                              for name in set(columns.values()) if os.path.exists(os.path.join(directory, name + '.npy'))})
+    key = chunk[columns['cohort']].to_numpy(dtype=np.int64)*1000 + chunk[columns['id']].to_numpy(dtype=np.int64)
+    cells, codes = np.unique(key, return_inverse=True)
+    
+    values = {v: chunk[columns[v]].to_numpy(dtype=float) for v in _RATE_VARIABLES if columns[v] in chunk}
+    if columns['origin'] in chunk:
+        origin = chunk[columns['origin']]
+        # Origin is given either as name or as code 0, 1, 2 in the order of _ORIGINS.
+        origin = origin.map(dict(enumerate(_ORIGINS))) if pd.api.types.is_numeric_dtype(origin) else origin
+        for name in _ORIGINS:
+            values[name] = np.where(origin.isna(), np.nan, (origin == name).to_numpy(dtype=float))
+    if columns['district'] in chunk:
+        district = chunk[columns['district']].to_numpy(dtype=float)
+        for k in range(1, 25, 1):
+            values['dist' + f'{k}'] = np.where(np.isnan(district), np.nan, district == k)
+    
+    sums = {}
+    counts = {}
+    for name, v in values.items():
+        valid = ~np.isnan(v)
+        sums[name] = np.bincount(codes, weights=np.where(valid, v, 0), minlength=len(cells))
+        counts[name] = np.bincount(codes, weights=valid, minlength=len(cells))
+    lottery = {}
+    for name in _LOTTERY_VARIABLES:
+        if columns[name] in chunk:
+            m = np.full(len(cells), np.nan)
+            np.fmax.at(m, codes, chunk[columns[name]].to_numpy(dtype=float))
+            lottery[name] = m
+    return (pd.DataFrame(sums, index=cells), pd.DataFrame(counts, index=cells), pd.DataFrame(lottery, index=cells))
+
+# Chunks of a record source: data frames or (directory, start, stop) of columnar records.
+def _record_chunks(source, chunksize):
+    if isinstance(source, str) and os.path.isdir(source):
+        n = len(np.load(os.path.join(source, RECORD_COLUMNS['cohort'] + '.npy'), mmap_mode='r'))
+        for start in range(0, n, chunksize):
+            yield (source, start, min(start + chunksize, n))
+    elif isinstance(source, str) and source.endswith('.csv'):
+        yield from pd.read_csv(source, chunksize=chunksize)
+    elif isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start: start + chunksize]
+    else:
+        yield from source
+
+# Aggregate individual-level records into the cohort x ID panel.
+def aggregate_records(source, columns=None, lottery=None, chunksize=500000, workers=None):
+    '''
+    Streams individual-level records in chunks through a process pool and returns the panel of
+    cohort x ID cells with the columns of data/Crime.dta (see simulate_panel()), which can be
+    written with write_panel() and read by get_variables(). Every chunk is reduced to sums and
+    non-missing counts per cell in a worker; only these partial sums are merged, so memory
+    depends on the number of cells and not on the number of records.
+    source: CSV file, directory with one .npy file per record column (read by the workers with
+    memory mapping), data frame or iterable of data frames.
+    columns: dict panel variable -> record column, overrides RECORD_COLUMNS. Record columns are
+    the cohort, the ID cell (last three digits of the ID), 0/1 indicators (served, failed_exam,
+    criminal_record, crime types, formal, unemployed), income, origin ('argentine',
+    'naturalized', 'indigenous' or 0, 1, 2), district (1 to 24) and the lottery variables
+    draftnumber, highnumber and navy, which are constant within a cell.
+    lottery: optional data frame with cohort, id, draftnumber, highnumber and navy by cell, used
+    instead of the lottery columns of the records. Raises ValueError if a cell of the records has
+    no row in lottery.
+    chunksize: number of records per chunk.
+    workers: number of processes.
+    Rates are cell means over non-missing records, origin and district columns are shares of the
+    cell. Lottery variables that are missing in all records of a cell are missing in the panel
+    (nullable Int32/Int8 columns).
+    '''
+    columns = dict(RECORD_COLUMNS, **(columns or {}))
+    sums = counts = maxima = None
+    
+    def merge(partial):
+        nonlocal sums, counts, maxima
+        s, c, m = partial
+        if sums is None:
+            sums, counts, maxima = s, c, m
+        else:
+            sums = sums.add(s, fill_value=0)
+            counts = counts.add(c, fill_value=0)
+            maxima = maxima.combine(m, np.fmax) if len(m.columns) else maxima
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # At most two chunks per worker are in flight, so the reader does not run ahead of the pool.
+        limit = 2*(workers or os.cpu_count())
+        pending = []
+        for chunk in _record_chunks(source, chunksize):
+            pending.append(executor.submit(_aggregate_chunk, chunk, columns))
+            if len(pending) >= limit:
+                merge(pending.pop(0).result())
+        for future in pending:
+            merge(future.result())
+    if sums is None:
+        raise ValueError('source contains no records')
+    
+    rates = sums/counts.where(counts > 0)
+    cells = rates.index.to_numpy()
+    panel = pd.DataFrame({'cohort': (cells // 1000).astype(np.int16), 'id': (cells % 1000).astype(np.int32)})
+    if lottery is not None:
+        draws = lottery.set_index(lottery.cohort.to_numpy(dtype=np.int64)*1000 + lottery.id.to_numpy(dtype=np.int64))
+        unmatched = cells[~np.isin(cells, draws.index.to_numpy())]
+        if len(unmatched):
+            raise ValueError(f'{len(unmatched)} cells have no row in lottery, e.g. cohort {unmatched[0] // 1000}, id {unmatched[0] % 1000}')
+        maxima = draws[_LOTTERY_VARIABLES].reindex(cells)
+    for name in _LOTTERY_VARIABLES:
+        if name in maxima:
+            # Cells without a lottery value in any record keep a missing value (nullable integers).
+            values = maxima[name].reindex(cells).to_numpy(dtype=float)
+            if np.isnan(values).any():
+                panel[name] = pd.array(values, dtype='Int32' if name == 'draftnumber' else 'Int8')
+            else:
+                panel[name] = values.astype(np.int32 if name == 'draftnumber' else np.int8)
+    for name in _RATE_VARIABLES:
+        if name in rates:
+            panel[name] = rates[name].to_numpy(dtype=np.float32)
+    for k in range(1, 25, 1):
+        if 'dist' + f'{k}' in rates:
+            panel['dist' + f'{k}'] = rates['dist' + f'{k}'].to_numpy(dtype=np.float32)
+    for name in _ORIGINS:
+        if name in rates:
+            panel[name] = rates[name].to_numpy(dtype=np.float32)
+    panel['malvinas'] = np.isin(panel.cohort, [1962, 1963]).astype(np.int8)
+    
+    # Column order of data/Crime.dta.
+    order = ['cohort', 'id', 'draftnumber', 'highnumber', 'sm', 'enfdummy', 'crimerate', 'arms', 'property', 'sexual', 'murder',
+             'threat', 'drug', 'whitecollar'] + ['dist' + f'{k}' for k in range(1, 25, 1)] + _ORIGINS + \
+            ['navy', 'malvinas', 'formal', 'unemployment', 'income']
+    return panel[[c for c in order if c in panel]]
+
+# Intention-to-treat, first stage and Wald estimates from two-group moments.
+def wald_by_group(df, outcome='crimerate', treatment='sm', instrument='highnumber', group='cohort', groups=None,
+                  cohort_range=None):
+    '''
+    Closed-form estimators without controls for every group, from grouped sums over contiguous
+    arrays (one bincount pass for the means, one for the centered second moments):
+    y_1, y_0: mean outcome of draft eligible (instrument == 1) and exempt men,
+    itt = y_1 - y_0 with standard error sqrt(var_1/n_1 + var_0/n_0),
+    p1, p2: mean treatment (conscription) of eligible and exempt men, first_stage = p1 - p2,
+    wald = itt/first_stage with delta-method standard error
+    sqrt(var(itt) - 2*wald*cov(itt, first_stage) + wald**2*var(first_stage))/|first_stage|.
+    Missing values are dropped for each variable separately (for the covariance, pairwise), as
+    pandas' mean() does.
+    df: data frame to use.
+    outcome, treatment, instrument: column names, the instrument is 0/1 (raises ValueError for other
+    non-missing values).
+    group: column name, list of column names or None for one pooled group.
+    groups: list of groups to keep, None for all.
+    cohort_range: list/2-tuple, first and last cohort to use, None for all.
+    Returns a data frame indexed by group.
+    '''
+    keys = [] if group is None else [group] if isinstance(group, str) else list(group)
+    rows = np.ones(len(df), dtype=bool)
+    if cohort_range is not None:
+        cohort = df['cohort'].to_numpy()
+        rows &= (cohort >= cohort_range[0]) & (cohort <= cohort_range[1])
+    if groups is not None and len(keys) == 1:
+        rows &= df[keys[0]].isin(groups).to_numpy()
+    z = df[instrument].to_numpy(dtype=float)[rows]
+    rows_z = ~np.isnan(z)
+    if not np.isin(z[rows_z], [0, 1]).all():
+        raise ValueError(f'instrument {instrument} must be 0 or 1, found {np.setdiff1d(z[rows_z], [0, 1])[:5]}')
+    
+    if keys:
+        labels = [df[k].to_numpy()[rows] for k in keys]
+        codes, index = pd.factorize(pd.Index(labels[0], name=keys[0]) if len(keys) == 1 else
+                                    pd.MultiIndex.from_arrays(labels, names=keys), sort=True)
+        index.names = keys
+        # Rows with a missing group are dropped with the rows with a missing instrument.
+        rows_z &= codes >= 0
+    else:
+        codes = np.zeros(int(rows.sum()), dtype=np.int64)
+        index = pd.Index(['all'], name='group')
+    # Cells are (group, instrument) pairs: 2*code + z.
+    cells = np.where(rows_z, 2*codes + np.where(rows_z, z, 0).astype(np.int64), 2*len(index))
+    size = 2*len(index) + 1
+    
+    y = df[outcome].to_numpy(dtype=float)[rows]
+    d = df[treatment].to_numpy(dtype=float)[rows]
+    valid_y, valid_d = ~np.isnan(y), ~np.isnan(d)
+    valid_yd = valid_y & valid_d
+    y0, d0 = np.where(valid_y, y, 0), np.where(valid_d, d, 0)
+    
+    def moments(values, valid):
+        n = np.bincount(cells, weights=valid, minlength=size)[:-1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return n, np.bincount(cells, weights=values, minlength=size)[:-1]/n
+    n_y, mean_y = moments(y0, valid_y)
+    n_d, mean_d = moments(d0, valid_d)
+    n_yd = np.bincount(cells, weights=valid_yd, minlength=size)[:-1]
+    dev_y = np.where(valid_y, y0 - np.append(mean_y, 0)[cells], 0)
+    dev_d = np.where(valid_d, d0 - np.append(mean_d, 0)[cells], 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var_y = np.bincount(cells, weights=dev_y**2, minlength=size)[:-1]/(n_y - 1)
+        var_d = np.bincount(cells, weights=dev_d**2, minlength=size)[:-1]/(n_d - 1)
+        cov_yd = np.bincount(cells, weights=np.where(valid_yd, dev_y*dev_d, 0), minlength=size)[:-1]/(n_yd - 1)
+        
+        # Columns 1 and 0 of the reshaped arrays are the eligible and exempt cells.
+        n_y, mean_y, var_y = n_y.reshape(-1, 2), mean_y.reshape(-1, 2), var_y.reshape(-1, 2)
+        n_d, mean_d, var_d = n_d.reshape(-1, 2), mean_d.reshape(-1, 2), var_d.reshape(-1, 2)
+        n_yd, cov_yd = n_yd.reshape(-1, 2), cov_yd.reshape(-1, 2)
+        itt = mean_y[:, 1] - mean_y[:, 0]
+        first_stage = mean_d[:, 1] - mean_d[:, 0]
+        var_itt = (var_y/n_y).sum(axis=1)
+        var_fs = (var_d/n_d).sum(axis=1)
+        cov = (cov_yd*n_yd/(n_y*n_d)).sum(axis=1)
+        wald = itt/first_stage
+        wald_se = np.sqrt(var_itt - 2*wald*cov + wald**2*var_fs)/np.abs(first_stage)
+    return pd.DataFrame({'n_1': n_y[:, 1], 'n_0': n_y[:, 0], 'y_1': mean_y[:, 1], 'y_0': mean_y[:, 0], 'itt': itt,
+                         'itt_se': np.sqrt(var_itt), 'p1': mean_d[:, 1], 'p2': mean_d[:, 0], 'first_stage': first_stage,
+                         'first_stage_se': np.sqrt(var_fs), 'wald': wald, 'wald_se': wald_se}, index=index)
+
+# Independent seed streams of a set of tasks.
+def task_seeds(seed, n):
+    '''
+    Returns n child seeds of np.random.SeedSequence(seed). Task i always gets child i, however
+    the tasks are distributed over processes.
+    '''
+    return np.random.SeedSequence(seed).spawn(n)
+
+# Run tasks serially or in a process pool with per-task seeds and results in task order.
+def run_tasks(func, tasks, seed=None, workers=1):
+    '''
+    Calls func(*task) for every task, with the keyword seed=task_seeds(seed, len(tasks))[i] if
+    seed is not None. Results are returned in the order of tasks, so reductions over them are
+    ordered the same way for every number of workers and the output is bitwise identical to the
+    serial run (workers=1).
+    func: module-level function.
+    tasks: list of argument tuples.
+    seed: int or None.
+    workers: number of processes, 1 runs in this process.
+    '''
+    kwargs = [{}]*len(tasks) if seed is None else [{'seed': s} for s in task_seeds(seed, len(tasks))]
+    if workers == 1 or len(tasks) <= 1:
+        return [func(*task, **kw) for task, kw in zip(tasks, kwargs)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, *task, **kw) for task, kw in zip(tasks, kwargs)]
+        return [future.result() for future in futures]
+
+# Feed a result into a hash. Numeric arrays are hashed as little-endian bytes, other values by
+# their JSON form with floats written exactly (float.hex).
+def _hash_update(digest, obj):
+    if isinstance(obj, pd.DataFrame):
+        digest.update(b'DataFrame')
+        _hash_update(digest, [str(c) for c in obj.columns])
+        _hash_update(digest, obj.index)
+        for c in obj.columns:
+            _hash_update(digest, obj[c].to_numpy())
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        digest.update(type(obj).__name__.encode())
+        if isinstance(obj, pd.Series):
+            _hash_update(digest, obj.index)
+        _hash_update(digest, obj.to_numpy() if not isinstance(obj, pd.MultiIndex) else list(obj))
+    elif isinstance(obj, np.ndarray) and obj.dtype.kind in 'biuf':
+        digest.update(json.dumps(['ndarray', obj.dtype.kind, list(obj.shape)]).encode())
+        dtype = {'b': '<u1', 'i': '<i8', 'u': '<u8', 'f': '<f8'}[obj.dtype.kind]
+        digest.update(np.ascontiguousarray(obj, dtype=dtype).tobytes())
+    elif isinstance(obj, np.ndarray):
+        digest.update(json.dumps(['ndarray', list(obj.shape)]).encode())
+        _hash_update(digest, obj.ravel().tolist())
+    elif isinstance(obj, dict):
+        digest.update(b'{')
+        for key in sorted(obj, key=str):
+            _hash_update(digest, str(key))
+            _hash_update(digest, obj[key])
+        digest.update(b'}')
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'[')
+        for value in obj:
+            _hash_update(digest, value)
+        digest.update(b']')
+    elif isinstance(obj, (float, np.floating)):
+        digest.update(float(obj).hex().encode() + b';')
+    else:
+        digest.update(json.dumps(obj.item() if isinstance(obj, np.generic) else obj, default=str).encode() + b';')
+
+# Hash of a result (data frame, series, array, grid, dict, list or number).
+def result_hash(obj):
+    '''
+    Returns the sha1 of obj. Equal hashes mean bitwise equal numbers.
+    '''
+    digest = hashlib.sha1()
+    _hash_update(digest, obj)
+    return digest.hexdigest()
+
+# Write result hashes.
+def write_hashes(results, path):
+    '''
+    results: dict name -> result, e.g. tables or bootstrap outputs.
+    path: JSON file, existing entries of other names are kept.
+    '''
+    hashes = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            hashes = json.load(f)
+    hashes.update({name: result_hash(value) for name, value in results.items()})
+    with open(path, 'w') as f:
+        json.dump(hashes, f, indent=1, sort_keys=True)
+    return hashes
+
+# Compare results with stored hashes.
+def check_hashes(results, path):
+    '''
+    Returns a data frame with name, expected and actual hash and match per result. Results
+    without a stored hash have expected None and match False.
+    '''
+    with open(path) as f:
+        hashes = json.load(f)
+    rows = [{'name': name, 'expected': hashes.get(name), 'actual': result_hash(value)} for name, value in results.items()]
+    rslts = pd.DataFrame(rows, columns=['name', 'expected', 'actual'])
+    rslts['match'] = rslts.expected == rslts.actual
+    return rslts
+
+# Results of a statsmodels or linearmodels fit as rows (spec, variable).
+def _result_frame(rslts, spec):
+    std_errors = rslts.HC0_se if hasattr(rslts, 'HC0_se') else rslts.std_errors
+    index = pd.MultiIndex.from_product([[spec], list(rslts.params.index)], names=['spec', 'variable'])
+    return pd.DataFrame({'params': rslts.params.to_numpy(), 'std_errors': np.asarray(std_errors), 'pvalues': np.asarray(rslts.pvalues),
+                         'nobs': float(rslts.nobs)}, index=index)
+
+# Results of regress_by_group() as rows (spec, variable).
+def _group_frame(rslts, spec=None):
+    rslts = rslts.copy()
+    groups = rslts.index.get_level_values(0)
+    specs = groups.astype(str) if spec is None else [spec]*len(rslts)
+    rslts.index = pd.MultiIndex.from_arrays([specs, rslts.index.get_level_values(1)], names=['spec', 'variable'])
+    return rslts[['params', 'std_errors', 'pvalues', 'nobs']].astype(float)
+
+# Reference and fast backends of the equivalence harness for one panel.
+def _equivalence_cases(df):
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas = get_variable_lists()
+    years = list(range(1958, 1963, 1))
+    table_4_specs = [('OLS', [1958, 1962], 'n'), ('OLS', [1958, 1962], 'y'), ('IV', [1958, 1962], 'n'), ('IV', [1958, 1962], 'y'),
+                     ('OLS', [1929, 1965], 'n'), ('OLS', [1929, 1955], 'n'), ('OLS', [1958, 1965], 'n')]
+    table_5_specs = [(hn_malvinas, [1929, 1965]), (hn_malvinas, [1958, 1965]), (navy, [1929, 1965]), (navy, [1958, 1965])]
+    crimes = ['arms', 'property', 'sexual', 'murder', 'threat', 'drug', 'whitecollar']
+    core = df[(df.cohort >= 1958) & (df.cohort <= 1962)]
+    
+    def window(cohort_range):
+        return df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])]
+    
+    def dummies(cohort_range):
+        return ['cohort_' + f'{i}' for i in range(cohort_range[0] + 1, cohort_range[1] + 1)]
+    
+    def regress_reference():
+        return pd.concat([_result_frame(regress_prepared(df, method, w, dummies(w), controls), f'{method} {w[0]}-{w[1]} {controls}')
+                          for method, w, controls in table_4_specs])
+    
+    def regress_fast():
+        frames = []
+        for method, w, controls in table_4_specs:
+            exog, endog, instruments, extra = _regress_spec(method, dummies(w), controls)
+            rslts = regress_by_group(window(w).dropna(subset=extra), method, 'constant', 'crimerate', exog, endog or ['sm'], instruments or ['highnumber'])
+            frames.append(_group_frame(rslts, f'{method} {w[0]}-{w[1]} {controls}'))
+        return pd.concat(frames)
+    
+    def regress_mixed_fast():
+        frames = []
+        for method, w, controls in table_4_specs:
+            rslts = regress_mixed(df, method, w, dummies(w), controls)[0]
+            rslts.index = pd.MultiIndex.from_product([[f'{method} {w[0]}-{w[1]} {controls}'], rslts.index], names=['spec', 'variable'])
+            frames.append(rslts)
+        return pd.concat(frames)
+    
+    def table_3_reference():
+        frames = [_result_frame(sm.OLS(core['sm'], core[highnumber + cohorts[29: 33] + constant]).fit(), '1958-1962')]
+        for i in years:
+            data = df[df.cohort == i]
+            frames.append(_result_frame(sm.OLS(data['sm'], data[highnumber + constant]).fit(), str(i)))
+        return pd.concat(frames)
+    
+    def table_3_fast():
+        return pd.concat([_group_frame(regress_by_group(core, 'OLS', 'constant', 'sm', highnumber + cohorts[29: 33] + constant),
+                                       '1958-1962'),
+                          _group_frame(regress_by_group(df, 'OLS', 'cohort', 'sm', highnumber + constant, groups=years))])
+    
+    def table_5_reference():
+        frames = []
+        for extra, w in table_5_specs:
+            regressors = highnumber + extra + constant + dummies(w)
+            data = window(w)[regressors + crimerate].dropna(axis=0)
+            frames.append(_result_frame(sm.OLS(data['crimerate'], data[regressors]).fit(), f'{extra[0]} {w[0]}-{w[1]}'))
+        return pd.concat(frames)
+    
+    def table_5_fast():
+        return pd.concat([_group_frame(regress_by_group(window(w), 'OLS', 'constant', 'crimerate', highnumber + extra + constant + dummies(w)),
+                                       f'{extra[0]} {w[0]}-{w[1]}') for extra, w in table_5_specs])
+    
+    def table_6_reference():
+        return pd.concat([_result_frame(IV2SLS(core[crime], core[constant + cohorts[29: 33]], core['sm'], core['highnumber']).fit(), crime)
+                          for crime in crimes])
+    
+    def table_6_fast():
+        return pd.concat([_group_frame(regress_by_group(core, 'IV', 'constant', crime, constant + cohorts[29: 33]), crime)
+                          for crime in crimes])
+    
+    def wald_reference():
+        frames = []
+        for i in years:
+            data = df[df.cohort == i]
+            rslts = IV2SLS(data['crimerate'], data[constant], data['sm'], data['highnumber']).fit()
+            frames.append(_result_frame(rslts, str(i)).loc[[(str(i), 'sm')]])
+        return pd.concat(frames)
+    
+    def wald_fast():
+        # IV2SLS drops rows with a missing value in any variable, wald_by_group() variable by variable.
+        rslts = wald_by_group(df[['cohort', 'crimerate', 'sm', 'highnumber']].dropna(axis=0), 'crimerate', groups=years)
+        index = pd.MultiIndex.from_arrays([rslts.index.astype(str), ['sm']*len(rslts)], names=['spec', 'variable'])
+        return pd.DataFrame({'params': rslts.wald.to_numpy(), 'nobs': (rslts.n_1 + rslts.n_0).to_numpy()}, index=index)
+    
+    # Case: reference, fast backend, compared columns.
+    return {'regress (table 4)': (regress_reference, regress_fast, ['params', 'std_errors', 'pvalues', 'nobs']),
+            'regress (mixed precision)': (regress_reference, regress_mixed_fast, ['params', 'std_errors', 'pvalues', 'nobs']),
+            'table 3': (table_3_reference, table_3_fast, ['params', 'std_errors', 'pvalues', 'nobs']),
+            'table 5': (table_5_reference, table_5_fast, ['params', 'std_errors', 'pvalues', 'nobs']),
+            'table 6': (table_6_reference, table_6_fast, ['params', 'std_errors', 'pvalues', 'nobs']),
+            'wald (no controls)': (wald_reference, wald_fast, ['params', 'nobs'])}
+
+# Golden-result harness: fast backends against statsmodels/linearmodels.
+def equivalence_report(panels=None, rtol=1e-8, atol=1e-12, pvalue_atol=1e-10, repeat=3):
+    '''
+    Runs the reference estimators (sm.OLS with HC0 standard errors, IV2SLS) and the grouped-moment
+    backends (regress_by_group(), regress_mixed(), wald_by_group()) side by side for the specifications
+    of regress()/table 4, table 3, table 5, table 6 and the per-cohort Wald estimates, and compares
+    coefficients, robust standard errors, p-values and nobs variable by variable. The Wald case
+    compares coefficients and nobs only, since its delta-method standard errors differ from the
+    2SLS ones in finite samples.
+    panels: dict name -> data frame as returned by get_variables(). By default data/Crime.dta (if
+    present) and a synthetic panel from simulate_panel().
+    rtol, atol: tolerances of coefficients and standard errors, |fast - reference| <= atol + rtol*|reference|.
+    pvalue_atol: absolute tolerance of p-values.
+    repeat: timing runs per backend, the fastest one is reported.
+    Returns a summary data frame (case, panel, number of compared rows, maximum absolute and relative
+    differences, passed, reference and fast seconds, speedup) and the data frame of all compared rows.
+    '''
+    if panels is None:
+        panels = {}
+        if os.path.exists('data/Crime.dta'):
+            panels['data'] = get_variables()[-1]
+        panels['synthetic'] = prepare_panel(simulate_panel(seed=1))
+    
+    def timed(func):
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rslts = func()
+            best = min(best, time.perf_counter() - start)
+        return rslts, best
+    
+    summary = []
+    details = []
+    for panel_name, df in panels.items():
+        for case, (reference, fast, columns) in _equivalence_cases(df).items():
+            ref, ref_seconds = timed(reference)
+            new, fast_seconds = timed(fast)
+            joined = ref[columns].join(new[columns], how='outer', rsuffix='_fast')
+            row = {'case': case, 'panel': panel_name, 'rows': len(joined)}
+            passed = True
+            for col in columns:
+                a, b = joined[col].to_numpy(), joined[col + '_fast'].to_numpy()
+                diff = np.abs(b - a)
+                joined[col + '_diff'] = diff
+                if col == 'nobs':
+                    ok = a == b
+                elif col == 'pvalues':
+                    ok = diff <= pvalue_atol
+                else:
+                    ok = diff <= atol + rtol*np.abs(a)
+                row['max_abs_' + col] = np.nanmax(diff) if len(diff) and not np.isnan(diff).all() else np.nan
+                if col in ['params', 'std_errors']:
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        row['max_rel_' + col] = np.nanmax(np.where(a != 0, diff/np.abs(a), 0))
+                passed &= bool(ok.all())
+            row.update({'passed': passed, 'reference_seconds': ref_seconds, 'fast_seconds': fast_seconds,
+                        'speedup': ref_seconds/fast_seconds})
+            summary.append(row)
+            joined.insert(0, 'panel', panel_name)
+            joined.insert(0, 'case', case)
+            details.append(joined.reset_index())
+    return pd.DataFrame(summary), pd.concat(details, ignore_index=True, sort=False)
+
+# Event study: effect of draft eligibility by cohort with cohort fixed effects.
+def event_study(df, outcome='crimerate', controls=(), cohort_range=(1929, 1976), alpha=0.05):
+    '''
+    OLS of outcome on highnumber x cohort interactions for every cohort, cohort fixed effects and
+    optional controls (e.g. origin + districts) with robust (HC0) covariance. Cohort fixed effects
+    are absorbed by demeaning within cohort. After demeaning, every interaction is nonzero in one
+    cohort only, so all cross products and the robust meat are grouped sums over the sorted data
+    and the cost is that of one pooled fit. Cohorts without variation in highnumber get NaN.
+    df: data frame as returned by get_variables().
+    outcome: dependent variable, e.g. 'crimerate' (intention to treat) or 'sm' (first stage).
+    controls: list of control variables common to all cohorts, the constant is absorbed.
+    cohort_range: list/2-tuple, first and last cohort.
+    alpha: level of the confidence intervals.
+    Returns the coefficient path, a data frame by cohort with params, std_errors, pvalues (t-test as
+    in sm.OLS), ci_lower, ci_upper, nobs and share_eligible, and the robust covariance matrix of
+    the interactions (data frame by cohort).
+    '''
+    controls = [c for c in controls if c != 'constant']
+    data = df[(df.cohort >= cohort_range[0]) & (df.cohort <= cohort_range[1])][['cohort', 'highnumber', outcome] + controls]
+    data = data.dropna(axis=0)
+    order, labels, starts, stops = _group_blocks(data['cohort'].to_numpy())
+    nobs = stops - starts
+    
+    # Demean within cohort.
+    def demean(values):
+        means = np.add.reduceat(values, starts, axis=0)/(nobs if values.ndim == 1 else nobs[:, None])
+        return values - np.repeat(means, nobs, axis=0)
+    raw_h = data['highnumber'].to_numpy(dtype=float)[order]
+    h = demean(raw_h)
+    y = demean(data[outcome].to_numpy(dtype=float)[order])
+    W = demean(data[controls].to_numpy(dtype=float)[order]) if controls else np.zeros((len(y), 0))
+    
+    # Interactions of cohorts with variation in highnumber.
+    hh = np.add.reduceat(h*h, starts)
+    identified = hh > 1e-12*nobs
+    cols = np.flatnonzero(identified)
+    C, p = len(cols), W.shape[1]
+    
+    # Cross products: diagonal block of the interactions, grouped sums with the controls.
+    hW = np.add.reduceat(h[:, None]*W, starts, axis=0)[cols] if p else np.zeros((C, 0))
+    XX = np.block([[np.diag(hh[cols]), hW], [hW.T, W.T @ W]])
+    Xy = np.concatenate([np.add.reduceat(h*y, starts)[cols], W.T @ y])
+    bread = np.linalg.pinv(XX)
+    beta = bread @ Xy
+    
+    # Residuals and robust meat from the same grouped sums.
+    slope = np.zeros(len(labels))
+    slope[cols] = beta[:C]
+    u = y - h*np.repeat(slope, nobs) - W @ beta[C:]
+    uh = u*h
+    uW = u[:, None]*W
+    uhW = np.add.reduceat(uh[:, None]*uW, starts, axis=0)[cols] if p else np.zeros((C, 0))
+    meat = np.block([[np.diag(np.add.reduceat(uh*uh, starts)[cols]), uhW], [uhW.T, uW.T @ uW]])
+    cov = bread @ meat @ bread
+    
+    # Degrees of freedom as in the regression with all cohort dummies.
+    df_resid = len(y) - len(labels) - np.linalg.matrix_rank(XX)
+    std_errors = np.full(len(labels), np.nan)
+    params = np.full(len(labels), np.nan)
+    params[cols] = beta[:C]
+    std_errors[cols] = np.sqrt(np.diag(cov)[:C])
+    t_crit = stats.t.ppf(1 - alpha/2, df_resid)
+    path = pd.DataFrame({'params': params, 'std_errors': std_errors,
+                         'pvalues': 2*stats.t.sf(np.abs(params/std_errors), df_resid),
+                         'ci_lower': params - t_crit*std_errors, 'ci_upper': params + t_crit*std_errors,
+                         'nobs': nobs, 'share_eligible': np.add.reduceat(raw_h, starts)/nobs},
+                        index=pd.Index(labels, name='cohort'))
+    cov = pd.DataFrame(cov[:C, :C], index=path.index[cols], columns=path.index[cols])
+    return path, cov
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Job service for on-demand table and specification requests.
+
+The service keeps the prepared panel warm in its workers, runs identical in-flight
+requests only once and streams results back as JSON lines over a Unix socket
+(or a local TCP port). Start it from the repository root with
+
+    python -m auxiliary.service --socket /tmp/conscription.sock
+
+and send one JSON object per line, e.g.
+
+    {"id": 1, "job": "regress", "args": {"method": "IV", "cohort_range": [1958, 1962], "controls": "y"}}
+    {"id": 2, "job": "outcome_iv", "args": {"outcome": "arms"}}
+"""
+
+# Import modules.
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from linearmodels import IV2SLS
+
+from auxiliary.functions_v6 import get_variables, get_variable_lists, regress_prepared
+
+# Prepared panel of this worker process, loaded on the first job.
+_panel = None
+
+# Get the warm panel of the worker.
+def _get_panel():
+    global _panel
+    if _panel is None:
+        _panel = get_variables()[-1]
+    return _panel
+
+# Job: one column of table 4 via regress().
+def _job_regress(method, cohort_range, controls):
+    '''
+    method: string, either 'IV' or 'OLS'.
+    cohort_range: list/2-tuple, indicating first and last cohort. Cohort dummies are included for all
+    cohorts of the window except the first one.
+    controls: string, either 'y' or 'n'.
+    '''
+    df = _get_panel()
+    cohort_dummies = ['cohort_' + f'{i}' for i in range(cohort_range[0] + 1, cohort_range[1] + 1)]
+    rslts = regress_prepared(df, method, cohort_range, cohort_dummies, controls)
+    if method == 'OLS':
+        return {'variable': 'highnumber', 'params': rslts.params['highnumber'], 'std_errors': rslts.HC0_se['highnumber'],
+                'pvalues': rslts.pvalues['highnumber'], 'nobs': rslts.nobs}
+    return {'variable': 'sm', 'params': rslts.params['sm'], 'std_errors': rslts.std_errors['sm'],
+            'pvalues': rslts.pvalues['sm'], 'nobs': rslts.nobs}
+
+# Job: 2SLS of one outcome on conscription for the cohorts 1958-1962 as in tables 6 and 7.
+def _job_outcome_iv(outcome):
+    '''
+    outcome: string, e.g. a crime type of table 6 ('arms', 'property', ...) or a labour market
+    outcome of table 7 ('formal', 'unemployment', 'income').
+    '''
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas = get_variable_lists()
+    df = _get_panel()
+    df_reg = df[(df.cohort > 1957) & (df.cohort < 1963)]
+    rslts = IV2SLS(df_reg.loc[:, outcome], df_reg[constant + cohorts[29: 33]], df_reg['sm'], df_reg['highnumber']).fit()
+    ineligible_mean = df_reg[outcome][df_reg.highnumber == 0].mean()
+    return {'variable': 'sm', 'params': rslts.params['sm'], 'std_errors': rslts.std_errors['sm'],
+            'pvalues': rslts.pvalues['sm'], 'nobs': rslts.nobs, 'percent_change': 100*rslts.params['sm']/ineligible_mean}
+
+# Job: report the panel of the worker, which the executor initializer has loaded already.
+def _job_warm():
+    return {'rows': len(_get_panel())}
+
+JOBS = {'regress': _job_regress, 'outcome_iv': _job_outcome_iv, 'warm': _job_warm}
+
+# Run a job in a worker. Results are converted to plain floats for JSON.
+def run_job(job, args):
+    rslt = JOBS[job](**args)
+    return {key: (value if isinstance(value, str) else float(value)) for key, value in rslt.items()}
+
+
+class TableService:
+    '''
+    Dispatches jobs to a worker pool and shares the result of identical in-flight requests.
+    executor: concurrent.futures executor, defaults to a process pool with `workers` processes
+    that load the prepared panel in their initializer. Workers are spawned rather than forked so
+    that they do not inherit open client sockets.
+    '''
+
+    def __init__(self, executor=None, workers=None):
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=_get_panel)
+        self.executor = executor
+        self.workers = workers or os.cpu_count()
+        self._inflight = {}
+
+    async def warm(self):
+        '''
+        Starts the workers before the first request; each one loads the prepared panel in the
+        executor initializer, whichever of these jobs it picks up.
+        '''
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, run_job, 'warm', {}) for _ in range(self.workers)])
+
+    async def submit(self, job, args):
+        '''
+        Returns the result of job(**args). Identical requests that arrive while the first one is
+        still running wait for the same future instead of being fitted again.
+        '''
+        if job not in JOBS:
+            raise KeyError(f'unknown job {job!r}')
+        key = json.dumps([job, args], sort_keys=True)
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = asyncio.ensure_future(loop.run_in_executor(self.executor, run_job, job, args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _answer(self, request, writer, lock):
+        response = {'id': request.get('id')}
+        if 'parse_error' in request:
+            response['error'] = request['parse_error']
+        else:
+            try:
+                response['result'] = await self.submit(request['job'], request.get('args', {}))
+            except Exception as error:
+                response['error'] = f'{type(error).__name__}: {error}'
+        async with lock:
+            writer.write((json.dumps(response) + '\n').encode())
+            await writer.drain()
+
+    async def handle(self, reader, writer):
+        '''
+        Reads JSON requests line by line and streams each response as soon as its job finishes.
+        '''
+        lock = asyncio.Lock()
+        tasks = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                request = {'parse_error': f'{type(error).__name__}: {error}'}
+            if not isinstance(request, dict):
+                request = {'parse_error': 'ValueError: a request must be a JSON object'}
+            tasks.append(asyncio.ensure_future(self._answer(request, writer, lock)))
+        if tasks:
+            await asyncio.gather(*tasks)
+        writer.close()
+
+    async def serve_unix(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        return await asyncio.start_unix_server(self.handle, path=path)
+
+    async def serve_tcp(self, host='127.0.0.1', port=8765):
+        return await asyncio.start_server(self.handle, host=host, port=port)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+# Send requests to a running service and collect the responses.
+async def request_jobs(requests, path=None, host='127.0.0.1', port=8765):
+    '''
+    requests: list of dicts with keys 'id', 'job' and 'args'.
+    path: Unix socket path, if None the TCP host and port are used.
+    Returns the responses in the order in which they arrive.
+    '''
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    for request in requests:
+        writer.write((json.dumps(request) + '\n').encode())
+    await writer.drain()
+    writer.write_eof()
+    responses = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        responses.append(json.loads(line))
+    writer.close()
+    return responses
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve table and specification requests.')
+    parser.add_argument('--socket', help='Unix socket path, if not given a local TCP port is used.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None)
+    options = parser.parse_args()
+
+    service = TableService(workers=options.workers)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(service.warm())
+    if options.socket:
+        server = loop.run_until_complete(service.serve_unix(options.socket))
+    else:
+        server = loop.run_until_complete(service.serve_tcp(port=options.port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        service.shutdown()
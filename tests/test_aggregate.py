@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Aggregation of individual-level records into the cohort x ID panel.
+"""
+
+# Import modules.
+import numpy as np
+import pandas as pd
+import pytest
+
+from auxiliary.functions_v6 import aggregate_records
+
+
+# Records of two cohorts with two ID cells each and three records per cell.
+@pytest.fixture
+def records():
+    cohort = np.repeat([1958, 1958, 1959, 1959], 3)
+    cell = np.repeat([1, 2, 1, 2], 3)
+    return pd.DataFrame({'cohort': cohort, 'id': cell, 'draftnumber': cell*100, 'highnumber': (cell == 2).astype(int),
+                         'navy': 0, 'served': [1, 0, 1, 1, 1, 0, 0, 0, 1, 1, 1, 1],
+                         'criminal_record': [0, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 1]})
+
+
+def test_rates_and_lottery(records):
+    panel = aggregate_records(records, workers=1)
+    assert panel[['cohort', 'id']].values.tolist() == [[1958, 1], [1958, 2], [1959, 1], [1959, 2]]
+    np.testing.assert_allclose(panel.sm, [2/3, 2/3, 1/3, 1], rtol=1e-6)
+    np.testing.assert_allclose(panel.crimerate, [1/3, 0, 1/3, 1/3], rtol=1e-6)
+    assert panel.highnumber.tolist() == [0, 1, 0, 1]
+    assert panel.draftnumber.dtype == np.int32
+
+
+def test_lottery_table_missing_cell(records):
+    lottery = pd.DataFrame({'cohort': [1958, 1958, 1959], 'id': [1, 2, 1], 'draftnumber': [5, 900, 7],
+                            'highnumber': [0, 1, 0], 'navy': [0, 1, 0]})
+    with pytest.raises(ValueError, match='no row in lottery'):
+        aggregate_records(records, lottery=lottery, workers=1)
+
+
+def test_missing_lottery_values_stay_missing(records):
+    records['draftnumber'] = records['draftnumber'].astype(float)
+    records.loc[records.cohort == 1959, 'draftnumber'] = np.nan
+    records.loc[11, 'highnumber'] = np.nan
+    panel = aggregate_records(records, workers=1)
+    assert str(panel.draftnumber.dtype) == 'Int32'
+    assert panel.draftnumber.isna().tolist() == [False, False, True, True]
+    # A missing value in one record of a cell does not hide the others.
+    assert panel.highnumber.tolist() == [0, 1, 0, 1]
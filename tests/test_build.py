@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Reuse and rebuild of the nodes of the replication build graph.
+"""
+
+# Import modules.
+import os
+
+import pytest
+
+from auxiliary.build import build, replication_nodes
+from auxiliary.functions_v6 import simulate_panel
+
+
+# Synthetic crime panel written as a Stata file.
+def write_panel(path, seed):
+    simulate_panel(cohorts=list(range(1929, 1966)), ids=60, seed=seed).to_stata(path, write_index=False)
+
+
+# Table 4 built from a synthetic panel in a temporary directory.
+@pytest.fixture
+def graph(tmp_path):
+    data = os.path.join(str(tmp_path), 'crime.dta')
+    write_panel(data, seed=1)
+    out_dir = os.path.join(str(tmp_path), 'build')
+    nodes = replication_nodes(data=data, out_dir=out_dir, formats=('text',))
+    cache_dir = os.path.join(out_dir, 'cache')
+    first = build(nodes, targets=['table_4'], cache_dir=cache_dir, workers=1)
+    return data, out_dir, nodes, cache_dir, first
+
+
+# Unchanged inputs reuse every node with the same results.
+def test_unchanged_inputs_are_reused(graph):
+    data, out_dir, nodes, cache_dir, first = graph
+    assert (first.status == 'built').all()
+    second = build(nodes, targets=['table_4'], cache_dir=cache_dir, workers=1)
+    assert (second.status == 'cached').all()
+    assert second.hash.tolist() == first.hash.tolist()
+
+
+# A changed input file rebuilds the nodes that depend on it.
+def test_changed_input_is_rebuilt(graph):
+    data, out_dir, nodes, cache_dir, first = graph
+    write_panel(data, seed=2)
+    second = build(replication_nodes(data=data, out_dir=out_dir, formats=('text',)), targets=['table_4'], cache_dir=cache_dir,
+                   workers=1)
+    assert (second.status == 'built').all()
+    assert second.set_index('name').loc['panel', 'hash'] != first.set_index('name').loc['panel', 'hash']
+
+
+# A missing output file only rebuilds the node that writes it.
+def test_missing_output_is_rebuilt(graph):
+    data, out_dir, nodes, cache_dir, first = graph
+    os.remove(os.path.join(out_dir, 'tables', 'table_4.txt'))
+    second = build(nodes, targets=['table_4'], cache_dir=cache_dir, workers=1).set_index('name')
+    assert second.loc['table_4', 'status'] == 'built'
+    assert (second.drop('table_4').status == 'cached').all()
+    assert os.path.exists(os.path.join(out_dir, 'tables', 'table_4.txt'))
+
+
+# Serial and parallel builds give the same result hashes.
+def test_workers_give_identical_hashes(graph, tmp_path):
+    data, out_dir, nodes, cache_dir, first = graph
+    parallel = build(nodes, targets=['table_4'], cache_dir=os.path.join(str(tmp_path), 'parallel'), workers=2)
+    assert parallel.hash.tolist() == first.hash.tolist()
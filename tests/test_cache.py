@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Caches of first stages, design matrices and missingness masks.
+"""
+
+# Import modules.
+import numpy as np
+
+from auxiliary import functions_v6
+from auxiliary.functions_v6 import (cached_design, estimation_sample, first_stage_by_cohort, invalidate_caches,
+                                    pooled_compliance, prepare_panel, simulate_panel)
+
+
+# In-place changes of the data frame are not served from the cache after invalidate_caches().
+def test_first_stage_follows_in_place_changes():
+    df = prepare_panel(simulate_panel(seed=1))
+    before = first_stage_by_cohort(df)
+    df.loc[(df['cohort'] == 1958) & (df['highnumber'] == 1), 'sm'] = 0
+    invalidate_caches(df)
+    after = first_stage_by_cohort(df)
+    assert after.loc[1958, 'p1'] == 0
+    assert after.loc[1959, 'p1'] == before.loc[1959, 'p1']
+
+
+# Pooled compliance rates from the cached first stage equal the direct means of the cohorts 1958-1962.
+def test_pooled_compliance():
+    df = prepare_panel(simulate_panel(seed=1))
+    core = df[(df.cohort >= 1958) & (df.cohort <= 1962)]
+    p1, p2 = pooled_compliance(df)
+    assert np.isclose(p1, core['sm'][core.highnumber == 1].dropna().mean(), rtol=1e-6)
+    assert np.isclose(p2, core['sm'][core.highnumber == 0].dropna().mean(), rtol=1e-6)
+
+
+# Old entries are evicted.
+def test_first_stage_cache_is_bounded():
+    df = prepare_panel(simulate_panel(seed=1))
+    for first in range(1929, 1929 + functions_v6.FIRST_STAGE_CACHE_MAX_ENTRIES + 5):
+        first_stage_by_cohort(df, (first, first + 1))
+    assert len(functions_v6._first_stage_cache) <= functions_v6.FIRST_STAGE_CACHE_MAX_ENTRIES
+
+
+# Designs and missingness masks follow in-place changes of the data frame after invalidate_caches().
+def test_design_follows_in_place_changes():
+    df = prepare_panel(simulate_panel(seed=1))
+    columns = ['constant', 'highnumber', 'crimerate']
+    design, mask = cached_design(df, [1958, 1962], columns)
+    nobs = len(design)
+    df.loc[df.index[df['cohort'] == 1958][:3], 'crimerate'] = np.nan
+    df.loc[df.index[df['cohort'] == 1959][0], 'highnumber'] = 5
+    assert cached_design(df, [1958, 1962], columns)[0] is design
+    invalidate_caches(df)
+    design, mask = cached_design(df, [1958, 1962], columns)
+    assert len(design) == nobs - 3
+    assert design[:, 1].max() == 5
+    assert len(estimation_sample(df, columns, [1958, 1962])) == nobs - 3
+
+
+# Masks are only computed for the columns that are used.
+def test_missing_masks_are_lazy():
+    df = prepare_panel(simulate_panel(seed=1))
+    estimation_sample(df, ['crimerate'], [1958, 1962])
+    assert set(functions_v6._missing_cache[id(df)][2]) == {'crimerate'}
+
+
+# Added rows or columns invalidate the cached designs without a call.
+def test_design_follows_new_rows():
+    df = prepare_panel(simulate_panel(cohorts=[1958], ids=100, seed=1))
+    columns = ['constant', 'highnumber', 'crimerate']
+    nobs = len(cached_design(df, [1958, 1958], columns)[0])
+    df.loc[len(df)] = df.iloc[0]
+    assert len(cached_design(df, [1958, 1958], columns)[0]) == nobs + 1
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Sandwich covariance matrices of regress_cov(), fit_std_errors() and robust_covariances().
+"""
+
+# Import modules.
+import numpy as np
+import pytest
+import statsmodels.api as sm
+
+from auxiliary.functions_v6 import (estimation_sample, fit_std_errors, get_district, prepare_panel, regress_cov, regress_prepared,
+                                    robust_covariances, simulate_panel)
+
+
+# HC0 errors agree with statsmodels on the synthetic panel.
+def test_hc0_matches_statsmodels():
+    df = prepare_panel(simulate_panel(seed=1))
+    cohort_dummies = [f'cohort_{year}' for year in range(1959, 1963)]
+    params, std_errors = regress_cov(df, 'OLS', [1958, 1962], cohort_dummies, 'n', cov_types=('HC0',))
+    sample = df[(df['cohort'] >= 1958) & (df['cohort'] <= 1962)]
+    exog = sm.add_constant(sample[['highnumber'] + cohort_dummies].astype(float))
+    rslts = sm.OLS(sample['crimerate'].astype(float), exog).fit(cov_type='HC0')
+    assert np.isclose(params['highnumber'], rslts.params['highnumber'])
+    assert np.isclose(std_errors.loc['highnumber', 'HC0'], rslts.bse['highnumber'])
+
+
+# Two-way clustering by cluster names that contain underscores.
+def test_twoway_cluster_names_with_underscores():
+    rng = np.random.default_rng(0)
+    X = np.column_stack([np.ones(200), rng.normal(size=200)])
+    resid = rng.normal(size=200)
+    bread = np.linalg.inv(X.T @ X)
+    clusters = {'birth_year': np.arange(200) % 10, 'home_district': np.arange(200) % 7}
+    covariances = robust_covariances(X, resid, bread, cov_types=(('twoway', 'birth_year', 'home_district'),), clusters=clusters)
+    cov = covariances[('twoway', 'birth_year', 'home_district')]
+    assert cov.shape == (2, 2)
+    assert np.allclose(cov, cov.T)
+
+
+# Standard errors from the scores of a regress_prepared() fit equal those of a refit by regress_cov().
+@pytest.mark.parametrize('method, controls', [('OLS', 'y'), ('IV', 'n')])
+def test_fit_std_errors_match_regress_cov(method, controls):
+    df = prepare_panel(simulate_panel(seed=1))
+    cohort_dummies = [f'cohort_{year}' for year in range(1959, 1963)]
+    cov_types = ('HC0', 'HC1', 'HC3', 'cluster_district')
+    rslts = regress_prepared(df, method, [1958, 1962], cohort_dummies, controls)
+    columns = list(rslts.params.index) + ['crimerate'] + (['highnumber'] if method == 'IV' else [])
+    sample = df.iloc[estimation_sample(df, columns, [1958, 1962])]
+    std_errors = fit_std_errors(rslts, cov_types, {'cohort': sample['cohort'].to_numpy(), 'district': get_district(sample)})
+    reference = regress_cov(df, method, [1958, 1962], cohort_dummies, controls, cov_types=cov_types)[1]
+    assert np.allclose(std_errors, reference.loc[std_errors.index, std_errors.columns], rtol=1e-8)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Golden-result checks of the fast estimation backends on a synthetic panel.
+"""
+
+# Import modules.
+import pytest
+
+from auxiliary.functions_v6 import equivalence_report, prepare_panel, simulate_panel
+
+
+# Equivalence report of the synthetic panel, computed once for all tests of the module.
+@pytest.fixture(scope='module')
+def report():
+    return equivalence_report(panels={'synthetic': prepare_panel(simulate_panel(seed=1))}, repeat=1)
+
+
+def test_all_cases_pass(report):
+    summary, details = report
+    failed = summary.loc[~summary.passed, 'case'].tolist()
+    assert not failed, f'fast backends differ from the reference estimators: {failed}'
+
+
+def test_all_cases_compared(report):
+    summary, details = report
+    assert set(summary.case) == {'regress (table 4)', 'regress (mixed precision)', 'table 3', 'table 5', 'table 6',
+                                 'wald (no controls)'}
+    assert (summary.rows > 0).all()
+
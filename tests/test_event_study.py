@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Coefficient path of event_study().
+"""
+
+# Import modules.
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from auxiliary.functions_v6 import event_study, prepare_panel, simulate_panel
+
+
+# Synthetic panel of six cohorts.
+@pytest.fixture(scope='module')
+def df():
+    return prepare_panel(simulate_panel(cohorts=list(range(1957, 1963)), ids=200, seed=6))
+
+
+# Cohorts without variation in highnumber get NaN, the others one coefficient each.
+def test_cohorts_without_variation(df):
+    data = df.copy()
+    data.loc[data['cohort'] == 1957, 'highnumber'] = 0
+    path, cov = event_study(data, cohort_range=(1957, 1962))
+    assert list(path.index) == list(range(1957, 1963))
+    assert path.loc[1957, ['params', 'std_errors']].isna().all()
+    assert np.isfinite(path.loc[1958:, ['params', 'std_errors', 'ci_lower', 'ci_upper']].to_numpy()).all()
+    assert list(cov.index) == list(range(1958, 1963))
+    assert (path.nobs == 200).all()
+
+
+# The grouped fit equals sm.OLS with all cohort dummies and their interactions with highnumber.
+@pytest.mark.parametrize('controls', [(), ('naturalized', 'indigenous')])
+def test_matches_statsmodels(df, controls):
+    path, cov = event_study(df, controls=controls, cohort_range=(1957, 1962))
+    dummies = pd.get_dummies(df['cohort']).astype(float).set_index(df.index)
+    interactions = dummies.mul(df['highnumber'], axis=0).add_prefix('hn_')
+    rslts = sm.OLS(df['crimerate'], pd.concat([interactions, dummies, df[list(controls)]], axis=1)).fit(cov_type='HC0', use_t=True)
+    for cohort in path.index:
+        assert np.isclose(path.loc[cohort, 'params'], rslts.params[f'hn_{cohort}'], rtol=1e-8)
+        assert np.isclose(path.loc[cohort, 'std_errors'], rslts.bse[f'hn_{cohort}'], rtol=1e-8)
+        assert np.isclose(path.loc[cohort, 'pvalues'], rslts.pvalues[f'hn_{cohort}'], rtol=1e-6)
+    reference = rslts.cov_params().loc[[f'hn_{c}' for c in path.index], [f'hn_{c}' for c in path.index]]
+    assert np.allclose(cov.to_numpy(), reference.to_numpy(), rtol=1e-8, atol=1e-14)
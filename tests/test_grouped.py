@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Grouped-moment regressions and two-group estimators against per-group reference fits.
+"""
+
+# Import modules.
+import numpy as np
+import pytest
+
+from linearmodels import IV2SLS
+
+from auxiliary.functions_v6 import prepare_panel, regress_by_group, simulate_panel, wald_by_group
+
+
+# Synthetic panel of three cohorts.
+@pytest.fixture(scope='module')
+def df():
+    return prepare_panel(simulate_panel(cohorts=[1958, 1959, 1960], ids=300, seed=7))
+
+
+# Per-cohort 2SLS equals one IV2SLS fit per cohort.
+def test_regress_by_group_matches_iv2sls(df):
+    rslts = regress_by_group(df, 'IV', 'cohort', 'crimerate', ['constant'])
+    for cohort in [1958, 1959, 1960]:
+        data = df[df.cohort == cohort]
+        reference = IV2SLS(data['crimerate'], data[['constant']], data['sm'], data['highnumber']).fit(cov_type='robust')
+        assert np.isclose(rslts.loc[(cohort, 'sm'), 'params'], reference.params['sm'])
+        assert np.isclose(rslts.loc[(cohort, 'sm'), 'std_errors'], reference.std_errors['sm'])
+
+
+# Wald estimates are the ratio of the differences in means.
+def test_wald_by_group_means(df):
+    rslts = wald_by_group(df)
+    data = df[df.cohort == 1959]
+    eligible, exempt = data[data.highnumber == 1], data[data.highnumber == 0]
+    itt = eligible.crimerate.mean() - exempt.crimerate.mean()
+    first_stage = eligible.sm.mean() - exempt.sm.mean()
+    assert np.isclose(rslts.loc[1959, 'wald'], itt/first_stage)
+
+
+# Instruments other than 0/1 are rejected.
+def test_wald_by_group_rejects_non_binary_instrument():
+    df = prepare_panel(simulate_panel(cohorts=2, ids=50, seed=3))
+    df['draftnumber'] = df['draftnumber'].astype(float)
+    with pytest.raises(ValueError, match='must be 0 or 1'):
+        wald_by_group(df, instrument='draftnumber')
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Subgroup effects of interacted_iv() against fits of the full interacted design.
+"""
+
+# Import modules.
+import numpy as np
+import pandas as pd
+import pytest
+
+from linearmodels import IV2SLS
+
+from auxiliary.functions_v6 import get_subgroup, interacted_iv, prepare_panel, simulate_panel
+
+
+# Synthetic panel of three cohorts.
+@pytest.fixture(scope='module')
+def df():
+    return prepare_panel(simulate_panel(cohorts=[1958, 1959, 1960], ids=400, seed=4))
+
+
+# The grouped-moment fit equals IV2SLS on the interacted design with subgroup fixed effects.
+def test_interacted_iv_matches_iv2sls(df):
+    rslts = interacted_iv(df, 'origin', cohort_range=(1958, 1960))
+    subgroup = get_subgroup(df, 'origin')
+    dummies = pd.get_dummies(subgroup).astype(float).set_index(df.index)
+    exog = pd.concat([dummies, df[['cohort_1959', 'cohort_1960']]], axis=1)
+    endog = dummies.mul(df['sm'], axis=0).add_prefix('sm_')
+    instruments = dummies.mul(df['highnumber'], axis=0).add_prefix('hn_')
+    reference = IV2SLS(df['crimerate'], exog, endog, instruments).fit(cov_type='robust')
+    for label in rslts.index:
+        assert np.isclose(rslts.loc[label, 'params'], reference.params[f'sm_{label}'], rtol=1e-8)
+        assert np.isclose(rslts.loc[label, 'std_errors'], reference.std_errors[f'sm_{label}'], rtol=1e-8)
+        assert rslts.loc[label, 'nobs'] == (subgroup == label).sum()
+
+
+# With a single subgroup the interacted fit is the pooled 2SLS of the window.
+def test_single_subgroup_is_pooled_fit(df):
+    rslts = interacted_iv(df, 'constant', cohort_range=(1958, 1960))
+    reference = IV2SLS(df['crimerate'], df[['constant', 'cohort_1959', 'cohort_1960']], df['sm'], df['highnumber']).fit(cov_type='robust')
+    assert len(rslts) == 1
+    assert np.isclose(rslts['params'].iloc[0], reference.params['sm'], rtol=1e-8)
+    assert np.isclose(rslts['std_errors'].iloc[0], reference.std_errors['sm'], rtol=1e-8)
+
+
+# Combined keys give one subgroup per observed combination, covering the sample.
+def test_combined_keys(df):
+    data = df.assign(half=df['id'] % 2)
+    rslts = interacted_iv(data, ['origin', 'half'], cohort_range=(1958, 1960))
+    assert set(rslts.index) == {f'{origin}_{half}' for origin in ['argentine', 'naturalized', 'indigenous'] for half in [0, 1]}
+    assert rslts['nobs'].sum() == len(df)
+    assert np.isfinite(rslts[['params', 'std_errors']].to_numpy()).all()
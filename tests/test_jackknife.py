@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Leave-one-group-out jackknife by downdated cross products.
+"""
+
+# Import modules.
+import numpy as np
+import pytest
+import statsmodels.api as sm
+
+from linearmodels import IV2SLS
+
+from auxiliary.functions_v6 import jackknife, prepare_panel, regress_prepared, simulate_panel
+
+dummies = ['cohort_' + f'{i}' for i in range(1959, 1963)]
+
+
+# Small synthetic panel of the core cohorts.
+@pytest.fixture
+def df():
+    return prepare_panel(simulate_panel(cohorts=list(range(1958, 1963)), ids=200, seed=6))
+
+
+# Leave-one-out estimates equal refits without the cohort, whose dummy drops out.
+@pytest.mark.parametrize('method', ['OLS', 'IV'])
+def test_leave_one_out_matches_refit(df, method):
+    estimate, jackknife_se, rslts = jackknife(df, method, [1958, 1962], dummies, 'n')
+    variable = 'highnumber' if method == 'OLS' else 'sm'
+    assert np.isclose(estimate, regress_prepared(df, method, [1958, 1962], dummies, 'n').params[variable])
+    rest = df[df.cohort != 1960]
+    exog = rest[['constant'] + [d for d in dummies if d != 'cohort_1960']]
+    if method == 'OLS':
+        refit = sm.OLS(rest['crimerate'], rest[['highnumber']].join(exog)).fit().params[variable]
+    else:
+        refit = IV2SLS(rest['crimerate'], exog, rest['sm'], rest['highnumber']).fit().params[variable]
+    assert np.isclose(rslts.loc[1960, 'params'], refit)
+    assert jackknife_se > 0
+
+
+# A replicate with collinear regressors or without the reported variable raises.
+def test_rank_deficient_replicate_raises(df):
+    collinear = df.copy()
+    collinear.loc[collinear.cohort > 1958, 'highnumber'] = 1
+    with pytest.raises(ValueError, match='highnumber is not identified without cohort 1958'):
+        jackknife(collinear, 'OLS', [1958, 1962], dummies, 'n')
+    zero = df.copy()
+    zero.loc[zero.cohort > 1958, 'highnumber'] = 0
+    with pytest.raises(ValueError, match='without cohort 1958'):
+        jackknife(zero, 'OLS', [1958, 1962], dummies, 'n')
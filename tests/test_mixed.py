@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Mixed-precision regressions of regress_mixed() and the IV specification shared with regress().
+"""
+
+# Import modules.
+import numpy as np
+import pytest
+
+from auxiliary.functions_v6 import (get_variable_lists, prepare_panel, regress_cov, regress_mixed, regress_prepared,
+                                    simulate_panel, weak_iv_diagnostics)
+
+
+# Synthetic panel shared by the tests of the module.
+@pytest.fixture(scope='module')
+def df():
+    return prepare_panel(simulate_panel(seed=1))
+
+
+# Refined estimates from the float32 design equal the float64 fit of regress() within tolerance.
+@pytest.mark.parametrize('method, controls', [('OLS', 'n'), ('OLS', 'y'), ('IV', 'n'), ('IV', 'y')])
+def test_mixed_matches_float64(df, method, controls):
+    cohorts = get_variable_lists()[7]
+    mixed, info = regress_mixed(df, method, [1958, 1962], cohorts[29: 33], controls)
+    rslts = regress_prepared(df, method, [1958, 1962], cohorts[29: 33], controls)
+    std_errors = rslts.HC0_se if method == 'OLS' else rslts.std_errors
+    assert info['precision'] == 'mixed'
+    assert np.allclose(mixed.params, rslts.params[mixed.index], rtol=1e-8, atol=1e-10)
+    assert np.allclose(mixed.std_errors, std_errors[mixed.index], rtol=1e-5)
+    assert (mixed.nobs == rslts.nobs).all()
+
+
+# Outside 1958-1962 the IV estimators use the exogenous cohort dummies of regress().
+def test_iv_specification_on_wide_window(df):
+    cohorts = get_variable_lists()[7]
+    rslts = regress_prepared(df, 'IV', [1929, 1965], cohorts[0: 36], 'n')
+    mixed = regress_mixed(df, 'IV', [1929, 1965], cohorts[0: 36], 'n', precision='float64')[0]
+    params, std_errors = regress_cov(df, 'IV', [1929, 1965], cohorts[0: 36], 'n', cov_types=('HC0',))
+    diagnostics = weak_iv_diagnostics(df, [1929, 1965], cohorts[0: 36], 'n')
+    assert list(mixed.index) == list(rslts.params.index)
+    assert np.allclose(mixed.params, rslts.params, rtol=1e-10)
+    assert np.allclose(params[rslts.params.index], rslts.params, rtol=1e-10)
+    assert np.allclose(std_errors.loc[rslts.params.index, 'HC0'], rslts.std_errors, rtol=1e-8)
+    assert diagnostics['nobs'] == rslts.nobs
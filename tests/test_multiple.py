@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Romano-Wolf, Holm and Benjamini-Hochberg adjustments of multiple_outcomes().
+"""
+
+# Import modules.
+import numpy as np
+import pytest
+
+from linearmodels import IV2SLS
+
+from auxiliary.functions_v6 import multiple_outcomes, prepare_panel, simulate_panel
+
+
+# Synthetic panel of the cohorts 1958-1962.
+@pytest.fixture(scope='module')
+def df():
+    return prepare_panel(simulate_panel(cohorts=list(range(1958, 1963)), ids=300, seed=2))
+
+
+# Estimates of every outcome equal IV2SLS, and the adjusted p-values follow their definitions.
+def test_adjusted_pvalues(df):
+    outcomes = ['crimerate', 'arms', 'property', 'drug']
+    rslts = multiple_outcomes(df, outcomes=outcomes, reps=400, seed=1)
+    exog = df[['constant'] + [f'cohort_{year}' for year in range(1959, 1963)]]
+    for outcome in outcomes:
+        reference = IV2SLS(df[outcome], exog, df['sm'], df['highnumber']).fit(cov_type='robust')
+        assert np.isclose(rslts.loc[outcome, 'params'], reference.params['sm'], rtol=1e-8)
+        assert np.isclose(rslts.loc[outcome, 'std_errors'], reference.std_errors['sm'], rtol=1e-8)
+    
+    # Romano-Wolf p-values are at least the unadjusted ones and ordered as the bootstrap t-statistics.
+    assert (rslts.pvalues_romano_wolf >= rslts.pvalues - 1e-12).all() and (rslts.pvalues_romano_wolf <= 1).all()
+    t = (rslts.params/rslts.bootstrap_se).abs().sort_values(ascending=False)
+    assert rslts.pvalues_romano_wolf[t.index].is_monotonic_increasing
+    
+    # Holm and Benjamini-Hochberg from the sorted unadjusted p-values.
+    p = rslts.pvalues.sort_values()
+    m = len(p)
+    holm = np.minimum(np.maximum.accumulate((m - np.arange(m))*p.to_numpy()), 1)
+    bh = np.minimum(np.minimum.accumulate((m/np.arange(1, m + 1)*p.to_numpy())[::-1])[::-1], 1)
+    assert np.allclose(rslts.pvalues_holm[p.index], holm)
+    assert np.allclose(rslts.pvalues_bh[p.index], bh)
+
+
+# Bootstrap chunks have their own seeds, so results do not depend on workers.
+def test_workers_give_identical_results(df):
+    kwargs = dict(outcomes=['crimerate', 'arms', 'property'], reps=200, seed=3, chunk=50)
+    assert multiple_outcomes(df, workers=1, **kwargs).equals(multiple_outcomes(df, workers=2, **kwargs))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Specifications of multiverse() against direct fits.
+"""
+
+# Import modules.
+import os
+
+import numpy as np
+import statsmodels.api as sm
+
+from linearmodels import IV2SLS
+
+from auxiliary.functions_v6 import multiverse, prepare_panel, publish_panel, simulate_panel
+
+
+# OLS and 2SLS estimates of one window and control set equal statsmodels and IV2SLS fits.
+def test_multiverse_matches_direct_fits(tmp_path):
+    df = prepare_panel(simulate_panel(cohorts=list(range(1958, 1963)), ids=300, seed=2))
+    path = os.path.join(str(tmp_path), 'panel')
+    publish_panel(path, df)
+    rslts = multiverse(windows=((1958, 1962),), controls=('origin',), outcomes=('crimerate', 'arms'), workers=1, path=path)
+    assert len(rslts) == 2*2*2
+    rslts = rslts.set_index(['controls', 'outcome', 'estimator'])
+    exog = df[['constant'] + [f'cohort_{year}' for year in range(1959, 1963)] + ['naturalized', 'indigenous']]
+    for outcome in ['crimerate', 'arms']:
+        ols = sm.OLS(df[outcome], df[['highnumber']].join(exog)).fit(cov_type='HC0')
+        iv = IV2SLS(df[outcome], exog, df['sm'], df['highnumber']).fit(cov_type='robust')
+        row = rslts.loc[('origin', outcome, 'OLS')]
+        assert np.isclose(row['params'], ols.params['highnumber'], rtol=1e-8)
+        assert np.isclose(row['std_errors'], ols.bse['highnumber'], rtol=1e-8)
+        row = rslts.loc[('origin', outcome, 'IV')]
+        assert np.isclose(row['params'], iv.params['sm'], rtol=1e-8)
+        assert np.isclose(row['std_errors'], iv.std_errors['sm'], rtol=1e-8)
+        assert row['nobs'] == len(df)
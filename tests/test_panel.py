@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Shared memory-mapped panel: publishing, designs and queries.
+"""
+
+# Import modules.
+import os
+
+import numpy as np
+import pytest
+
+from auxiliary.functions_v6 import attach_panel, panel_design, prepare_panel, publish_panel, query_panel, simulate_panel
+
+
+# Small synthetic panel.
+@pytest.fixture(scope='module')
+def df():
+    return prepare_panel(simulate_panel(cohorts=[1958, 1959, 1960], ids=200, seed=4))
+
+
+# Published copy of the panel.
+@pytest.fixture(scope='module')
+def published(df, tmp_path_factory):
+    path = os.path.join(str(tmp_path_factory.mktemp('panel')), 'panel')
+    publish_panel(path, df)
+    return attach_panel(path)
+
+
+def test_panel_design_window(df, published):
+    block, meta = published
+    design = panel_design(block, meta, ['crimerate', 'sm'], [1959, 1960])
+    data = df[df.cohort.isin([1959, 1960])].sort_values('cohort', kind='stable')
+    np.testing.assert_allclose(np.sort(design[:, 0]), np.sort(data.crimerate.to_numpy(dtype=float)))
+    assert design.shape == (400, 2)
+
+
+def test_panel_design_empty_window(published):
+    block, meta = published
+    with pytest.raises(ValueError, match='no cohorts'):
+        panel_design(block, meta, ['crimerate'], [1970, 1975])
+
+
+def test_publish_rejects_missing_cohort(df, tmp_path):
+    df = df.copy()
+    df['cohort'] = df['cohort'].astype(float)
+    df.loc[0, 'cohort'] = np.nan
+    with pytest.raises(ValueError, match='missing cohorts'):
+        publish_panel(os.path.join(str(tmp_path), 'panel'), df)
+
+
+def test_query_pushdown(df, published):
+    rows = query_panel(published, ['cohort', 'highnumber', 'crimerate'], cohort=1959, highnumber=1)
+    expected = df[(df.cohort == 1959) & (df.highnumber == 1)]
+    assert len(rows) == len(expected)
+    np.testing.assert_allclose(np.sort(rows.crimerate.to_numpy()), np.sort(expected.crimerate.to_numpy(dtype=float)))
+    assert len(query_panel(published, ['crimerate'], cohort_range=[1970, 1975])) == 0
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Power surface and minimum detectable effects of power_analysis().
+"""
+
+# Import modules.
+import numpy as np
+
+from auxiliary.functions_v6 import power_analysis, prepare_panel, simulate_panel
+
+
+# Without an effect the rejection rate is the level; power grows with the effect and the sample.
+def test_power_surface():
+    df = prepare_panel(simulate_panel(cohorts=list(range(1958, 1963)), ids=300, seed=2))
+    surface, mde = power_analysis(df, outcomes=('crimerate',), ids=(100, 400), effects=(0, 2.5, 5, 10), reps=1000, seed=1)
+    for ids in [100, 400]:
+        power = surface.xs(('1958-1962', ids, 'crimerate')).power
+        assert abs(power.loc[0] - 0.05) < 0.025
+        assert power.is_monotonic_increasing
+    effects = surface.xs(100, level='ids').index.get_level_values('effect') > 0
+    assert (surface.xs(400, level='ids').power.to_numpy()[effects] >= surface.xs(100, level='ids').power.to_numpy()[effects]).all()
+    std_error = mde.std_error.droplevel(['window', 'outcome'])
+    assert np.isclose(std_error.loc[100]/std_error.loc[400], 2, rtol=0.1)
+    assert mde.loc[('1958-1962', 400, 'crimerate'), 'mde'] < mde.loc[('1958-1962', 100, 'crimerate'), 'mde']
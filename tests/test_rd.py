@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Bandwidth selection and estimates of rd_cutoff().
+"""
+
+# Import modules.
+import numpy as np
+import pytest
+
+from auxiliary.functions_v6 import _rd_bandwidth, prepare_panel, rd_cutoff, simulate_panel
+
+
+# Cross-validation criterion from one weighted least-squares fit per point and bandwidth.
+def brute_force_cv(x, y, grid, kernel, cv_share):
+    cv = []
+    for h in grid:
+        errors = []
+        for side in [-1, 1]:
+            keep = x < 0 if side == -1 else x >= 0
+            xs, ys = x[keep], y[keep]
+            for x0, y0 in zip(xs, ys):
+                if abs(x0) > np.quantile(np.abs(xs), cv_share):
+                    continue
+                window = (xs >= x0 - h) & (xs < x0) if side == -1 else (xs > x0) & (xs <= x0 + h)
+                if window.sum() < 3:
+                    errors.append(np.nan)
+                    continue
+                u = xs[window] - x0
+                w = np.ones_like(u) if kernel == 'uniform' else 1 - np.abs(u)/h
+                X = np.column_stack([np.ones_like(u), u])
+                coef = np.linalg.solve(X.T @ (w[:, None]*X), X.T @ (w*ys[window]))
+                errors.append(y0 - coef[0])
+        cv.append(np.array(errors))
+    errors = np.array(cv)
+    return (errors[:, np.isfinite(errors).all(axis=0)]**2).mean(axis=1)
+
+
+# Window moments stay accurate far away from the cutoff.
+@pytest.mark.parametrize('kernel', ['triangular', 'uniform'])
+def test_bandwidth_criterion_matches_direct_fits(kernel):
+    rng = np.random.default_rng(0)
+    x = np.sort(np.concatenate([-rng.uniform(1e6, 1.01e6, 150), rng.uniform(1e6, 1.01e6, 150)]))
+    y = 0.3*(x >= 0) + 1e-6*x + rng.normal(0, 0.1, len(x))
+    grid = np.array([500.0, 1000.0, 5000.0])
+    h, cv = _rd_bandwidth(x, y, grid, kernel, 0.5)
+    np.testing.assert_allclose(cv, brute_force_cv(x, y, grid, kernel, 0.5), rtol=1e-9)
+
+
+# Bandwidths without enough observations raise instead of returning NaN estimates.
+def test_invalid_bandwidths_raise():
+    df = prepare_panel(simulate_panel(cohorts=[1958], ids=200, seed=5))
+    with pytest.raises(ValueError, match='at least 3 observations'):
+        rd_cutoff(df, years=[1958], grid=[1.5])
+    with pytest.raises(ValueError, match='positive, finite'):
+        rd_cutoff(df, years=[1958], grid=[10, np.nan])
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Rendering of result grids in the output formats.
+"""
+
+# Import modules.
+from auxiliary.functions_v6 import grid_row, make_grid, render_table
+
+
+# Grid with LaTeX special characters and an empty cell in a bold row.
+def grid():
+    return make_grid(title=['Table {1} ^ ~ 50% & more_of \\ it'], header=[['', '(1)', '(2)']],
+                     rows=[grid_row('Estimate', [0.5, None], pvalues=[0.001, None], bold=True)], notes=['Notes: #1 $'])
+
+
+# Special characters are escaped, including braces, caret and tilde.
+def test_latex_escapes():
+    tex = render_table(grid(), 'latex')
+    assert ('\\caption{Table \\{1\\} \\textasciicircum{} \\textasciitilde{} 50\\% \\& more\\_of \\textbackslash{} it}'
+            in tex)
+    assert 'Notes: \\#1 \\$' in tex
+
+
+# Bold tags are only written around non-empty cells.
+def test_html_bold_skips_empty_cells():
+    table = render_table(grid(), 'html')
+    assert '<td><b>0.5000<sup>***</sup></b></td><td></td>' in table
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Job service driven over in-memory streams, without sockets or worker processes.
+"""
+
+# Import modules.
+import asyncio
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from auxiliary import service
+from auxiliary.functions_v6 import prepare_panel, simulate_panel
+
+
+# Writer that collects the bytes written by the service.
+class MemoryWriter:
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.extend(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+# Feed the lines to TableService.handle() and return the responses by id.
+def serve(lines):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(''.join(line + '\n' for line in lines).encode())
+        reader.feed_eof()
+        writer = MemoryWriter()
+        table_service = service.TableService(executor=ThreadPoolExecutor(max_workers=2), workers=2)
+        await table_service.handle(reader, writer)
+        table_service.shutdown()
+        assert writer.closed
+        return writer.buffer.decode().splitlines()
+    return [json.loads(line) for line in asyncio.run(run())]
+
+
+# Synthetic panel as the warm panel of the workers.
+@pytest.fixture(autouse=True)
+def panel(monkeypatch):
+    monkeypatch.setattr(service, '_panel', prepare_panel(simulate_panel(seed=1)))
+
+
+# Identical requests, a truncated line, an unknown job and a request that is not an object.
+def test_jobs_and_errors():
+    request = {'job': 'regress', 'args': {'method': 'OLS', 'cohort_range': [1958, 1962], 'controls': 'n'}}
+    responses = serve([json.dumps(dict(request, id=1)), json.dumps(dict(request, id=2)), '{"id": 3, "job": ',
+                       json.dumps({'id': 4, 'job': 'table_9'}), '[1, 2]'])
+    assert len(responses) == 5
+    by_id = {response['id']: response for response in responses if response['id'] is not None}
+    assert by_id[1]['result'] == by_id[2]['result']
+    assert by_id[1]['result']['variable'] == 'highnumber'
+    assert by_id[4]['error'] == "KeyError: \"unknown job 'table_9'\""
+    errors = [response['error'] for response in responses if response['id'] is None]
+    assert sorted(error.split(':')[0] for error in errors) == ['JSONDecodeError', 'ValueError']
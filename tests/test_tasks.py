@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Seeded tasks of run_tasks() and result hashes.
+"""
+
+# Import modules.
+import numpy as np
+
+from auxiliary.functions_v6 import result_hash, run_tasks
+
+
+# Task drawing from its own seed stream.
+def draw(size, scale, seed):
+    rng = np.random.default_rng(seed)
+    return scale*rng.normal(size=size)
+
+
+# Results and their hashes do not depend on the number of workers, but on the seed.
+def test_result_hash_does_not_depend_on_workers():
+    tasks = [(100, 1.0), (50, 2.0), (200, 0.5), (10, 3.0), (75, 1.5)]
+    serial = run_tasks(draw, tasks, seed=11, workers=1)
+    assert result_hash(run_tasks(draw, tasks, seed=11, workers=3)) == result_hash(serial)
+    assert result_hash(run_tasks(draw, tasks, seed=12, workers=3)) != result_hash(serial)
+    assert [len(result) for result in serial] == [100, 50, 200, 10, 75]
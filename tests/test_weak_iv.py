@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Weak-instrument diagnostics and the closed-form Anderson-Rubin set.
+"""
+
+# Import modules.
+import numpy as np
+import pytest
+
+from auxiliary.functions_v6 import (_ar_set, _weak_iv_stats, get_variable_lists, prepare_panel, regress_prepared, simulate_panel,
+                                    weak_iv_by_group, weak_iv_diagnostics)
+
+
+# Membership of candidate betas in the set against the defining inequality.
+@pytest.mark.parametrize('moments, shape', [((5.0, 2.0, 1.0, 0.1, 0.2), 'interval'),
+                                            ((5.0, 0.1, 1.0, 0.0, 1.0), 'two rays'),
+                                            ((0.1, 0.01, 1.0, 0.0, 1.0), 'real line')])
+def test_ar_set_matches_inequality(moments, shape):
+    zy, zx, s_yy, s_xy, s_xx = moments
+    critical = 3.841
+    intervals, found = _ar_set(zy, zx, s_yy, s_xy, s_xx, critical)
+    assert found == shape
+    candidates = np.linspace(-50, 50, 20001)
+    accepted = (zy - candidates*zx)**2 <= critical*(s_yy - 2*candidates*s_xy + candidates**2*s_xx)
+    inside = np.zeros(len(candidates), dtype=bool)
+    for lower, upper in intervals:
+        inside |= (candidates >= lower) & (candidates <= upper)
+    assert (inside == accepted).all()
+
+
+def test_weak_first_stage_gives_unbounded_set():
+    df = prepare_panel(simulate_panel(cohorts=[1958, 1959], ids=300, first_stage=0.0, always_takers=0.3, seed=2))
+    rslt = weak_iv_diagnostics(df, [1958, 1959], ['cohort_1959'], 'n')
+    assert rslt['ar_shape'] in ['two rays', 'real line', 'half-line']
+    assert not all(np.isfinite(bound) for interval in rslt['ar_set'] for bound in interval)
+
+
+def test_regress_returns_diagnostics():
+    df = prepare_panel(simulate_panel(cohorts=list(range(1958, 1963)), ids=300, seed=2))
+    dummies = ['cohort_' + f'{i}' for i in range(1959, 1963)]
+    rslts, rslt = regress_prepared(df, 'IV', [1958, 1962], dummies, 'n', weak_iv=True)
+    assert rslt['params'] == pytest.approx(rslts.params['sm'], rel=1e-8)
+    assert rslt['ar_shape'] == 'interval'
+    lower, upper = rslt['ar_set'][0]
+    assert lower < rslts.params['sm'] < upper
+
+
+# The grouped diagnostics equal those of each cohort on its own, with and without controls.
+@pytest.mark.parametrize('controls', ['n', 'y'])
+def test_weak_iv_by_group_matches_single_groups(controls):
+    df = prepare_panel(simulate_panel(cohorts=list(range(1958, 1961)), ids=300, seed=2))
+    constant, highnumber, conscription, crimerate, malvinas, navy, origin, cohorts, districts, hn_malvinas = get_variable_lists()
+    exog = constant + (districts + origin if controls == 'y' else [])
+    grouped = weak_iv_by_group(df, 'cohort', exog)
+    for cohort, row in grouped.iterrows():
+        data = df[df['cohort'] == cohort]
+        rslt = _weak_iv_stats(data['crimerate'].to_numpy(dtype=float), data['sm'].to_numpy(dtype=float),
+                              data['highnumber'].to_numpy(dtype=float), data[exog].to_numpy(dtype=float))
+        for name in ['params', 'std_errors', 'first_stage_F', 'first_stage_F_robust', 'nobs']:
+            assert row[name] == pytest.approx(rslt[name], rel=1e-8)
+        assert row['ar_shape'] == rslt['ar_shape']
+        assert row['ar_lower'] == pytest.approx(rslt['ar_set'][0][0], rel=1e-8)